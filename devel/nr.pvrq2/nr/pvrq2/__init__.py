@@ -38,12 +38,15 @@ main()
 ```
 """
 
+from . import profiling
 from .gui import JobDetailsDialog
 from .node import TreeNodeBase
 from .ordereddict import OrderedDict
 import abc
 import c4d
 import os
+import time
+import traceback
 import uuid
 
 __author__ = 'Niklas Rosenstein <rosensteinniklas@gmail.com>'
@@ -62,12 +65,75 @@ STATUS_ALL = [STATUS_PENDING, STATUS_RENDERING, STATUS_COMPLETED,
 #: the time the plugin is loaded.
 res = None
 
+#: The #nr.pvrq2.eta.Estimator of the queue. Will be bound at the time
+#: the plugin is loaded.
+estimator = None
+
+# Localized status strings, loaded by :func:`load_status_strings`.
+status_strings = {}
+
 # Mapping of the plugins registered with :class:`register_node_plugin`.
 job_plugins = {}
 
 #: HyperFile identifier.
 HYPERFILE_IDENT = 1037405
 
+#: The version of the data that the node classes of this module write
+#: for themselves, independent of the #BaseNode.disklevel of a subclass.
+#: It is saved in the bits of the disklevel above the lower 16 bits (see
+#: #get_node_payload()). Data saved by v2.3 and older has version 0.
+#:
+#: 1. #FileRenderJob.skip_existing
+#: 2. The timings of a #RenderJob, see #RenderJob.get_timings()
+#: 3. #FileRenderJob.filename in the header (see #BaseNode.write_header())
+DATA_VERSION = 3
+
+# The built-in jobs that saved the version of their data as their
+# disklevel in development versions before #DATA_VERSION was added.
+_LEGACY_DATA_VERSION_IDENTS = ('nr.pvrq2.FileRenderJob', 'nr.pvrq2.ChunkRenderJob')
+
+
+def _join_disklevel(disklevel):
+  # Returns the disklevel that is saved for data of *disklevel*.
+  return (DATA_VERSION << 16) | (disklevel & 0xFFFF)
+
+
+def _split_disklevel(ident, disklevel):
+  # Returns the disklevel of the plugin *ident* and the #DATA_VERSION
+  # of data that was saved with *disklevel*.
+  version, disklevel = disklevel >> 16, disklevel & 0xFFFF
+  if version == 0 and ident in _LEGACY_DATA_VERSION_IDENTS:
+    version = disklevel
+  return disklevel, version
+
+
+class _Decoding(object):
+  # Marks a node whose data is being read, see BaseNode._read_data().
+
+  __slots__ = ('version',)
+
+  def __init__(self, version):
+    self.version = version
+
+#: The events that are timed for every #RenderJob, in the order in which
+#: they happen. See #RenderJob.get_timings().
+TIMING_EVENTS = ('queued', 'load_start', 'load_end', 'render_start', 'render_end')
+
+# Timestamps are taken from a monotonic clock (if available) that is
+# anchored to the wall clock once, so that they do not jump when the
+# system time changes but can still be saved and compared across sessions.
+_monotonic = getattr(time, 'monotonic', time.time)
+_clock_offset = time.time() - _monotonic()
+
+
+def timestamp():
+  '''
+  Returns the current time in seconds since the epoch, measured with a
+  monotonic clock. Used for the timings of #RenderJob#s.
+  '''
+
+  return _monotonic() + _clock_offset
+
 
 class BaseNode(TreeNodeBase):
   '''
@@ -83,32 +149,172 @@ class BaseNode(TreeNodeBase):
     should be rendered or skipped.
 
   selected (bool): A #bool flag that specifies whether the node is selected
-    in the GUI or not. This member is not saved during serialization.
+    in the GUI or not. This member is not saved during serialization. The
+    #Root keeps track of the selected nodes in its hierarchy.
 
   uuid (uuid.UUID): The UUID of the node. This is used to keep track of
     parent-child relationships during the serialization process with #read()
-    and #write().
+    and #write(). It is stored as an integer and a new #uuid.UUID object is
+    returned every time the attribute is accessed.
 
   # Class Members
 
-  disklevel (int): Override on class-level. The disklevel for serialization.
+  disklevel (int): Override on class-level. The disklevel for serialization,
+    at most 0xFFFF. The data of the classes of this module is versioned
+    separately, see #DATA_VERSION.
 
   ident (str): Override on class-level. The identifier for finding the right
     class to read back the node when loading a HyperFile.
 
   serializable (bool): Override on class-level. True if the implementation is
     serializable, #False if #read() and #write() raise #NotImplementedError.
+
+  lazy_payload (bool): Override on class-level. If True, the data that
+    #write() wrote is not read back with #read() when the queue is loaded,
+    but when #load_payload() is called the first time. Only the #name and
+    the header attributes (#enabled, and the status of a #RenderJob) are
+    available before. The implementation must call #load_payload() before
+    it accesses any other of its data.
+
+  The node classes of this module use `__slots__` to keep the memory
+  footprint of large queues small. Subclasses that do not define
+  `__slots__` themselves can still add arbitrary attributes.
   '''
 
+  __slots__ = ('_enabled', '_enabled_state', '_status_counts', '_uuid',
+    '_selected', '_payload')
+
   disklevel = 0
   ident = None
   serializable = False
+  lazy_payload = False
+
+  # The attributes that are written by #write_header().
+  _header_attributes = ('enabled',)
 
   def __init__(self):
     super(BaseNode, self).__init__()
-    self.enabled = True
-    self.selected = False
-    self.uuid = uuid.uuid4()
+    self._enabled = True
+    self._enabled_state = None
+    self._status_counts = None
+    self._uuid = uuid.uuid4().int
+    self._selected = False
+    self._payload = None  # (disklevel, data, name) until it is decoded
+
+  @property
+  def uuid(self):
+    return uuid.UUID(int=self._uuid)
+
+  @uuid.setter
+  def uuid(self, value):
+    self._uuid = value.int
+
+  def _notify(self, event, *args):
+    '''
+    Forwards a change *event* to the #Root of the hierarchy, if the node
+    is in a hierarchy with a #Root at all.
+    '''
+
+    if isinstance(self._payload, _Decoding):
+      return
+    root = self.get_root()
+    if isinstance(root, Root):
+      root.notify(event, self, *args)
+
+  def _on_insert(self):  #< TreeNodeBase
+    self._invalidate_enabled_state()
+    self.parent._add_status_counts(self.get_status_counts())
+    self._notify('insert')
+
+  def _on_remove(self, parent):  #< TreeNodeBase
+    self._invalidate_enabled_state()
+    parent._add_status_counts(self.get_status_counts(), -1)
+    root = parent.get_root()
+    if isinstance(root, Root):
+      root.notify('remove', self, parent)
+
+  def _add_status_counts(self, counts, sign=1):
+    '''
+    Adds the job *counts* to the status counts of the node and all of
+    its parents, or subtracts them if *sign* is -1.
+    '''
+
+    if not counts:
+      return
+    node = self
+    while node is not None:
+      if node._status_counts is None:
+        node._status_counts = {}
+      node_counts = node._status_counts
+      for status, count in counts.items():
+        count = node_counts.get(status, 0) + sign * count
+        if count:
+          node_counts[status] = count
+        else:
+          node_counts.pop(status, None)
+      node = node.parent
+
+  def get_status_count(self, status):
+    '''
+    Returns the number of #RenderJob#s with the specified *status* in
+    the tree starting at this node, including the node itself.
+    '''
+
+    count = 0
+    if self._status_counts:
+      count = self._status_counts.get(status, 0)
+    if isinstance(self, RenderJob) and self.status == status:
+      count += 1
+    return count
+
+  def get_status_counts(self):
+    '''
+    Returns a dictionary that maps the status of #RenderJob#s to the
+    number of jobs with that status in the tree starting at this node,
+    including the node itself. The counts are kept up to date when jobs
+    change their status or are moved, thus this is O(1).
+    '''
+
+    counts = dict(self._status_counts or ())
+    if isinstance(self, RenderJob):
+      counts[self.status] = counts.get(self.status, 0) + 1
+    return counts
+
+  @property
+  def selected(self):
+    return self._selected
+
+  @selected.setter
+  def selected(self, value):
+    if value != self._selected:
+      self._selected = value
+      self._notify('change', 'selected')
+
+  @property
+  def enabled(self):
+    return self._enabled
+
+  @enabled.setter
+  def enabled(self, value):
+    if value != self._enabled:
+      self._enabled = value
+      self._invalidate_enabled_state()
+      self._notify('change', 'enabled')
+
+  def _invalidate_enabled_state(self):
+    '''
+    Clears the cached #enabled_state of the node and its children. The
+    state of a node is only cached if the state of its parent is, thus
+    children of a node without cached state can be skipped.
+    '''
+
+    if self._enabled_state is None:
+      return
+    # Collect the nodes first, clearing the state during the traversal
+    # would stop it from descending into the children.
+    descend = lambda x: x._enabled_state is not None
+    for node in list(self.iter_preorder(descend, descend, True)):
+      node._enabled_state = None
 
   def get_selected_nodes(self, children=True, result=None):
     '''
@@ -117,12 +323,8 @@ class BaseNode(TreeNodeBase):
 
     if result is None:
       result = []
-    if self.selected:
-      result.append(self)
-      if not children:
-        return result
-    for child in self.iter_children():
-      child.get_selected_nodes(children, result)
+    descend = None if children else (lambda x: not x.selected)
+    result.extend(self.iter_preorder(lambda x: x.selected, descend, True))
     return result
 
   def set_selected(self, selected, recursive=False):
@@ -130,21 +332,19 @@ class BaseNode(TreeNodeBase):
     Set the selection state of the node, optionally recursively.
     '''
 
-    self.selected = selected
-    if recursive:
-      for child in self.iter_children():
-        child.set_selected(selected, True)
+    if not recursive:
+      self.selected = selected
+      return
+    for node in self.iter_preorder(include_self=True):
+      node.selected = selected
 
   def iter_tree(self, filter=None):
     '''
-    Recursively iterate over the complete tree.
+    Iterate over the complete tree in pre-order, see
+    #TreeNodeBase.iter_preorder().
     '''
 
-    for child in self.iter_children():
-      if not filter or filter(child):
-        yield child
-      for sub in child.iter_tree(filter):
-        yield sub
+    return self.iter_preorder(filter)
 
   @property
   def enabled_state(self):
@@ -156,14 +356,24 @@ class BaseNode(TreeNodeBase):
     One of `'enabled'`, `'disabled'` or `'tristate'`.
     '''
 
-    if not self.enabled:
-      return 'disabled'
-    parent = self.parent
-    while parent:
-      if not parent.enabled:
-        return 'tristate'
-      parent = parent.parent
-    return 'enabled'
+    if self._enabled_state is not None:
+      return self._enabled_state
+
+    # Compute the state for the node and all its parents that have no
+    # cached state yet, starting at the top.
+    chain = []
+    node = self
+    while node is not None and node._enabled_state is None:
+      chain.append(node)
+      node = node.parent
+    state = 'enabled' if node is None else node._enabled_state
+    for node in reversed(chain):
+      if not node._enabled:
+        state = 'disabled'
+      elif state != 'enabled':
+        state = 'tristate'
+      node._enabled_state = state
+    return state
 
   @abc.abstractproperty
   def name(self):
@@ -209,6 +419,117 @@ class BaseNode(TreeNodeBase):
     self.enabled = enabled
     return True
 
+  def write_header(self, hf):
+    '''
+    Writes the name of the node and the attributes that are available
+    before the payload of the node is loaded. See #lazy_payload.
+    '''
+
+    if not hf.WriteString(self.name or ''): return False
+    if not hf.WriteBool(self.enabled): return False
+    return True
+
+  def read_header(self, hf):
+    '''
+    Reads back the header written by #write_header(). Must only be called
+    on a node that is not in a hierarchy.
+
+    # Returns
+    The name of the node or #None if the header could not be read.
+    '''
+
+    # The attributes are assigned directly, the node is not in a
+    # hierarchy that would need to be notified.
+    name = hf.ReadString()
+    enabled = hf.ReadBool()
+    if name is None or enabled is None: return None
+    self._enabled = enabled
+    return name
+
+  @property
+  def payload_loaded(self):
+    '''
+    False if the node was loaded with a #lazy_payload that has not been
+    decoded yet.
+    '''
+
+    return not isinstance(self._payload, tuple)
+
+  def _decode_payload(self):
+    # Reads the payload with #read(). The current values of the header
+    # attributes win over the values in the payload, they may have been
+    # changed since. No events are sent while decoding.
+    disklevel, data, name = self._payload
+    disklevel, version = _split_disklevel(self.ident, disklevel)
+    state = [(x, getattr(self, x)) for x in self._header_attributes]
+    self._payload = _Decoding(version)
+    try:
+      mfs = c4d.storage.MemoryFileStruct()
+      mfs.SetMemoryReadMode(data, len(data))
+      hf = c4d.storage.HyperFile()
+      if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_READ, c4d.FILEDIALOG_NONE):
+        return False
+      try:
+        return bool(self.read(hf, disklevel))
+      finally:
+        hf.Close()
+    finally:
+      for key, value in state:
+        setattr(self, key, value)
+      self._payload = None
+
+  def _read_data(self, hf, disklevel):
+    # Reads the node with #read() from data that was saved with
+    # *disklevel* (see #get_node_payload()). No events are sent while
+    # the data is read.
+    disklevel, version = _split_disklevel(self.ident, disklevel)
+    self._payload = _Decoding(version)
+    try:
+      return bool(self.read(hf, disklevel))
+    finally:
+      self._payload = None
+
+  def _read_header_data(self, hf, disklevel):
+    # Reads the header of the node with #read_header() that was saved
+    # with the payload of *disklevel* (see #get_node_payload()).
+    self._payload = _Decoding(_split_disklevel(self.ident, disklevel)[1])
+    try:
+      return self.read_header(hf)
+    finally:
+      self._payload = None
+
+  def _get_data_version(self):
+    # Returns the #DATA_VERSION of the data that is being read, or of
+    # the payload that has not been decoded yet.
+    if isinstance(self._payload, _Decoding):
+      return self._payload.version
+    elif isinstance(self._payload, tuple):
+      return _split_disklevel(self.ident, self._payload[0])[1]
+    return DATA_VERSION
+
+  def load_payload(self):
+    '''
+    Decodes the payload of the node with #read() if it has not been
+    decoded yet, see #lazy_payload. If the payload can not be decoded, a
+    #RenderJob is marked as #STATUS_FAILED.
+
+    # Returns
+    True if the payload is loaded, False if it could not be decoded.
+    '''
+
+    if not isinstance(self._payload, tuple):
+      return True
+    profiling.count('BaseNode.load_payload')
+    try:
+      success = self._decode_payload()
+    except BaseException:
+      traceback.print_exc()
+      success = False
+    if not success and isinstance(self, RenderJob):
+      self.status = STATUS_FAILED
+      self.error_message = 'The job data could not be read.'  # xxx: localization
+    return success
+
 
 class RenderJob(BaseNode):
   '''
@@ -241,15 +562,29 @@ class RenderJob(BaseNode):
 
   resettable (bool): Class-level attribute that specifies if the job is
     resettable using #reset().
+
+  prefetchable (bool): Class-level attribute that specifies if the scene of
+    the job can be prepared while another job is still rendering. If True,
+    #prefetch() and #get_scene() may be called before the job is started.
+    See #nr.pvrq2.prefetch.
+
+  The timings of the job (see #get_timings()) are saved by #write() and
+  #read() since #DATA_VERSION 2.
   '''
 
+  __slots__ = ('_render_tr', '_status', '_error_message', '_timings')
+
   resettable = False
+  prefetchable = False
 
   def __init__(self):
     super(RenderJob, self).__init__()
-    self.render_tr = False
-    self.status = STATUS_PENDING
-    self.error_message = None
+    self._render_tr = False
+    self._status = STATUS_PENDING
+    self._error_message = None
+    self._timings = None
+
+  _header_attributes = ('enabled', 'render_tr', 'status', 'error_message')
 
   def __repr__(self):
     return '<{0} name={1!r}>'.format(type(self).__name__, self.name)
@@ -262,14 +597,108 @@ class RenderJob(BaseNode):
 
     raise NotImplementedError
 
+  @property
+  def render_tr(self):
+    return self._render_tr
+
+  @render_tr.setter
+  def render_tr(self, value):
+    if value != self._render_tr:
+      self._render_tr = value
+      self._notify('change', 'render_tr')
+
+  @property
+  def status(self):
+    return self._status
+
+  @status.setter
+  def status(self, value):
+    if value != self._status:
+      old_status, self._status = self._status, value
+      if value == STATUS_RENDERING:
+        self.mark_time('render_start')
+        self.clear_times('render_end')
+      elif old_status == STATUS_RENDERING:
+        self.mark_time('render_end')
+      if self.parent:
+        self.parent._add_status_counts({old_status: -1, value: 1})
+      self._notify('change', 'status')
+
+  @property
+  def error_message(self):
+    return self._error_message
+
+  @error_message.setter
+  def error_message(self, value):
+    if value != self._error_message:
+      self._error_message = value
+      self._notify('change', 'error_message')
+
+  def mark_time(self, event, value=None):
+    '''
+    Sets the time of the *event* (one of #TIMING_EVENTS) to *value*, or
+    to the current #timestamp() if *value* is #None. The render times are
+    set when the #status changes from or to #STATUS_RENDERING, the load
+    times by #load_scene().
+    '''
+
+    self.load_payload()
+    if self._timings is None:
+      self._timings = [None] * len(TIMING_EVENTS)
+    if value is None:
+      value = timestamp()
+    self._timings[TIMING_EVENTS.index(event)] = value
+
+  def clear_times(self, *events):
+    '''
+    Clears the times of the specified *events*.
+    '''
+
+    self.load_payload()
+    if self._timings is not None:
+      for event in events:
+        self._timings[TIMING_EVENTS.index(event)] = None
+
+  def get_timings(self):
+    '''
+    Returns a dictionary that maps the #TIMING_EVENTS to the time (see
+    #timestamp()) at which they happened the last time, or #None.
+    '''
+
+    self.load_payload()
+    timings = self._timings or [None] * len(TIMING_EVENTS)
+    return OrderedDict(zip(TIMING_EVENTS, timings))
+
+  def get_durations(self):
+    '''
+    Returns a dictionary with the seconds that it took to load the scene
+    (`'load'`), to render it (`'render'`) and from being queued until the
+    rendering finished (`'wall'`). Durations that are not known are #None.
+    '''
+
+    timings = self.get_timings()
+    def span(start, end):
+      if timings[start] is None or timings[end] is None:
+        return None
+      return timings[end] - timings[start]
+    return OrderedDict([('load', span('load_start', 'load_end')),
+      ('render', span('render_start', 'render_end')),
+      ('wall', span('queued', 'render_end'))])
+
   def get_job_details(self):
     '''
     Return a dictionary with meta information about the job.
     '''
 
-    return {
+    details = {
       'status': status_str(self.status),
       'error_message': self.error_message}
+    for key, value in self.get_durations().items():
+      if value is not None:
+        details[key + '_time'] = '{0:.1f}s'.format(value)
+    if estimator is not None:
+      details.update(estimator.get_job_details(self))
+    return details
 
   def show_job_details(self):
     '''
@@ -292,6 +721,40 @@ class RenderJob(BaseNode):
 
     raise NotImplementedError
 
+  def load_scene(self):
+    '''
+    Calls #get_scene() and records the `'load_start'` and `'load_end'`
+    timings. The render queue uses this method to load the scene of a job.
+    '''
+
+    self.mark_time('load_start')
+    self.clear_times('load_end')
+    try:
+      with profiling.timer('RenderJob.get_scene'):
+        return self.get_scene()
+    finally:
+      self.mark_time('load_end')
+
+  def get_commandline_args(self):
+    '''
+    Returns the arguments for the Cinema 4D command line renderer that
+    render the job, or #None if the job can only be rendered in the
+    Picture Viewer. See #nr.pvrq2.cmdline. The default implementation
+    returns #None.
+    '''
+
+    return None
+
+  def prefetch(self):
+    '''
+    Called from a background thread before #get_scene() if the job is
+    #prefetchable. Can be used to prepare the resources of the job, and
+    should raise an exception if the job can not be rendered. Must not
+    use the Cinema 4D API. The default implementation does nothing.
+    '''
+
+    pass
+
   def completed(self):
     '''
     Called when the render job completed. It can not be determined if it
@@ -314,6 +777,9 @@ class RenderJob(BaseNode):
     else:
       if not hf.WriteString(self.status): return False
     if not hf.WriteString(self.error_message or ''): return False
+    # Unknown times are written as 0.
+    for value in self.get_timings().values():
+      if not hf.WriteFloat64(value or 0.0): return False
     return True
 
   def read(self, hf, disklevel):
@@ -329,8 +795,42 @@ class RenderJob(BaseNode):
     self.status = hf.ReadString()
     if self.status not in STATUS_ALL: return False
     self.error_message = hf.ReadString()
+    self._timings = None
+    if self._get_data_version() >= 2:
+      timings = [hf.ReadFloat64() for __ in TIMING_EVENTS]
+      if None in timings: return False
+      if any(timings):
+        self._timings = [x or None for x in timings]
     return True
 
+  def _on_insert(self):  #< TreeNodeBase
+    super(RenderJob, self)._on_insert()
+    if self.payload_loaded and self._timings is None:
+      self.mark_time('queued')
+
+  def write_header(self, hf):  #< BaseNode
+    if not super(RenderJob, self).write_header(hf): return False
+    if not hf.WriteBool(self.render_tr): return False
+    if self.status == STATUS_RENDERING:
+      if not hf.WriteString(STATUS_CANCELLED): return False
+    else:
+      if not hf.WriteString(self.status): return False
+    if not hf.WriteString(self.error_message or ''): return False
+    return True
+
+  def read_header(self, hf):  #< BaseNode
+    name = super(RenderJob, self).read_header(hf)
+    if name is None: return None
+    render_tr = hf.ReadBool()
+    status = hf.ReadString()
+    error_message = hf.ReadString()
+    if render_tr is None or status not in STATUS_ALL or error_message is None:
+      return None
+    self._render_tr = render_tr
+    self._status = status
+    self._error_message = error_message
+    return name
+
   def reset(self):
     '''
     Reset the status of the job, allowing it to be processed
@@ -340,6 +840,7 @@ class RenderJob(BaseNode):
 
     self.status = STATUS_PENDING
     self.error_message = None
+    self.clear_times(*TIMING_EVENTS[1:])
 
 
 class Folder(BaseNode):
@@ -355,6 +856,10 @@ class Folder(BaseNode):
   ```
   '''
 
+  __slots__ = ('name', 'open')
+
+  indexed_children = True
+
   def __init__(self, name='???'):
     super(Folder, self).__init__()
     self.name = name
@@ -366,7 +871,6 @@ class Folder(BaseNode):
 
   #< BaseNode
 
-  name = None
   ident = 'nr.pvrq2.Folder'
   serializable = True
 
@@ -387,92 +891,525 @@ class Folder(BaseNode):
 class Root(BaseNode):
   '''
   Represents the root of the render queue. Contains folders and jobs.
+
+  All nodes in the hierarchy of a root report their changes to it and the
+  root passes them on to its listeners. A listener is called with an event
+  name, the node that the event occurred on and additional arguments:
+
+  * `'insert'` after the node was inserted into the hierarchy
+  * `'remove'` after the node was removed, with its old parent
+  * `'change'` after an attribute of the node has changed, with the name
+    of the attribute (`'enabled'`, `'selected'`, `'render_tr'`, `'status'`,
+    `'error_message'` or `'skip_existing'`)
+
+  Note that moving a node is a `'remove'` followed by an `'insert'` event.
+
+  The root also keeps the set of selected nodes in its hierarchy, thus
+  #get_selected_nodes() and clearing the selection with #set_selected()
+  are O(selected) instead of O(tree).
+
+  # Attributes
+
+  listeners (list of callable): The listeners of the root.
+
+  version (int): Incremented with every event. A view can compare it with
+    the version it last displayed to find out if it needs to be refreshed.
   '''
 
-  pass
+  __slots__ = ('listeners', 'version', '_selection')
+
+  indexed_children = True
+
+  def __init__(self):
+    super(Root, self).__init__()
+    self.listeners = []
+    self.version = 0
+    self._selection = set()
+
+  def get_selected_nodes(self, children=True, result=None):  #< BaseNode
+    selection = self._selection
+    nodes = []
+    for node in selection:
+      if not children:
+        parent = node.parent
+        while parent is not None and parent not in selection:
+          parent = parent.parent
+        if parent is not None:
+          continue
+      nodes.append(node)
+    nodes.sort(key=lambda x: x.get_path())
+    if result is None:
+      result = []
+    result.extend(nodes)
+    return result
+
+  def set_selected(self, selected, recursive=False):  #< BaseNode
+    if selected or not recursive:
+      super(Root, self).set_selected(selected, recursive)
+      return
+    for node in list(self._selection):
+      node.selected = False
+
+  def add_listener(self, listener):
+    '''
+    Add a *listener* that will be notified about changes in the hierarchy.
+    '''
+
+    if listener not in self.listeners:
+      self.listeners.append(listener)
+
+  def remove_listener(self, listener):
+    '''
+    Remove a *listener* that was added with #add_listener().
+    '''
+
+    if listener in self.listeners:
+      self.listeners.remove(listener)
+
+  def notify(self, event, node, *args):
+    '''
+    Pass the *event* that occurred on *node* on to all listeners. An
+    exception in a listener is printed and does not keep the event from
+    the other listeners.
+    '''
+
+    self.version += 1
+    if event == 'change':
+      if args[0] == 'selected':
+        if node.selected:
+          self._selection.add(node)
+        else:
+          self._selection.discard(node)
+    elif event == 'insert' or (event == 'remove' and self._selection):
+      selected = node.iter_preorder(lambda x: x.selected, include_self=True)
+      if event == 'insert':
+        self._selection.update(selected)
+      else:
+        self._selection.difference_update(selected)
+
+    for listener in list(self.listeners):
+      try:
+        listener(event, node, *args)
+      except Exception:
+        traceback.print_exc()
 
 
 class FileRenderJob(RenderJob):
   '''
   This class implements a render job from a scene file.
+
+  If #skip_existing is set, the frames that already exist in the output
+  location of the scene are not rendered again, see #nr.pvrq2.frames.
+
+  The #filename is saved in the header of the job as well, it is
+  available without decoding the payload. See #peek_filename().
   '''
 
+  __slots__ = ('_filename', '_skip_existing')
+
   def __init__(self, filename=''):
     super(FileRenderJob, self).__init__()
-    self.filename = filename
+    self._filename = filename
+    self._skip_existing = False
+
+  @property
+  def filename(self):
+    if self._filename is None:
+      self.load_payload()
+    return self._filename
+
+  @filename.setter
+  def filename(self, value):
+    self.load_payload()
+    self._filename = value
+
+  @property
+  def skip_existing(self):
+    self.load_payload()
+    return self._skip_existing
+
+  @skip_existing.setter
+  def skip_existing(self, value):
+    self.load_payload()
+    if value != self._skip_existing:
+      self._skip_existing = value
+      self._notify('change', 'skip_existing')
+
+  def peek_filename(self):
+    '''
+    Returns the #filename if it is known without decoding the payload of
+    the job (see #BaseNode.lazy_payload), otherwise #None.
+    '''
+
+    return self._filename
 
   #< BaseNode
 
   @property
   def name(self):
-    return os.path.basename(self.filename)
+    if not self.payload_loaded:
+      return self._payload[2]
+    return os.path.basename(self._filename)
 
   ident = 'nr.pvrq2.FileRenderJob'
   serializable = True
+  lazy_payload = True
 
   def write(self, hf):
     if not super(FileRenderJob, self).write(hf): return False
     if not hf.WriteFilename(self.filename): return False
+    if not hf.WriteBool(self.skip_existing): return False
     return True
 
   def read(self, hf, disklevel):
     if not super(FileRenderJob, self).read(hf, disklevel): return False
     self.filename = hf.ReadFilename()
     if self.filename is None: return False
+    if self._get_data_version() >= 1:
+      self.skip_existing = hf.ReadBool()
+      if self.skip_existing is None: return False
     return True
 
+  def write_header(self, hf):
+    if not super(FileRenderJob, self).write_header(hf): return False
+    # The header of a payload that was not decoded is written in the
+    # format of the payload.
+    if self._get_data_version() >= 3:
+      if not hf.WriteFilename(self._filename or ''): return False
+    return True
+
+  def read_header(self, hf):
+    name = super(FileRenderJob, self).read_header(hf)
+    if name is None: return None
+    self._filename = None
+    if self._get_data_version() >= 3:
+      self._filename = hf.ReadFilename()
+      if self._filename is None: return None
+    return name
+
   #< RenderJob
 
   resettable = True
+  prefetchable = True
 
   def get_job_details(self):
     details = super(FileRenderJob, self).get_job_details()
     details['filename'] = self.filename
+    details['skip_existing'] = self.skip_existing
     return details
 
+  def get_commandline_args(self):
+    # Team Render is only available in the Picture Viewer. The existing
+    # frames are checked on the main thread before rendering.
+    if self.render_tr or self.skip_existing:
+      return None
+    return ['-render', self.filename]
+
+  def prefetch(self):
+    from .prefetch import warm_file
+    warm_file(self.filename)
+
   def get_scene(self):
     flags = c4d.SCENEFILTER_OBJECTS | c4d.SCENEFILTER_MATERIALS
     doc = c4d.documents.LoadDocument(self.filename, flags)
     if not doc:
-      self.error_message = res.string('IDS_ERROR_FILENOTLOADED', self.filename)
+      # The resource is not loaded outside of the plugin, eg. in a farm
+      # worker (see #nr.pvrq2.farm).
+      if res is not None:
+        self.error_message = res.string('IDS_ERROR_FILENOTLOADED', self.filename)
+      else:
+        self.error_message = "File '{0}' could not be loaded.".format(self.filename)
       return None
     return doc
 
 
+class ChunkRenderJob(FileRenderJob):
+  '''
+  Renders the frames *frame_from* to *frame_to* (inclusive) of a scene
+  file, every *frame_step*-th frame. The frame range of the document is
+  replaced by this range. See #split_job().
+  '''
+
+  __slots__ = ('frame_from', 'frame_to', 'frame_step')
+
+  def __init__(self, filename='', frame_from=0, frame_to=0, frame_step=1):
+    super(ChunkRenderJob, self).__init__(filename)
+    self.frame_from = frame_from
+    self.frame_to = frame_to
+    self.frame_step = frame_step
+
+  #< BaseNode
+
+  @property
+  def name(self):
+    if not self.payload_loaded:
+      return self._payload[2]
+    return '{0} [{1}-{2}]'.format(os.path.basename(self._filename),
+      self.frame_from, self.frame_to)
+
+  ident = 'nr.pvrq2.ChunkRenderJob'
+  lazy_payload = False
+
+  def write(self, hf):
+    if not super(ChunkRenderJob, self).write(hf): return False
+    if not hf.WriteInt32(self.frame_from): return False
+    if not hf.WriteInt32(self.frame_to): return False
+    if not hf.WriteInt32(self.frame_step): return False
+    return True
+
+  def read(self, hf, disklevel):
+    if not super(ChunkRenderJob, self).read(hf, disklevel): return False
+    self.frame_from = hf.ReadInt32()
+    self.frame_to = hf.ReadInt32()
+    self.frame_step = hf.ReadInt32()
+    if None in (self.frame_from, self.frame_to, self.frame_step): return False
+    return True
+
+  #< RenderJob
+
+  def get_job_details(self):
+    details = super(ChunkRenderJob, self).get_job_details()
+    details['frames'] = '{0}-{1}'.format(self.frame_from, self.frame_to)
+    return details
+
+  def get_commandline_args(self):
+    args = super(ChunkRenderJob, self).get_commandline_args()
+    if args is None:
+      return None
+    return args + ['-frame', str(self.frame_from), str(self.frame_to),
+      str(self.frame_step)]
+
+  def get_scene(self):
+    doc = super(ChunkRenderJob, self).get_scene()
+    if not doc:
+      return doc
+    fps = doc.GetFps()
+    rd = doc.GetActiveRenderData()
+    rd[c4d.RDATA_FRAMESEQUENCE] = c4d.RDATA_FRAMESEQUENCE_MANUAL
+    rd[c4d.RDATA_FRAMEFROM] = c4d.BaseTime(self.frame_from, fps)
+    rd[c4d.RDATA_FRAMETO] = c4d.BaseTime(self.frame_to, fps)
+    rd[c4d.RDATA_FRAMESTEP] = self.frame_step
+    return doc
+
+
+def dump_node_data(node):
+  '''
+  Returns the data that #BaseNode.write() writes for *node* (without its
+  children) as #bytes, or #None if it could not be written.
+  '''
+
+  mfs = c4d.storage.MemoryFileStruct()
+  mfs.SetMemoryWriteMode()
+  hf = c4d.storage.HyperFile()
+  if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_WRITE, c4d.FILEDIALOG_NONE):
+    return None
+  try:
+    success = node.write(hf)
+  finally:
+    hf.Close()
+  if not success:
+    return None
+  data, size = mfs.GetData()
+  return bytes(data[:size])
+
+
+def get_node_payload(node):
+  '''
+  Returns a tuple of the disklevel and the data of *node* as returned by
+  #dump_node_data(), or #None if it could not be written. The disklevel
+  contains the #BaseNode.disklevel of *node* in its lower 16 bits and
+  the #DATA_VERSION above. If the payload of the node was never decoded
+  (see #BaseNode.lazy_payload), the data that was read is returned
+  unchanged.
+  '''
+
+  if not node.payload_loaded:
+    return node._payload[:2]
+  data = dump_node_data(node)
+  if data is None:
+    return None
+  return (_join_disklevel(node.disklevel), data)
+
+
+def _iter_serializable_children(node):
+  # Iterates over the serializable children of *node*. The serializable
+  # children of a child that is not serializable take its place.
+  serializable = lambda x: x.serializable
+  return node.iter_preorder(serializable, lambda x: x is node or not x.serializable)
+
+
+def _int64_pair(value):
+  # Splits a 128 bit unsigned integer into two signed 64 bit integers.
+  pair = []
+  for part in (value >> 64, value & 0xFFFFFFFFFFFFFFFF):
+    pair.append(part - (1 << 64) if part >= (1 << 63) else part)
+  return pair
+
+
+def _from_int64_pair(high, low):
+  return ((high & 0xFFFFFFFFFFFFFFFF) << 64) | (low & 0xFFFFFFFFFFFFFFFF)
+
+
+@profiling.timed('write_nodes')
 def write_nodes(root, hf):
   '''
-  Writes all nodes of *root* into the HyperFile *hf*.
+  Writes *root* and all nodes in its hierarchy into the HyperFile *hf*
+  as a single chunk with the ID 2. The chunk contains the number of
+  top-level nodes, followed by the nodes in pre-order. Every node is
+  written as
+
+  * the index of its plugin identifier and disklevel in a table, which
+    follow the index the first time that it is used,
+  * its UUID as two 64 bit integers,
+  * its number of children,
+  * a chunk with the ID 3 that contains the header of the node (see
+    #BaseNode.write_header()) and the data written by #BaseNode.write()
+    as a memory block (the payload).
+
+  Nodes that are not serializable are skipped, their children take their
+  place.
 
   Note that this function can raise any exception that any
   of the #BaseNode.write() implementations could raise.
   '''
 
+  # Skipping the nodes that are not serializable in a pre-order
+  # traversal gives the pre-order of the tree in which their children
+  # took their place.
+  serializable = lambda x: x.serializable
   if root.serializable:
-    if not hf.WriteChunkStart(0, 0): return False
-    if not hf.WriteString(root.ident): return False
-    if not hf.WriteInt32(root.disklevel): return False
-    if not hf.WriteString(str(root.uuid)): return False
-
-    # Write the parent UUID.
-    if root.parent:
-      if not hf.WriteString(str(root.parent.uuid)): return False
-    else:
-      if not hf.WriteString(''): return False
+    top_level = 1
+  else:
+    top_level = sum(1 for __ in _iter_serializable_children(root))
+  nodes = root.iter_preorder(serializable, include_self=root.serializable)
 
-    if not root.write(hf): return False
+  if not hf.WriteChunkStart(2, 0): return False
+  if not hf.WriteInt32(top_level): return False
+  table = {}
+  for node in nodes:
+    payload = get_node_payload(node)
+    if payload is None: return False
+    disklevel, data = payload
+    child_count = sum(1 for __ in _iter_serializable_children(node))
+
+    key = (node.ident, disklevel)
+    index = table.get(key)
+    if index is None:
+      index = table[key] = len(table)
+      if not hf.WriteInt32(index): return False
+      if not hf.WriteString(node.ident): return False
+      if not hf.WriteInt32(disklevel): return False
+    else:
+      if not hf.WriteInt32(index): return False
+    for value in _int64_pair(node._uuid):
+      if not hf.WriteInt64(value): return False
+    if not hf.WriteInt32(child_count): return False
+
+    if not hf.WriteChunkStart(3, 0): return False
+    if not node.write_header(hf): return False
+    if not hf.WriteMemory(data): return False
     if not hf.WriteChunkEnd(): return False
 
-  for node in root.iter_children():
-    if not write_nodes(node, hf):
+  if not hf.WriteChunkEnd(): return False
+  return True
+
+
+def _read_node(hf, ident, disklevel, node_uuid, with_header, error_callback):
+  # Creates a node of the plugin *ident* and reads it from *hf*, either
+  # with #BaseNode.read() or from a header and payload. Returns None and
+  # calls the *error_callback* if that fails.
+  if ident not in job_plugins:
+    error_callback('unknown-plugin', ident)
+    return None
+
+  try:
+    node = job_plugins[ident]()
+    node.uuid = node_uuid
+    if not with_header:
+      success = node._read_data(hf, disklevel)
+    else:
+      name = node._read_header_data(hf, disklevel)
+      data = hf.ReadMemory()
+      success = name is not None and data is not None
+      if success:
+        node._payload = (disklevel, bytes(data), name)
+        if not node.lazy_payload:
+          success = node._decode_payload()
+    if not success:
+      error_callback('read-error', node)
+      return None
+  except BaseException as exc:
+    error_callback('read-exception', exc)
+    return None
+
+  if not isinstance(node, BaseNode):
+    error_callback('read-wrong-result', node)
+    return None
+  return node
+
+
+def _read_container(hf, error_callback):
+  # Reads the content of a chunk written by #write_nodes(). Returns the
+  # list of top-level nodes or False if the data is invalid.
+  count = hf.ReadInt32()
+  if count is None or count < 0:
+    return False
+  table = []
+  result = []
+  stack = [[None, count]]  # parent node, number of children left to read
+  while stack:
+    frame = stack[-1]
+    if frame[1] <= 0:
+      stack.pop()
+      continue
+    frame[1] -= 1
+
+    # The index is either in the table or the next entry of it.
+    index = hf.ReadInt32()
+    if index is None or not 0 <= index <= len(table):
       return False
+    if index == len(table):
+      ident = hf.ReadString()
+      disklevel = hf.ReadInt32()
+      if ident is None or disklevel is None:
+        return False
+      table.append((ident, disklevel))
+    ident, disklevel = table[index]
+    high = hf.ReadInt64()
+    low = hf.ReadInt64()
+    child_count = hf.ReadInt32()
+    if high is None or low is None or child_count is None or child_count < 0:
+      return False
+    node_uuid = uuid.UUID(int=_from_int64_pair(high, low))
 
-  return True
+    if hf.ReadValueHeader() != c4d.HYPERFILEVALUE_START or not hf.ReadChunkStart():
+      return False
+    try:
+      node = _read_node(hf, ident, disklevel, node_uuid, True, error_callback)
+    finally:
+      hf.SkipToEndChunk()
+
+    # The children of a node that could not be read are added to its
+    # parent instead.
+    parent = frame[0]
+    if node is not None:
+      if parent is None:
+        result.append(node)
+      else:
+        parent.append(node)
+      parent = node
+    stack.append([parent, child_count])
+  return result
 
 
+@profiling.timed('read_nodes')
 def read_nodes(hf, error_callback=None):
   '''
   Reads all nodes back from the HyperFile *hf* and returns all
-  root nodes in a list.
+  root nodes in a list. The payload of nodes with a
+  #BaseNode.lazy_payload is not decoded. Files that were written by
+  older versions (one chunk per node with the ID 0 or 1) can be read
+  as well.
 
   # Parameters
 
@@ -481,14 +1418,16 @@ def read_nodes(hf, error_callback=None):
     error type string and a data value. Possible type strings are:
 
     * `'unknown-plugin'` with the identifier as its data
+    * `'read-error'` with the node as its data
     * `'read-exception'` with the Python exception as its data
     * `'read-wrong-result'` with the wrong object returned
 
   # Returns
-  #list of #BaseNode.
+  #list of #BaseNode or False if the data is invalid.
   '''
 
   nodes = OrderedDict()
+  parentless = []
   if not error_callback:
     error_callback = lambda k, v: None
 
@@ -496,6 +1435,17 @@ def read_nodes(hf, error_callback=None):
     chunk = hf.ReadChunkStart()
     if not chunk:
       return False
+    chunk_id = chunk['id'] if isinstance(chunk, dict) else chunk[0]
+
+    if chunk_id == 2:
+      try:
+        result = _read_container(hf, error_callback)
+      finally:
+        hf.SkipToEndChunk()
+      if result is False:
+        return False
+      parentless.extend(result)
+      continue
 
     # Read the node header information.
     ident = hf.ReadString()
@@ -506,45 +1456,70 @@ def read_nodes(hf, error_callback=None):
       return False
 
     node_uuid = uuid.UUID(node_uuid)
-    parent_uuid = uuid.UUID(parent_uuid)
+    parent_uuid = uuid.UUID(parent_uuid) if parent_uuid else None
 
     try:
-      if ident not in job_plugins:
-        error_callback('unknown-plugin', ident)
-        continue
-
-      try:
-        node = job_plugins[ident]()
-        node.uuid = node_uuid
-        if not node.read(hf, disklevel):
-          error_callback('read-error', node)
-          continue
-      except BaseException as exc:
-        error_callback('read-exception', exc)
-        continue
-
-      if not isinstance(node, BaseNode):
-        error_callback('read-wrong-result', node)
-        continue
+      node = _read_node(hf, ident, disklevel, node_uuid, chunk_id != 0,
+        error_callback)
     finally:
       hf.SkipToEndChunk()
+    if node is not None:
+      nodes[node_uuid] = (node, parent_uuid)
 
-    nodes[node_uuid] = (node, parent_uuid)
-
-  # Re-establish the child/parent relationships.
-  parentless = []
+  # Re-establish the child/parent relationships of the nodes that were
+  # written with their parent UUID in a single pass. Nodes are always
+  # appended to their parent, thus the order of siblings is the same as
+  # in the file.
   for node, parent_uuid in nodes.itervalues():
-    try:
-      parent = nodes[parent_uuid][0]
-    except KeyError:
+    parent = nodes.get(parent_uuid)
+    if parent is None:
       parentless.append(node)
-      continue
     else:
-      parent.append(node)
+      parent[0].append(node)
 
   return parentless
 
 
+def dump_nodes(root):
+  '''
+  Like #write_nodes(), but writes the nodes into memory.
+
+  # Returns
+  #bytes or #None if the nodes could not be written.
+  '''
+
+  mfs = c4d.storage.MemoryFileStruct()
+  mfs.SetMemoryWriteMode()
+  hf = c4d.storage.HyperFile()
+  if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_WRITE, c4d.FILEDIALOG_NONE):
+    return None
+  try:
+    success = write_nodes(root, hf)
+  finally:
+    hf.Close()
+  if not success:
+    return None
+  data, size = mfs.GetData()
+  return bytes(data[:size])
+
+
+def load_nodes(data, error_callback=None):
+  '''
+  Like #read_nodes(), but reads the nodes from *data* which must have
+  been returned by #dump_nodes().
+  '''
+
+  mfs = c4d.storage.MemoryFileStruct()
+  mfs.SetMemoryReadMode(data, len(data))
+  hf = c4d.storage.HyperFile()
+  if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_READ, c4d.FILEDIALOG_NONE):
+    return False
+  try:
+    return read_nodes(hf, error_callback)
+  finally:
+    hf.Close()
+
+
 def register_node_plugin(cls):
   '''
   Registers a BaseNode subclass to PV Render Queue, allowing instances
@@ -574,6 +1549,15 @@ def get_cache_filename():
   return os.path.join(c4d.storage.GeGetC4DPath(c4d.C4D_PATH_PREFS), 'pvrq2.hf')
 
 
+def get_journal_filename():
+  '''
+  Returns the filename of the journal that records the changes to the
+  queue since the cache was last saved. See #nr.pvrq2.journal.
+  '''
+
+  return get_cache_filename() + '.journal'
+
+
 def is_rendering(node=None):
   '''
   :returns: True if any of the nodes in the tree starting at *node*
@@ -582,13 +1566,7 @@ def is_rendering(node=None):
 
   if node is None:
     node = root
-
-  if isinstance(node, RenderJob) and node.status == STATUS_RENDERING:
-    return True
-  for child in node.iter_children():
-    if is_rendering(child):
-      return True
-  return False
+  return node.get_status_count(STATUS_RENDERING) > 0
 
 
 def delete_node(node):
@@ -610,18 +1588,11 @@ def move_selected(direction):
   '''
   Move the selected nodes up or down.
 
-  :param direction: ``'up'`` or ``'down'``
+  :param direction: ``'up'``, ``'down'``, ``'top'`` or ``'bottom'``
+  :returns: The number of nodes that have been moved.
   '''
 
-  if direction not in ('up', 'down'):
-    raise ValueError('invalid direction', direction)
-
-  nodes = root.get_selected_nodes(children=False)
-  if direction == 'down':
-    nodes.reverse()
-  for node in nodes:
-    if not move_node(node, direction):
-      return
+  return move_nodes(root.get_selected_nodes(children=False), direction)
 
 
 def move_node(node, direction):
@@ -633,25 +1604,143 @@ def move_node(node, direction):
   :returns: True if the node was moved, False if not.
   '''
 
-  ref = None
-  from_folder = isinstance(node.parent, Folder)
+  ref = _get_move_ref(node, direction)
+  if not ref:
+    return False
+  _move_to_ref(node, ref, direction)
+  return True
+
+
+def move_nodes(nodes, direction=None, target=None, index=None):
+  '''
+  Move multiple *nodes* at once, either into a *direction* or to the
+  *index* in the children of *target*. Nodes that are children of another
+  node in *nodes* are moved with their parent. The new layout is computed
+  in one pass, thus the caller only needs to send one change notification
+  (ie. #c4d.EventAdd()) afterwards.
+
+  When moving up or down, nodes that can not be moved (eg. because they
+  are already at the top) stay in place while the others still move,
+  unless they would need to pass a node that stays in place.
+
+  :param nodes: A list of :class:`BaseNode` objects in the same tree.
+  :param direction: ``'up'`` or ``'down'`` to move the nodes by one
+    position like :func:`move_node`, ``'top'`` or ``'bottom'`` to move
+    them to the beginning or end of their parent.
+  :param target: Move the nodes into this node instead of into a
+    *direction*.
+  :param index: The position in the children of *target* to insert the
+    nodes at, counted before the nodes are removed. None to append them.
+  :raise ValueError: If *direction* is invalid or *target* is one of the
+    *nodes* or their children.
+  :returns: The number of nodes that have been moved.
+  '''
 
+  if (direction is None) == (target is None):
+    raise ValueError('expected either direction or target')
+  if direction not in (None, 'up', 'down', 'top', 'bottom'):
+    raise ValueError('invalid direction', direction)
+
+  # Drop nodes that are moved with their parent and bring the rest into
+  # the order of the tree.
+  moving = set(nodes)
+  nodes = []
+  for node in moving:
+    parent = node.parent
+    while parent is not None and parent not in moving:
+      parent = parent.parent
+    if parent is None and node.parent is not None:
+      nodes.append(node)
+  nodes.sort(key=lambda x: x.get_path())
+  moving = set(nodes)
+
+  if target is not None:
+    parent = target
+    while parent is not None:
+      if parent in moving:
+        raise ValueError('can not move nodes into themselves', target)
+      parent = parent.parent
+    anchor = None
+    if index is not None and index < target.get_child_count():
+      anchor = target.get_child(index)
+    while anchor is not None and anchor in moving:
+      anchor = anchor.next
+    for node in nodes:
+      node.remove()
+      if anchor is not None:
+        node.insert_before(anchor)
+      else:
+        target.append(node)
+    return len(nodes)
+
+  if direction in ('top', 'bottom'):
+    groups = OrderedDict()
+    for node in nodes:
+      group = groups.get(node.parent)
+      if group is None:
+        group = groups[node.parent] = []
+      group.append(node)
+    moved = 0
+    for parent, group in groups.iteritems():
+      if direction == 'bottom':
+        group.reverse()
+      ref = None
+      for node in group:
+        if direction == 'top':
+          edge = ref.next if ref else parent.down
+        else:
+          edge = ref.pred if ref else parent.down_last
+        if node is not edge:
+          node.remove()
+          if ref is None:
+            parent.append(node, 0 if direction == 'top' else None)
+          elif direction == 'top':
+            node.insert_after(ref)
+          else:
+            node.insert_before(ref)
+          moved += 1
+        ref = node
+    return moved
+
+  if direction == 'down':
+    nodes.reverse()
+  moved = 0
+  blocked = set()
+  for node in nodes:
+    ref = _get_move_ref(node, direction)
+    if not ref or ref in blocked:
+      blocked.add(node)
+      continue
+    _move_to_ref(node, ref, direction)
+    moved += 1
+  return moved
+
+
+def _get_move_ref(node, direction):
+  '''
+  Returns the node that *node* would be moved before or after (or into,
+  if it is a :class:`Folder`) when moving it by one position into the
+  specified *direction*, or None if it can not be moved.
+  '''
+
+  from_folder = isinstance(node.parent, Folder)
   if direction == 'up':
     if node.parent.down is not node:
-      ref = node.pred
+      return node.pred
     elif from_folder:
-      ref = node.parent
+      return node.parent
   elif direction == 'down':
     if node.parent.down_last is not node:
-      ref = node.next
+      return node.next
     elif from_folder:
-      ref = node.parent
+      return node.parent
   else:
     raise ValueError('invalid direction', direction)
+  return None
 
-  if not ref:
-    return False
 
+def _move_to_ref(node, ref, direction):
+  from_folder = isinstance(node.parent, Folder)
   node.remove()
   if direction == 'up':
     if not from_folder and isinstance(ref, Folder):
@@ -664,7 +1753,108 @@ def move_node(node, direction):
     else:
       node.insert_after(ref)
 
-  return True
+
+def get_frame_range(doc):
+  '''
+  Returns the first frame, the last frame and the frame step that the
+  render settings of the BaseDocument *doc* render.
+  '''
+
+  fps = doc.GetFps()
+  rd = doc.GetActiveRenderData()
+  sequence = rd[c4d.RDATA_FRAMESEQUENCE]
+  if sequence == c4d.RDATA_FRAMESEQUENCE_CURRENTFRAME:
+    frame = doc.GetTime().GetFrame(fps)
+    return frame, frame, 1
+  elif sequence == c4d.RDATA_FRAMESEQUENCE_ALLFRAMES:
+    start, end = doc.GetMinTime(), doc.GetMaxTime()
+  elif sequence == c4d.RDATA_FRAMESEQUENCE_PREVIEWRANGE:
+    start, end = doc.GetLoopMinTime(), doc.GetLoopMaxTime()
+  else:
+    start, end = rd[c4d.RDATA_FRAMEFROM], rd[c4d.RDATA_FRAMETO]
+  return start.GetFrame(fps), end.GetFrame(fps), max(1, rd[c4d.RDATA_FRAMESTEP])
+
+
+def split_job(job, chunk_size, frame_range=None):
+  '''
+  Replaces the #FileRenderJob *job* with #ChunkRenderJob#s that render at
+  most *chunk_size* frames each, see #replace_with_chunks(). Every chunk
+  can fail, be reset and be rendered on its own.
+
+  # Parameters
+  job (FileRenderJob): The job to split. Must not be rendering.
+  chunk_size (int): The number of frames per chunk.
+  frame_range (tuple): The first frame, last frame and frame step to
+    split. Read from the scene of the job with #get_frame_range() if
+    it is #None.
+
+  # Raises
+  ValueError: If the job is rendering, *chunk_size* is smaller than 1,
+    the scene of the job could not be loaded or the frame range is empty.
+
+  # Returns
+  The list of the #ChunkRenderJob#s.
+  '''
+
+  if job.status == STATUS_RENDERING:
+    raise ValueError('the job is rendering')
+  if chunk_size < 1:
+    raise ValueError('chunk_size must be at least 1')
+  if frame_range is None:
+    doc = job.get_scene()
+    if not doc:
+      raise ValueError(job.error_message or 'the scene could not be loaded')
+    frame_range = get_frame_range(doc)
+
+  first, last, step = frame_range
+  if last < first or step < 1:
+    raise ValueError('the frame range {0}-{1} is empty'.format(first, last))
+  last = first + (last - first) // step * step
+  ranges = []
+  for start in range(first, last + 1, chunk_size * step):
+    ranges.append((start, min(start + (chunk_size - 1) * step, last), step))
+  return replace_with_chunks(job, ranges)
+
+
+def replace_with_chunks(job, ranges):
+  '''
+  Replaces the #FileRenderJob *job* with a #ChunkRenderJob for every
+  `(frame_from, frame_to, frame_step)` tuple in *ranges*. If the job is
+  in a #Folder, the chunks take its place in that folder. Otherwise they
+  are put into a new #Folder with the name of the job, as folders can
+  not be nested.
+
+  # Raises
+  ValueError: If *ranges* is empty. The job is left untouched.
+
+  # Returns
+  The list of the #ChunkRenderJob#s.
+  '''
+
+  if not ranges:
+    raise ValueError('no frames to render')
+  chunks = []
+  for frame_from, frame_to, frame_step in ranges:
+    chunk = ChunkRenderJob(job.filename, frame_from, frame_to, frame_step)
+    chunk.render_tr = job.render_tr
+    chunk.enabled = job.enabled
+    chunks.append(chunk)
+
+  parent = job.parent
+  if isinstance(parent, Folder):
+    for chunk in chunks:
+      chunk.insert_before(job)
+  else:
+    folder = Folder(job.name)
+    folder.enabled = job.enabled
+    for chunk in chunks:
+      chunk.enabled = True
+      folder.append(chunk)
+    if parent:
+      folder.insert_before(job)
+  if parent:
+    job.remove()
+  return chunks
 
 
 def cancel_rendering():
@@ -678,22 +1868,26 @@ def cancel_rendering():
   return not c4d.CheckIsRunning(c4d.CHECKISRUNNING_EXTERNALRENDERING)
 
 
+def load_status_strings():
+  '''
+  Loads the localized strings of all statuses in :data:`STATUS_ALL` from
+  :data:`res`. Called once when the plugin is loaded, :func:`status_str`
+  does not access the resource afterwards.
+  '''
+
+  status_strings.clear()
+  for status in STATUS_ALL:
+    status_strings[status] = res.string('IDS_STATUS_' + status.upper())
+
+
 def status_str(status):
   '''
   Converts a render job status to a localized string.
   '''
 
-  if status == STATUS_PENDING:
-    return res.string('IDS_STATUS_PENDING')
-  elif status == STATUS_RENDERING:
-    return res.string('IDS_STATUS_RENDERING')
-  elif status == STATUS_COMPLETED:
-    return res.string('IDS_STATUS_COMPLETED')
-  elif status == STATUS_FAILED:
-    return res.string('IDS_STATUS_FAILED')
-  elif status == STATUS_CANCELLED:
-    return res.string('IDS_STATUS_CANCELLED')
-  return '-- invalid status --'
+  if not status_strings:
+    load_status_strings()
+  return status_strings.get(status, '-- invalid status --')
 
 
 #: :class:`Root` object that contains all :class:`RenderJob` and
@@ -702,3 +1896,4 @@ root = Root()
 
 register_node_plugin(Folder)
 register_node_plugin(FileRenderJob)
+register_node_plugin(ChunkRenderJob)
@@ -0,0 +1,247 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Renders jobs in parallel with a pool of Cinema 4D command line renderer
+processes. Only jobs that return arguments from
+#nr.pvrq2.RenderJob.get_commandline_args() can be rendered this way.
+"""
+
+from . import STATUS_RENDERING, STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED
+import c4d
+import os
+import subprocess
+import sys
+import time
+import traceback
+
+
+def find_commandline_executable():
+  '''
+  Returns the filename of the command line renderer that is installed
+  next to the running Cinema 4D application or #None if it could not be
+  found.
+  '''
+
+  app = c4d.storage.GeGetStartupApplication()
+  directory = os.path.dirname(app)
+  if sys.platform.startswith('win'):
+    candidates = ['Commandline.exe']
+  elif sys.platform == 'darwin':
+    # The application is inside "Cinema 4D.app/Contents/MacOS".
+    directory = os.path.dirname(os.path.dirname(os.path.dirname(app)))
+    candidates = ['Commandline.app/Contents/MacOS/Commandline']
+  else:
+    candidates = ['Commandline']
+  for name in candidates:
+    filename = os.path.join(directory, name)
+    if os.path.isfile(filename):
+      return filename
+  return None
+
+
+def read_log_tail(filename, max_lines=20):
+  '''
+  Returns the last *max_lines* lines of the file *filename*.
+  '''
+
+  try:
+    with open(filename, 'rb') as fp:
+      lines = fp.read().decode('utf8', 'replace').splitlines()
+  except (IOError, OSError):
+    return ''
+  return '\n'.join(lines[-max_lines:])
+
+
+class Process(object):
+  '''
+  A command line renderer process that renders a job.
+
+  # Attributes
+
+  job (nr.pvrq2.RenderJob): The job that is rendered.
+
+  popen (subprocess.Popen): The renderer process.
+
+  log_filename (str): The file that the output of the process is
+    written to.
+
+  slot (int): The index of the process in the pool, determines the cores
+    that the process is bound to.
+
+  started (float): The time when the process was started.
+  '''
+
+  def __init__(self, job, popen, log_filename, slot):
+    super(Process, self).__init__()
+    self.job = job
+    self.popen = popen
+    self.log_filename = log_filename
+    self.slot = slot
+    self.started = time.time()
+
+
+class CommandlinePool(object):
+  '''
+  A bounded pool of command line renderer processes. #start() launches a
+  process for a job and sets it to #nr.pvrq2.STATUS_RENDERING, #poll()
+  sets the jobs of finished processes to #nr.pvrq2.STATUS_COMPLETED if
+  the exit code is 0, otherwise to #nr.pvrq2.STATUS_FAILED with the end
+  of the log as the error message.
+
+  # Parameters
+
+  executable (str): The command line renderer, see
+    #find_commandline_executable(). Any program that accepts the same
+    arguments can be used, eg. a stand-in for testing.
+
+  processes (int): The maximum number of processes that run at the
+    same time.
+
+  threads (int): The number of render threads per process. Passed to the
+    renderer with `-threads`, unless it is 0.
+
+  affinity (bool): Bind each process to its own *threads* cores.
+    Requires #os.sched_setaffinity() (Linux) and *threads*.
+
+  log_dir (str): The directory that the output of the processes is
+    written to. Defaults to the Cinema 4D preferences folder.
+  '''
+
+  def __init__(self, executable, processes=2, threads=0, affinity=False,
+               log_dir=None):
+    super(CommandlinePool, self).__init__()
+    if log_dir is None:
+      prefs = c4d.storage.GeGetC4DPath(c4d.C4D_PATH_PREFS)
+      log_dir = os.path.join(prefs, 'pvrq2-logs')
+    self.executable = executable
+    self.processes = []
+    self.max_processes = max(1, processes)
+    self.threads = threads
+    self.affinity = affinity and bool(threads) and hasattr(os, 'sched_setaffinity')
+    self.log_dir = log_dir
+
+  @property
+  def jobs(self):
+    return [x.job for x in self.processes]
+
+  def has_capacity(self):
+    '''
+    Returns True if another process can be started.
+    '''
+
+    return len(self.processes) < self.max_processes
+
+  def _get_cores(self, slot):
+    cores = sorted(os.sched_getaffinity(0))
+    first = slot * self.threads
+    return set(cores[(first + i) % len(cores)] for i in range(self.threads))
+
+  def start(self, job):
+    '''
+    Starts a process that renders *job*.
+
+    # Raises
+    ValueError: If the pool is full or the job can not be rendered
+      with the command line renderer.
+    OSError: If the process could not be started.
+    '''
+
+    if not self.has_capacity():
+      raise ValueError('the pool is full')
+    args = job.get_commandline_args()
+    if args is None:
+      raise ValueError('{0!r} can not be rendered from the command line'.format(job))
+    command = [self.executable, '-nogui'] + list(args)
+    if self.threads:
+      command += ['-threads', str(self.threads)]
+
+    used = set(x.slot for x in self.processes)
+    slot = min(set(range(self.max_processes)) - used)
+    if not os.path.isdir(self.log_dir):
+      os.makedirs(self.log_dir)
+    log_filename = os.path.join(self.log_dir, '{0}.log'.format(job.uuid))
+    preexec_fn = None
+    if self.affinity:
+      cores = self._get_cores(slot)
+      preexec_fn = lambda: os.sched_setaffinity(0, cores)
+    with open(log_filename, 'wb') as log:
+      popen = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=log,
+        stderr=subprocess.STDOUT, preexec_fn=preexec_fn)
+    popen.stdin.close()
+
+    self.processes.append(Process(job, popen, log_filename, slot))
+    job.error_message = None
+    job.status = STATUS_RENDERING
+
+  def poll(self):
+    '''
+    Updates the jobs of the processes that have finished.
+
+    # Returns
+    A list of the jobs that have finished.
+    '''
+
+    finished = []
+    for process in self.processes[:]:
+      code = process.popen.poll()
+      if code is None:
+        continue
+      self.processes.remove(process)
+      job = process.job
+      finished.append(job)
+      if job.status != STATUS_RENDERING:
+        continue  # cancelled
+      if code == 0:
+        job.status = STATUS_COMPLETED
+        try:
+          job.completed()
+        except BaseException:
+          traceback.print_exc()
+      else:
+        job.status = STATUS_FAILED
+        job.error_message = 'The renderer exited with code {0}.\n\n{1}'.format(
+          code, read_log_tail(process.log_filename))
+    return finished
+
+  def cancel(self, job=None):
+    '''
+    Terminates the process of *job*, or all processes if *job* is
+    #None. The jobs are set to #nr.pvrq2.STATUS_CANCELLED.
+    '''
+
+    for process in self.processes:
+      if job is None or process.job is job:
+        if process.popen.poll() is None:
+          process.popen.terminate()
+        if process.job.status == STATUS_RENDERING:
+          process.job.status = STATUS_CANCELLED
+
+  def shutdown(self, timeout=5.0):
+    '''
+    Cancels all jobs and waits until their processes have ended. A
+    process that is still running after *timeout* seconds is killed.
+    Called when the queue is stopped and when Cinema 4D exits.
+    '''
+
+    self.cancel()
+    deadline = time.time() + timeout
+    for process in self.processes:
+      while process.popen.poll() is None and time.time() < deadline:
+        time.sleep(0.05)
+      if process.popen.poll() is None:
+        process.popen.kill()
+        process.popen.wait()
+    self.processes = []
@@ -0,0 +1,511 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Estimates how long the pending jobs of the queue will take to render from
+the render times of earlier runs of the same scenes.
+"""
+
+from . import RenderJob, FileRenderJob, ChunkRenderJob, STATUS_PENDING, \
+  STATUS_RENDERING, STATUS_COMPLETED, get_frame_range, timestamp
+import c4d
+import json
+import os
+import time
+
+
+def get_history_filename():
+  '''
+  Returns the filename at which the render #History is saved.
+  '''
+
+  prefs = c4d.storage.GeGetC4DPath(c4d.C4D_PATH_PREFS)
+  return os.path.join(prefs, 'pvrq2-history.json')
+
+
+def get_job_filename(job):
+  '''
+  Returns the scene filename of *job*, or #None if it has none or if it
+  is not known without decoding the payload of the job (see
+  #nr.pvrq2.FileRenderJob.peek_filename()).
+  '''
+
+  if isinstance(job, FileRenderJob):
+    return job.peek_filename()
+  return None
+
+
+def get_job_path(job):
+  '''
+  Returns the key of *job* in the #History: the normalized scene filename
+  for jobs that have one, otherwise the plugin identifier and name. Returns
+  #None for a #nr.pvrq2.FileRenderJob whose filename is not known yet.
+  '''
+
+  filename = get_job_filename(job)
+  if filename:
+    return os.path.normcase(os.path.normpath(filename))
+  elif isinstance(job, FileRenderJob) and filename is None:
+    return None
+  return '{0}:{1}'.format(job.ident, job.name)
+
+
+def get_fingerprint(filename):
+  '''
+  Returns the size and modification time of *filename* as a list, or
+  #None if the file does not exist.
+  '''
+
+  try:
+    stat = os.stat(filename)
+  except (OSError, TypeError):
+    return None
+  return [stat.st_size, int(stat.st_mtime)]
+
+
+def get_frame_count(job):
+  '''
+  Returns the number of frames that *job* renders if it is known without
+  loading its scene (#nr.pvrq2.ChunkRenderJob), otherwise #None.
+  '''
+
+  if isinstance(job, ChunkRenderJob):
+    return len(range(job.frame_from, job.frame_to + 1, max(1, job.frame_step)))
+  return None
+
+
+def format_duration(seconds):
+  '''
+  Formats *seconds* as a short string, eg. `'2h 05m'` or `'4m 10s'`.
+  '''
+
+  seconds = int(seconds + 0.5)
+  if seconds >= 3600:
+    return '{0}h {1:02d}m'.format(seconds // 3600, seconds % 3600 // 60)
+  elif seconds >= 60:
+    return '{0}m {1:02d}s'.format(seconds // 60, seconds % 60)
+  return '{0}s'.format(seconds)
+
+
+def format_remaining(seconds, unknown):
+  '''
+  Formats the result of #Estimator.get_remaining(), eg. `'1h 05m'` or
+  `'1h 05m (+2 unknown)'`.
+  '''
+
+  text = format_duration(seconds)
+  if unknown:
+    text += ' (+{0} unknown)'.format(unknown)
+  return text
+
+
+def _average(old, value, count):
+  # A running average over the last *count* values, roughly.
+  if old is None:
+    return value
+  return old + (value - old) / float(count)
+
+
+class History(object):
+  '''
+  The render times of the scenes that were rendered before, saved as JSON
+  in the file *filename*. A record is kept per scene path and fingerprint
+  (see #get_fingerprint()), thus the times of a scene that was changed
+  are kept apart from the times before the change. Records hold the
+  average render time of the whole scene, the number of frames and the
+  average time per frame, if known.
+
+  # Attributes
+
+  filename (str): The file that the history is saved to.
+
+  max_records (int): The number of records that are kept. The oldest
+    records are dropped first.
+
+  versions (dict): Maps a scene path to a number that is incremented
+    whenever a record of that path changes.
+  '''
+
+  #: The number of runs that the averages of a record span.
+  AVERAGE_WINDOW = 5
+
+  def __init__(self, filename, max_records=5000):
+    super(History, self).__init__()
+    self.filename = filename
+    self.max_records = max_records
+    self.versions = {}
+    self._by_path = {}  # path -> list of records, oldest first
+    self._count = 0
+    self._default = False  # cached default_seconds(), False if invalid
+
+  def load(self):
+    '''
+    Loads the history from #filename. A missing or damaged file results
+    in an empty history.
+    '''
+
+    self._by_path = {}
+    self._count = 0
+    self._default = False
+    try:
+      with open(self.filename, 'r') as fp:
+        records = json.load(fp)['records']
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+      records = []
+    for record in sorted(records, key=lambda x: x.get('time', 0)):
+      self._by_path.setdefault(record['path'], []).append(record)
+      self._count += 1
+
+  def save(self):
+    '''
+    Saves the history to #filename.
+    '''
+
+    records = [x for path in self._by_path.values() for x in path]
+    with open(self.filename, 'w') as fp:
+      json.dump({'records': records}, fp)
+
+  def find(self, path, filename=None):
+    '''
+    Returns the record of *path* whose fingerprint matches the file
+    *filename*, the latest record of *path* if none matches, or #None if
+    the path has no records. The file is only checked if *path* has
+    more than one record.
+    '''
+
+    records = self._by_path.get(path)
+    if not records:
+      return None
+    if len(records) > 1 and filename:
+      fingerprint = get_fingerprint(filename)
+      for record in records:
+        if record['fingerprint'] == fingerprint:
+          return record
+    return records[-1]
+
+  def add(self, path, filename, seconds, frames=None, whole=True):
+    '''
+    Adds a run of *path* that took *seconds* and rendered *frames* frames
+    (if known) to the record of the current fingerprint of *filename*.
+    *whole* must be False if only a part of the scene was rendered (eg. a
+    #nr.pvrq2.ChunkRenderJob).
+    '''
+
+    fingerprint = get_fingerprint(filename) if filename else None
+    records = self._by_path.setdefault(path, [])
+    for record in records:
+      if record['fingerprint'] == fingerprint:
+        records.remove(record)
+        break
+    else:
+      record = {'path': path, 'fingerprint': fingerprint, 'seconds': None,
+        'frames': None, 'seconds_per_frame': None, 'count': 0}
+      self._count += 1
+    records.append(record)
+
+    count = record['count'] = min(record['count'] + 1, self.AVERAGE_WINDOW)
+    if whole:
+      record['seconds'] = _average(record['seconds'], seconds, count)
+      if frames:
+        record['frames'] = frames
+    if frames:
+      record['seconds_per_frame'] = _average(record['seconds_per_frame'],
+        seconds / float(frames), count)
+    record['time'] = time.time()
+    self.versions[path] = self.versions.get(path, 0) + 1
+    self._default = False
+
+    if self._count > self.max_records:
+      oldest = min(self._by_path.values(), key=lambda x: x[0]['time'])
+      dropped = oldest.pop(0)
+      self._count -= 1
+      self.versions[dropped['path']] = self.versions.get(dropped['path'], 0) + 1
+      if not oldest:
+        del self._by_path[dropped['path']]
+
+  def predict(self, path, filename=None, frames=None):
+    '''
+    Returns the estimated seconds to render *path*, or *frames* frames of
+    it, or #None if the history has no suitable record.
+    '''
+
+    record = self.find(path, filename)
+    if record is None:
+      return None
+    per_frame = record['seconds_per_frame']
+    if frames is None:
+      if record['seconds'] is not None:
+        return record['seconds']
+      frames = record['frames']
+    elif per_frame is None and record['seconds'] is not None and record['frames']:
+      per_frame = record['seconds'] / float(record['frames'])
+    if per_frame is None or frames is None:
+      return None
+    return per_frame * frames
+
+  def default_seconds(self):
+    '''
+    Returns the median render time of all scenes in the history, used for
+    jobs that have not been rendered before, or #None if the history has
+    no render times of whole scenes.
+    '''
+
+    if self._default is False:
+      values = sorted(x['seconds'] for path in self._by_path.values()
+        for x in path if x['seconds'] is not None)
+      self._default = values[len(values) // 2] if values else None
+    return self._default
+
+
+class Estimator(object):
+  '''
+  Listens to the changes of a #nr.pvrq2.Root and keeps the estimated render
+  time of the jobs that will be rendered (pending or rendering and
+  enabled), summed up per folder. When a job completes, its render time is
+  added to the #History. Every change updates the totals along the parents
+  of the affected jobs only: removed subtrees are subtracted right away,
+  inserted, enabled and disabled subtrees are updated by the next
+  #get_remaining().
+
+  Jobs without a suitable record count with the median time of the
+  history (see #History.default_seconds()), or as unknown if the history
+  is empty. The payload of a job is never decoded for an estimate, a
+  #nr.pvrq2.FileRenderJob whose filename is not in its header (see
+  #get_job_filename()) counts as a job without a record.
+
+  # Attributes
+
+  root (nr.pvrq2.Root): The root of the queue.
+
+  history (History): The render times of earlier runs. Saved after every
+    job that completed.
+  '''
+
+  def __init__(self, root, history):
+    super(Estimator, self).__init__()
+    self.root = root
+    self.history = history
+    self._estimates = {}   # job -> (path, history version, seconds or None)
+    self._contrib = {}     # job -> (seconds, number of jobs without estimate, path)
+    self._totals = {}      # node -> [seconds, number of jobs without estimate]
+    self._by_path = {}     # history path -> set of jobs in _contrib
+    self._rendering = set()
+    self._frames = {}      # job -> frame count of its loaded scene
+    self._pending = []     # nodes whose subtree needs to be updated
+    self._dirty = True
+    for job in root.iter_tree(lambda x: isinstance(x, RenderJob)):
+      if job.status == STATUS_RENDERING:
+        self._rendering.add(job)
+    root.add_listener(self)
+
+  def __call__(self, event, node, *args):
+    if event == 'insert':
+      self._pending.append(node)
+    elif event == 'remove':
+      self._remove(node, args[0])
+    elif event == 'change':
+      attr = args[0]
+      if attr == 'enabled':
+        self._pending.append(node)
+      elif attr == 'status':
+        if node.status == STATUS_RENDERING:
+          self._rendering.add(node)
+        elif node in self._rendering:
+          self._rendering.discard(node)
+          if node.status == STATUS_COMPLETED:
+            self._record(node)
+        if not self._dirty:
+          self._update(node)
+
+  def close(self):
+    '''
+    Stop listening to the changes of the root.
+    '''
+
+    self.root.remove_listener(self)
+
+  def scene_loaded(self, job, doc):
+    '''
+    Tells the estimator the frame range of the scene *doc* of *job*. The
+    number of frames is saved with the render time of the job.
+    '''
+
+    first, last, step = get_frame_range(doc)
+    self._frames[job] = len(range(first, last + 1, step))
+
+  def _record(self, job):
+    seconds = job.get_durations()['render']
+    frames = self._frames.pop(job, None)
+    if seconds is None:
+      return
+    path = get_job_path(job)
+    if path is None:
+      return
+    partial = get_frame_count(job)
+    self.history.add(path, get_job_filename(job), seconds,
+      partial or frames, whole=partial is None)
+    try:
+      self.history.save()
+    except (IOError, OSError) as exc:
+      print('[PV Render Queue 2]: Could not save the render history:', exc)
+    # Other jobs of the same scene get a new estimate.
+    for other in list(self._by_path.get(path, ())):
+      self._update(other)
+
+  def estimate(self, job):
+    '''
+    Returns the estimated render time of *job* in seconds or #None if
+    there is no record of its scene.
+    '''
+
+    path = get_job_path(job)
+    if path is None:
+      return None
+    version = self.history.versions.get(path, 0)
+    cached = self._estimates.get(job)
+    if cached is None or cached[:2] != (path, version):
+      seconds = self.history.predict(path, get_job_filename(job),
+        get_frame_count(job))
+      cached = self._estimates[job] = (path, version, seconds)
+    return cached[2]
+
+  def _is_counted(self, job):
+    return (job.status in (STATUS_PENDING, STATUS_RENDERING) and
+      job.enabled_state == 'enabled' and job.get_root() is self.root)
+
+  def _update(self, job):
+    # Replaces the contribution of *job* to the totals of its parents.
+    # A rendering job that was moved is tracked again.
+    if job.status == STATUS_RENDERING and job.get_root() is self.root:
+      self._rendering.add(job)
+    old = self._contrib.pop(job, None)
+    if old is not None:
+      self._by_path[old[2]].discard(job)
+    new = None
+    if self._is_counted(job):
+      seconds = self.estimate(job)
+      path = get_job_path(job)
+      new = (0.0, 1, path) if seconds is None else (seconds, 0, path)
+      self._contrib[job] = new
+      self._by_path.setdefault(path, set()).add(job)
+    old, new = old or (0.0, 0), new or (0.0, 0)
+    self._add_to_parents(job.parent, new[0] - old[0], new[1] - old[1])
+
+  def _add_to_parents(self, parent, seconds, unknown):
+    if not seconds and not unknown:
+      return
+    while parent is not None:
+      total = self._totals.setdefault(parent, [0.0, 0])
+      total[0] += seconds
+      total[1] += unknown
+      parent = parent.parent
+
+  def _remove(self, node, parent):
+    # Forgets the jobs in the subtree of *node*, which was removed from
+    # *parent*, and subtracts their contributions from the totals. If the
+    # subtree is inserted again, #_update() picks its jobs up.
+    seconds, unknown = 0.0, 0
+    for child in node.iter_preorder(include_self=True):
+      self._rendering.discard(child)
+      self._estimates.pop(child, None)
+      self._totals.pop(child, None)
+      contrib = self._contrib.pop(child, None)
+      if contrib is not None:
+        seconds += contrib[0]
+        unknown += contrib[1]
+        self._by_path[contrib[2]].discard(child)
+    if not self._dirty:
+      self._add_to_parents(parent, -seconds, -unknown)
+
+  def _update_pending(self):
+    pending, self._pending = self._pending, []
+    is_job = lambda x: isinstance(x, RenderJob)
+    for node in pending:
+      for job in node.iter_preorder(is_job, include_self=True):
+        self._update(job)
+
+  def _rebuild(self):
+    self._dirty = False
+    self._pending = []
+    self._contrib = {}
+    self._totals = {}
+    self._by_path = {}
+    for job in self.root.iter_tree(lambda x: isinstance(x, RenderJob)):
+      self._update(job)
+
+  def get_remaining(self, node=None):
+    '''
+    Returns the estimated seconds until all jobs in *node* (the root if
+    #None) have been rendered one after another, and the number of jobs
+    that could not be estimated. The time that the rendering jobs have
+    already been rendering is subtracted.
+    '''
+
+    if self._dirty:
+      self._rebuild()
+    elif self._pending:
+      self._update_pending()
+    if node is None:
+      node = self.root
+    seconds, unknown = self._totals.get(node, (0.0, 0))
+    default = self.history.default_seconds()
+    if unknown and default is not None:
+      seconds += unknown * default
+      unknown = 0
+
+    now = timestamp()
+    for job in self._rendering:
+      contrib = self._contrib.get(job)
+      start = job.get_timings()['render_start']
+      if contrib is None or start is None:
+        continue
+      parent = job.parent
+      while parent is not None and parent is not node:
+        parent = parent.parent
+      if parent is None:
+        continue
+      estimate = contrib[0] if not contrib[1] else default
+      if estimate:
+        seconds -= min(now - start, estimate)
+    return max(0.0, seconds), unknown
+
+  def get_finish_time(self, node=None, parallel=1):
+    '''
+    Returns the time (see #time.time()) at which the jobs in *node* are
+    expected to be rendered with *parallel* renderers, or #None if no job
+    is left.
+    '''
+
+    seconds, unknown = self.get_remaining(node)
+    if not seconds and not unknown:
+      return None
+    return time.time() + seconds / max(1, parallel)
+
+  def get_job_details(self, job):
+    '''
+    Returns a dictionary with the estimated render time of *job* and the
+    remaining time of the queue, for #nr.pvrq2.RenderJob.get_job_details().
+    '''
+
+    details = {}
+    if job.status in (STATUS_PENDING, STATUS_RENDERING):
+      seconds = self.estimate(job)
+      if seconds is None:
+        seconds = self.history.default_seconds()
+      details['estimated_time'] = 'unknown' if seconds is None else format_duration(seconds)
+    seconds, unknown = self.get_remaining()
+    if seconds or unknown:
+      details['queue_remaining'] = format_remaining(seconds, unknown)
+    return details
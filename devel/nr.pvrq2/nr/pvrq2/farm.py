@@ -0,0 +1,406 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Shares render jobs between multiple machines through a SQLite database.
+
+Jobs are submitted to a #FarmStore with their serialized data (see
+#nr.pvrq2.dump_nodes()). A #Worker claims one job at a time with a lease
+that expires after a while. The worker renews the lease while the job is
+rendering. If the worker dies, the lease expires and another worker takes
+the job over.
+
+The database can be on a network share that all machines can access. The
+lease expiry compares timestamps of different machines, so their clocks
+must be synchronized. Note that file locking is not reliable on every
+network file system.
+
+The plugin only submits jobs (see the `submit_to_farm.py` script), the
+jobs are rendered by separate worker processes. Like the rest of
+#nr.pvrq2, this module and the job plugins require the `c4d` module, thus
+a worker must run in the Python interpreter of Cinema 4D (`c4dpy`, R21 and
+newer) with the `devel/nr.pvrq2` directory of the plugin in `PYTHONPATH`:
+
+    c4dpy -m nr.pvrq2.farm /path/to/farm.sqlite
+"""
+
+from . import (RenderJob, STATUS_PENDING, STATUS_RENDERING, STATUS_COMPLETED,
+  STATUS_FAILED, dump_nodes, load_nodes)
+import c4d
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+
+SCHEMA = '''
+  CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT NOT NULL UNIQUE,
+    name TEXT,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error_message TEXT
+  );
+  CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+'''
+
+
+class Lease(object):
+  '''
+  A job that was claimed by a worker with #FarmStore.claim().
+
+  # Attributes
+
+  id (int): The row ID of the job in the store.
+
+  uuid (str): The UUID of the job.
+
+  worker (str): The name of the worker that holds the lease.
+
+  payload (bytes): The serialized job, see #nr.pvrq2.load_nodes().
+
+  expires (float): The time when the lease expires, as #time.time().
+  '''
+
+  def __init__(self, id, uuid, worker, payload, expires):
+    super(Lease, self).__init__()
+    self.id = id
+    self.uuid = uuid
+    self.worker = worker
+    self.payload = payload
+    self.expires = expires
+
+  def __repr__(self):
+    return '<Lease id={0!r} worker={1!r}>'.format(self.id, self.worker)
+
+  def load_job(self):
+    '''
+    Returns the #nr.pvrq2.RenderJob of the lease or #None if the
+    payload could not be loaded.
+    '''
+
+    nodes = load_nodes(self.payload)
+    if nodes and isinstance(nodes[0], RenderJob):
+      return nodes[0]
+    return None
+
+
+class FarmStore(object):
+  '''
+  The shared queue of render jobs in the SQLite database *filename*.
+  Every operation uses its own connection, thus a store can be used from
+  multiple threads.
+
+  # Parameters
+
+  filename (str): The filename of the SQLite database. It is created if
+    it does not exist.
+
+  lease_duration (float): The number of seconds that a lease is valid
+    without a heartbeat.
+
+  max_attempts (int): The number of times that a job is claimed before it
+    is marked as failed when its lease expired.
+  '''
+
+  def __init__(self, filename, lease_duration=60.0, max_attempts=3):
+    super(FarmStore, self).__init__()
+    self.filename = filename
+    self.lease_duration = lease_duration
+    self.max_attempts = max_attempts
+    conn = self._connect()
+    try:
+      conn.executescript(SCHEMA)
+    finally:
+      conn.close()
+
+  def _connect(self):
+    # Transactions are started explicitly.
+    return sqlite3.connect(self.filename, timeout=30.0, isolation_level=None)
+
+  def _update(self, query, args):
+    conn = self._connect()
+    try:
+      return conn.execute(query, args).rowcount > 0
+    finally:
+      conn.close()
+
+  def submit(self, job):
+    '''
+    Adds the #nr.pvrq2.RenderJob *job* to the store as a pending job.
+
+    # Returns
+    True if the job was added, False if a job with the same UUID is
+    already in the store.
+
+    # Raises
+    ValueError: If the job can not be serialized.
+    '''
+
+    payload = dump_nodes(job)
+    if payload is None:
+      raise ValueError('{0!r} can not be serialized'.format(job))
+    return self._update(
+      'INSERT OR IGNORE INTO jobs (uuid, name, payload, status) '
+      'VALUES (?, ?, ?, ?)',
+      (str(job.uuid), job.name, sqlite3.Binary(payload), STATUS_PENDING))
+
+  def claim(self, worker):
+    '''
+    Claims the oldest job that is pending or whose lease has expired for
+    the *worker*. Jobs with an expired lease that have been claimed
+    #max_attempts times are marked as failed instead.
+
+    # Returns
+    A #Lease or #None if there is no job to claim.
+    '''
+
+    conn = self._connect()
+    try:
+      # BEGIN IMMEDIATE takes the write lock, thus no other worker can
+      # claim the same job between the SELECT and the UPDATE.
+      conn.execute('BEGIN IMMEDIATE')
+      try:
+        now = time.time()
+        conn.execute(
+          'UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL, '
+          'error_message = ? WHERE status = ? AND lease_expires < ? '
+          'AND attempts >= ?',
+          (STATUS_FAILED, 'lease expired', STATUS_RENDERING, now,
+           self.max_attempts))
+        row = conn.execute(
+          'SELECT id, uuid, payload FROM jobs WHERE status = ? '
+          'OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1',
+          (STATUS_PENDING, STATUS_RENDERING, now)).fetchone()
+        lease = None
+        if row is not None:
+          expires = now + self.lease_duration
+          conn.execute(
+            'UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, '
+            'attempts = attempts + 1 WHERE id = ?',
+            (STATUS_RENDERING, worker, expires, row[0]))
+          lease = Lease(row[0], row[1], worker, bytes(row[2]), expires)
+        conn.execute('COMMIT')
+      except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+      return lease
+    finally:
+      conn.close()
+
+  def heartbeat(self, lease):
+    '''
+    Renews the *lease*.
+
+    # Returns
+    False if the lease was lost, eg. because it expired and the job was
+    claimed by another worker.
+    '''
+
+    expires = time.time() + self.lease_duration
+    if self._update(
+        'UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? '
+        'AND status = ?', (expires, lease.id, lease.worker, STATUS_RENDERING)):
+      lease.expires = expires
+      return True
+    return False
+
+  def complete(self, lease):
+    '''
+    Marks the job of the *lease* as completed. Returns False if the lease
+    was lost.
+    '''
+
+    return self._update(
+      'UPDATE jobs SET status = ?, lease_expires = NULL, error_message = NULL '
+      'WHERE id = ? AND worker = ? AND status = ?',
+      (STATUS_COMPLETED, lease.id, lease.worker, STATUS_RENDERING))
+
+  def fail(self, lease, error_message):
+    '''
+    Marks the job of the *lease* as failed. Returns False if the lease
+    was lost.
+    '''
+
+    return self._update(
+      'UPDATE jobs SET status = ?, lease_expires = NULL, error_message = ? '
+      'WHERE id = ? AND worker = ? AND status = ?',
+      (STATUS_FAILED, error_message, lease.id, lease.worker, STATUS_RENDERING))
+
+  def reset(self, uuid):
+    '''
+    Makes the job with the *uuid* pending again, unless it is rendering.
+    '''
+
+    return self._update(
+      'UPDATE jobs SET status = ?, worker = NULL, attempts = 0, '
+      'error_message = NULL WHERE uuid = ? AND status != ?',
+      (STATUS_PENDING, str(uuid), STATUS_RENDERING))
+
+  def get_jobs(self):
+    '''
+    Returns a list of dictionaries with the `id`, `uuid`, `name`,
+    `status`, `worker`, `lease_expires`, `attempts` and `error_message`
+    of all jobs in the store, in the order they were submitted.
+    '''
+
+    keys = ('id', 'uuid', 'name', 'status', 'worker', 'lease_expires',
+      'attempts', 'error_message')
+    conn = self._connect()
+    try:
+      rows = conn.execute(
+        'SELECT {0} FROM jobs ORDER BY id'.format(', '.join(keys))).fetchall()
+    finally:
+      conn.close()
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def render_job(job):
+  '''
+  Renders the #nr.pvrq2.RenderJob *job* with its render settings and
+  blocks until the rendering is finished. This is the default render
+  function of a #Worker.
+
+  # Raises
+  RuntimeError: If the job returned no scene or the rendering failed.
+  '''
+
+  doc = job.get_scene()
+  if doc is None:
+    raise RuntimeError(job.error_message or 'job returned no scene')
+  rdata = doc.GetActiveRenderData().GetData()
+  bmp = c4d.bitmaps.MultipassBitmap(int(rdata[c4d.RDATA_XRES]),
+    int(rdata[c4d.RDATA_YRES]), c4d.COLORMODE_RGB)
+  flags = c4d.RENDERFLAGS_EXTERNAL | c4d.RENDERFLAGS_NODOCUMENTCLONE
+  result = c4d.documents.RenderDocument(doc, rdata, bmp, flags)
+  if result != c4d.RENDERRESULT_OK:
+    raise RuntimeError('rendering failed with result {0}'.format(result))
+
+
+class Worker(object):
+  '''
+  Claims jobs from a #FarmStore and renders them, one at a time. While
+  a job renders, a background thread renews its lease. If the lease is
+  lost anyway, the result of the job is discarded.
+
+  # Parameters
+
+  store (FarmStore): The store to claim the jobs from.
+
+  name (str): The name of the worker. Defaults to the host name and the
+    process ID.
+
+  render (function): Called with a #nr.pvrq2.RenderJob to render it. It
+    must block until the job is rendered and raise an exception if the
+    job failed. Defaults to #render_job().
+  '''
+
+  def __init__(self, store, name=None, render=None):
+    super(Worker, self).__init__()
+    self.store = store
+    self.name = name or '{0}:{1}'.format(socket.gethostname(), os.getpid())
+    self.render = render or render_job
+
+  def _heartbeat(self, lease, stop, lost):
+    interval = self.store.lease_duration / 3.0
+    while not stop.wait(interval):
+      try:
+        if not self.store.heartbeat(lease):
+          lost.set()
+          return
+      except sqlite3.Error:
+        traceback.print_exc()
+
+  def process_one(self):
+    '''
+    Claims one job and renders it.
+
+    # Returns
+    The #Lease of the job or #None if there was no job to claim.
+    '''
+
+    lease = self.store.claim(self.name)
+    if lease is None:
+      return None
+    job = lease.load_job()
+    if job is None:
+      self.store.fail(lease, 'the job could not be loaded')
+      return lease
+
+    stop, lost = threading.Event(), threading.Event()
+    thread = threading.Thread(target=self._heartbeat, args=(lease, stop, lost))
+    thread.daemon = True
+    thread.start()
+    error_message = None
+    try:
+      self.render(job)
+    except BaseException:
+      error_message = traceback.format_exc()
+    finally:
+      stop.set()
+      thread.join()
+
+    if lost.is_set():
+      print('[PV Render Queue 2]: Farm: lost the lease of', lease)
+    elif error_message:
+      self.store.fail(lease, error_message)
+    else:
+      self.store.complete(lease)
+    return lease
+
+  def run(self, poll_interval=5.0, idle_timeout=None):
+    '''
+    Processes jobs until there has been no job to claim for *idle_timeout*
+    seconds, or forever if it is #None. Waits *poll_interval* seconds
+    before it checks for new jobs again.
+    '''
+
+    idle_since = None
+    while True:
+      if self.process_one() is not None:
+        idle_since = None
+        continue
+      now = time.time()
+      if idle_since is None:
+        idle_since = now
+      if idle_timeout is not None and now - idle_since >= idle_timeout:
+        return
+      time.sleep(poll_interval)
+
+
+def main(argv=None):
+  import argparse
+  parser = argparse.ArgumentParser(prog='nr.pvrq2.farm',
+    description='Render the jobs of a PV Render Queue farm store.')
+  parser.add_argument('store', help='the SQLite database of the farm')
+  parser.add_argument('--name', help='the name of this worker')
+  parser.add_argument('--lease', type=float, default=60.0,
+    help='the lease duration in seconds (default: 60)')
+  parser.add_argument('--poll', type=float, default=5.0,
+    help='the interval to check for new jobs in seconds (default: 5)')
+  parser.add_argument('--idle-timeout', type=float,
+    help='exit after this many seconds without jobs')
+  args = parser.parse_args(argv)
+  store = FarmStore(args.store, lease_duration=args.lease)
+  Worker(store, args.name).run(args.poll, args.idle_timeout)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,230 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Finds the frames of a scene that have already been rendered to its output
+location, so that only the missing frames need to be rendered. See
+#nr.pvrq2.FileRenderJob.skip_existing.
+"""
+
+from . import STATUS_COMPLETED, get_frame_range, replace_with_chunks
+import c4d
+import os
+import threading
+
+#: Maps the image formats of the render settings (`c4d.FILTER_*`) to the
+#: extension of the files that Cinema 4D writes. Movie formats are not
+#: included, their frames can not be checked.
+FORMAT_EXTENSIONS = {}
+for _name, _ext in [('FILTER_TIF', '.tif'), ('FILTER_TGA', '.tga'),
+    ('FILTER_BMP', '.bmp'), ('FILTER_IFF', '.iff'), ('FILTER_JPG', '.jpg'),
+    ('FILTER_PICT', '.pct'), ('FILTER_PSD', '.psd'), ('FILTER_RLA', '.rla'),
+    ('FILTER_RPF', '.rpf'), ('FILTER_B3D', '.b3d'), ('FILTER_PNG', '.png'),
+    ('FILTER_HDR', '.hdr'), ('FILTER_EXR', '.exr'), ('FILTER_DPX', '.dpx')]:
+  if hasattr(c4d, _name):
+    FORMAT_EXTENSIONS[getattr(c4d, _name)] = _ext
+del _name, _ext
+
+#: The first bytes of the files of an image format, by extension. Files
+#: of other formats are only checked for their size.
+IMAGE_MAGIC = {
+  '.tif': (b'II*\x00', b'MM\x00*'),
+  '.bmp': (b'BM',),
+  '.jpg': (b'\xff\xd8\xff',),
+  '.psd': (b'8BPS',),
+  '.png': (b'\x89PNG\r\n\x1a\n',),
+  '.hdr': (b'#?',),
+  '.exr': (b'v/1\x01',),
+  '.dpx': (b'SDPX', b'XPDS'),
+}
+
+# The frame number formats of the RDATA_NAMEFORMAT options, in the order
+# of the options: digits, separator and whether the extension is added.
+_NAME_FORMATS = [
+  (4, '', True),    # Name0000.TIF
+  (4, '', False),   # Name0000
+  (4, '.', False),  # Name.0000
+  (3, '', True),    # Name000.TIF
+  (3, '', False),   # Name000
+  (3, '.', False),  # Name.000
+  (4, '.', True),   # Name.0000.TIF
+]
+
+
+def frame_filename(path, frame, name_format, extension):
+  '''
+  Returns the filename that Cinema 4D saves the *frame* to, for the output
+  *path* of the render settings without extension, the `RDATA_NAMEFORMAT`
+  option *name_format* and the *extension* of the image format.
+  '''
+
+  digits, separator, add_extension = _NAME_FORMATS[name_format]
+  filename = '{0}{1}{2:0{3}d}'.format(path, separator, frame, digits)
+  if add_extension:
+    filename += extension
+  return filename
+
+
+def get_output_format(doc):
+  '''
+  Returns the output path, the `RDATA_NAMEFORMAT` option and the
+  extension that the render settings of *doc* save the frames with, or
+  #None if the frames can not be checked. That is the case if no image is
+  saved, for movie formats and for paths that contain tokens.
+  '''
+
+  rd = doc.GetActiveRenderData()
+  if not rd[c4d.RDATA_SAVEIMAGE]:
+    return None
+  extension = FORMAT_EXTENSIONS.get(rd[c4d.RDATA_FORMAT])
+  name_format = rd[c4d.RDATA_NAMEFORMAT]
+  path = rd[c4d.RDATA_PATH]
+  if not extension or not path or '$' in path:
+    return None
+  if name_format not in range(len(_NAME_FORMATS)):
+    return None
+  if not os.path.isabs(path):
+    path = os.path.join(doc.GetDocumentPath(), path)
+  return path, name_format, extension
+
+
+def is_valid_frame(filename, min_size=1):
+  '''
+  Returns True if *filename* is at least *min_size* bytes large and, for
+  the formats in #IMAGE_MAGIC, starts with the header of its format.
+  Files that were only partially written when rendering was interrupted
+  are usually caught by the size check.
+  '''
+
+  try:
+    if os.path.getsize(filename) < min_size:
+      return False
+    magic = IMAGE_MAGIC.get(os.path.splitext(filename)[1].lower())
+    if not magic:
+      return True
+    with open(filename, 'rb') as fp:
+      header = fp.read(max(len(x) for x in magic))
+  except (IOError, OSError):
+    return False
+  return any(header.startswith(x) for x in magic)
+
+
+def scan_frames(filenames, workers=8, min_size=1):
+  '''
+  Checks the frames in the dictionary *filenames* that maps frame numbers
+  to filenames with #is_valid_frame() and returns the set of the valid
+  frames. The directories are listed once, so that frames that do not
+  exist cost no file system access, and the remaining files are checked
+  by *workers* threads.
+  '''
+
+  listings = {}
+  candidates = []
+  for frame, filename in filenames.items():
+    directory, name = os.path.split(filename)
+    if directory not in listings:
+      try:
+        listings[directory] = set(os.listdir(directory or '.'))
+      except OSError:
+        listings[directory] = set()
+    if name in listings[directory]:
+      candidates.append((frame, filename))
+
+  valid = set()
+  lock = threading.Lock()
+  def check(offset):
+    for frame, filename in candidates[offset::workers]:
+      if is_valid_frame(filename, min_size):
+        with lock:
+          valid.add(frame)
+
+  threads = [threading.Thread(target=check, args=(i,))
+    for i in range(min(workers, len(candidates)))]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return valid
+
+
+def get_missing_ranges(first, last, step, existing):
+  '''
+  Returns a list of the `(frame_from, frame_to)` ranges of the frames
+  from *first* to *last* with the specified *step* that are not in the
+  set *existing*.
+  '''
+
+  ranges = []
+  start = None
+  for frame in range(first, last + 1, step):
+    if frame in existing:
+      if start is not None:
+        ranges.append((start, frame - step))
+        start = None
+    elif start is None:
+      start = frame
+  if start is not None:
+    ranges.append((start, first + (last - first) // step * step))
+  return ranges
+
+
+def find_missing_frames(doc, workers=8, min_size=1):
+  '''
+  Checks which frames that *doc* renders already exist in its output
+  location.
+
+  # Returns
+  The frame step and a list of the `(frame_from, frame_to)` ranges of
+  the frames that are missing, or #None if the frames can not be
+  checked (see #get_output_format()).
+  '''
+
+  output = get_output_format(doc)
+  if output is None:
+    return None
+  path, name_format, extension = output
+  first, last, step = get_frame_range(doc)
+  filenames = dict((frame, frame_filename(path, frame, name_format, extension))
+    for frame in range(first, last + 1, step))
+  existing = scan_frames(filenames, workers, min_size)
+  return step, get_missing_ranges(first, last, step, existing)
+
+
+def skip_existing_frames(job, doc, workers=8, min_size=1):
+  '''
+  Checks the frames of the #nr.pvrq2.FileRenderJob *job* whose scene is
+  *doc* with #find_missing_frames(). If all frames exist, the job is
+  marked as completed. If some frames exist, the job is replaced with
+  #nr.pvrq2.ChunkRenderJob#s for the missing ranges, see
+  #nr.pvrq2.replace_with_chunks().
+
+  # Returns
+  True if the job was completed or replaced, False if *doc* needs to be
+  rendered as a whole.
+  '''
+
+  result = find_missing_frames(doc, workers, min_size)
+  if result is None:
+    return False
+  step, ranges = result
+  first, last, __ = get_frame_range(doc)
+  if ranges == [(first, first + (last - first) // step * step)]:
+    return False
+  if not ranges:
+    job.status = STATUS_COMPLETED
+    job.completed()
+  else:
+    replace_with_chunks(job, [(a, b, step) for a, b in ranges])
+  return True
@@ -0,0 +1,207 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Finds and validates the scene files in a directory tree in the background,
+so that large directories can be added to the queue without blocking the
+user interface.
+"""
+
+import os
+import threading
+import traceback
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+#: The first bytes of a Cinema 4D scene file.
+SCENE_MAGIC = b'QC4DC4D'
+
+
+def _scandir(directory):
+  # Returns the names of the files and directories in *directory*.
+  files, dirs = [], []
+  if hasattr(os, 'scandir'):
+    with os.scandir(directory) as entries:
+      for entry in entries:
+        (dirs if entry.is_dir() else files).append(entry.name)
+  else:
+    for name in os.listdir(directory):
+      isdir = os.path.isdir(os.path.join(directory, name))
+      (dirs if isdir else files).append(name)
+  return files, dirs
+
+
+def _directory_key(directory):
+  # Identifies a directory independent of the path it was reached with,
+  # so that symbolic links that point to a parent are not followed again.
+  stat = os.stat(directory)
+  if stat.st_ino:
+    return (stat.st_dev, stat.st_ino)
+  return os.path.normcase(os.path.realpath(directory))
+
+
+def iter_scene_files(directory, extensions=('.c4d',), error_callback=None):
+  '''
+  Iterates over the files in the directory tree of *directory* that have
+  one of the specified *extensions*. The files of a directory are sorted
+  by name and come before the files of its subdirectories. Directories
+  that can not be read are passed to *error_callback* with the exception.
+  Directories that are reached again through symbolic links are skipped.
+  '''
+
+  stack = [directory]
+  visited = set()
+  while stack:
+    current = stack.pop()
+    try:
+      key = _directory_key(current)
+      if key in visited:
+        continue
+      visited.add(key)
+      files, dirs = _scandir(current)
+    except OSError as exc:
+      if error_callback:
+        error_callback(current, exc)
+      continue
+    for name in sorted(files):
+      if os.path.splitext(name)[1].lower() in extensions:
+        yield os.path.join(current, name)
+    stack.extend(os.path.join(current, x) for x in sorted(dirs, reverse=True))
+
+
+def validate_scene(filename):
+  '''
+  Checks that *filename* is a readable Cinema 4D scene file.
+
+  # Returns
+  #None if the file is valid, otherwise a message that describes the error.
+  '''
+
+  try:
+    with open(filename, 'rb') as fp:
+      header = fp.read(len(SCENE_MAGIC))
+  except (IOError, OSError) as exc:
+    return str(exc)
+  if header != SCENE_MAGIC:
+    return 'not a Cinema 4D scene file'
+  return None
+
+
+class FolderImporter(object):
+  '''
+  Walks the directory tree of *directory* in a background thread and
+  validates the scene files with a pool of *workers* threads. The results
+  are collected with #poll() from the main thread in the order that the
+  files were found in.
+
+  # Attributes
+
+  directory (str): The directory that is imported.
+
+  errors (list of tuple): Pairs of filename and error message of the files
+    and directories that could not be imported.
+
+  error (str): The traceback of the exception that stopped the walk over
+    the directory tree, or #None. The files that were found before are
+    still validated and collected.
+  '''
+
+  def __init__(self, directory, workers=4, extensions=('.c4d',)):
+    super(FolderImporter, self).__init__()
+    self.directory = directory
+    self.errors = []
+    self.error = None
+    self._extensions = extensions
+    self._workers = workers
+    self._tasks = queue.Queue(maxsize=workers * 64)
+    self._lock = threading.Lock()
+    self._results = {}
+    self._next = 0
+    self._count = None
+    self._threads = []
+
+  def start(self):
+    '''
+    Start the background threads.
+    '''
+
+    walker = threading.Thread(target=self._walk)
+    self._threads.append(walker)
+    for __ in range(self._workers):
+      self._threads.append(threading.Thread(target=self._validate))
+    for thread in self._threads:
+      thread.daemon = True
+      thread.start()
+
+  def _walk(self):
+    def error_callback(path, exc):
+      with self._lock:
+        self.errors.append((path, str(exc)))
+    count = 0
+    try:
+      for filename in iter_scene_files(self.directory, self._extensions, error_callback):
+        self._tasks.put((count, filename))
+        count += 1
+    except Exception:
+      with self._lock:
+        self.error = traceback.format_exc()
+    finally:
+      for __ in range(self._workers):
+        self._tasks.put(None)
+      with self._lock:
+        self._count = count
+
+  def _validate(self):
+    while True:
+      task = self._tasks.get()
+      if task is None:
+        break
+      index, filename = task
+      error = validate_scene(filename)
+      with self._lock:
+        self._results[index] = (filename, error)
+
+  @property
+  def done(self):
+    '''
+    True if all files have been found, validated and collected with #poll().
+    '''
+
+    with self._lock:
+      return self._count is not None and self._next >= self._count
+
+  def poll(self, limit=None):
+    '''
+    Returns a list of the valid scene files that are ready, in the order
+    that they were found in, but at most *limit* files. Invalid files are
+    added to #errors.
+    '''
+
+    result = []
+    with self._lock:
+      while limit is None or len(result) < limit:
+        item = self._results.pop(self._next, None)
+        if item is None:
+          break
+        self._next += 1
+        filename, error = item
+        if error:
+          self.errors.append((filename, error))
+        else:
+          result.append(filename)
+    return result
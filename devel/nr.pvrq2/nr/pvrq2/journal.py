@@ -0,0 +1,241 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Append-only journal for the render queue. Instead of rewriting the whole
+cache with #nr.pvrq2.write_nodes() on every change, a #Journal listens to
+the changes of the #nr.pvrq2.Root and appends a small record for each of
+them. The cache file serves as a snapshot that the journal is replayed on
+when the queue is loaded. Compacting the journal means saving a new
+snapshot and clearing the journal.
+
+Every record is a line of JSON. Nodes are referenced by their UUID, the
+root of the queue is referenced by #None.
+
+* `insert` -- a new node and its children, serialized with
+  #nr.pvrq2.dump_nodes()
+* `move` -- a node that was removed earlier was inserted again
+* `remove` -- a node was removed
+* `set` -- an attribute of a node changed
+"""
+
+from . import STATUS_RENDERING, STATUS_CANCELLED, dump_nodes, load_nodes
+import base64
+import json
+import os
+import traceback
+import uuid
+
+#: The node attributes that are recorded in the journal.
+RECORDED_ATTRIBUTES = ('enabled', 'render_tr', 'status', 'error_message',
+  'skip_existing')
+
+
+class Journal(object):
+  '''
+  Records the changes of a #nr.pvrq2.Root in the file *filename*. Use
+  #attach() to start recording.
+
+  # Attributes
+
+  filename (str): The filename of the journal.
+
+  root (nr.pvrq2.Root): The root that is being recorded or #None.
+
+  record_count (int): The number of records in the journal file. Only
+    valid after #replay() or #clear() was called.
+
+  failed (bool): True if a record could not be written. The journal is
+    incomplete then and no more records are written until it is cleared
+    with #clear() after a new snapshot was saved.
+  '''
+
+  def __init__(self, filename):
+    super(Journal, self).__init__()
+    self.filename = filename
+    self.root = None
+    self.record_count = 0
+    self.failed = False
+    self._fp = None
+    self._removed = set()
+
+  def __call__(self, event, node, *args):
+    if event == 'insert':
+      self._record_insert(node)
+    elif event == 'remove':
+      self._removed.add(node.uuid)
+      self._write({'op': 'remove', 'uuid': str(node.uuid)})
+    elif event == 'change':
+      attr = args[0]
+      if attr in RECORDED_ATTRIBUTES and node.serializable:
+        self._write({'op': 'set', 'uuid': str(node.uuid), 'attr': attr,
+          'value': getattr(node, attr)})
+
+  def _ref(self, node):
+    if node is None or node is self.root:
+      return None
+    return str(node.uuid)
+
+  def _record_insert(self, node):
+    record = {'parent': self._ref(node.parent), 'pred': self._ref(node.pred),
+      'uuid': str(node.uuid)}
+    if node.uuid in self._removed:
+      self._removed.discard(node.uuid)
+      record['op'] = 'move'
+    elif node.serializable:
+      data = dump_nodes(node)
+      if data is None:
+        return
+      record['op'] = 'insert'
+      record['data'] = base64.b64encode(data).decode('ascii')
+    else:
+      return
+    self._write(record)
+
+  def _write(self, record):
+    if self.failed:
+      return
+    try:
+      if self._fp is None:
+        self._fp = open(self.filename, 'a')
+      self._fp.write(json.dumps(record) + '\n')
+      self._fp.flush()
+    except (IOError, OSError):
+      traceback.print_exc()
+      self.failed = True
+      try:
+        self.close()
+      except (IOError, OSError):
+        self._fp = None
+      return
+    self.record_count += 1
+
+  def attach(self, root):
+    '''
+    Start recording the changes of *root*.
+    '''
+
+    self.detach()
+    self.root = root
+    root.add_listener(self)
+
+  def detach(self):
+    '''
+    Stop recording and close the journal file.
+    '''
+
+    if self.root is not None:
+      self.root.remove_listener(self)
+      self.root = None
+    self.close()
+
+  def close(self):
+    '''
+    Close the journal file. It will be re-opened with the next record.
+    '''
+
+    if self._fp is not None:
+      self._fp.close()
+      self._fp = None
+
+  def clear(self):
+    '''
+    Truncate the journal. Must be called after a new snapshot was saved.
+    '''
+
+    self.close()
+    open(self.filename, 'w').close()
+    self.record_count = 0
+    self.failed = False
+    self._removed.clear()
+
+  def replay(self, root, error_callback=None):
+    '''
+    Apply the records of the journal file to *root*, which must contain
+    the nodes of the snapshot that the journal was recorded on. Replaying
+    a journal again on the same tree has no effect. A truncated record at
+    the end of the file (eg. after a crash) is ignored.
+
+    # Returns
+    The number of records that were replayed.
+    '''
+
+    if not os.path.isfile(self.filename):
+      self.record_count = 0
+      return 0
+
+    index = {}
+    for node in root.iter_children(recursive=True):
+      index[node.uuid] = node
+
+    def lookup(ref):
+      if ref is None:
+        return root
+      return index.get(uuid.UUID(ref))
+
+    def link(node, record):
+      # Insert the node after its predecessor, or as the first child if
+      # it has none. Appends the node if the predecessor is unknown.
+      parent = lookup(record['parent'])
+      if parent is None:
+        return
+      if record['pred'] is None:
+        parent.append(node, 0)
+        return
+      pred = lookup(record['pred'])
+      if pred is not None and pred.parent is parent:
+        node.insert_after(pred)
+      else:
+        parent.append(node)
+
+    count = 0
+    with open(self.filename, 'r') as fp:
+      for line in fp:
+        try:
+          record = json.loads(line)
+        except ValueError:
+          break
+        count += 1
+        op = record.get('op')
+        if op == 'insert':
+          if uuid.UUID(record['uuid']) in index:
+            continue
+          data = base64.b64decode(record['data'].encode('ascii'))
+          nodes = load_nodes(data, error_callback)
+          for node in nodes or ():
+            index[node.uuid] = node
+            for child in node.iter_children(recursive=True):
+              index[child.uuid] = child
+            link(node, record)
+        elif op == 'move':
+          node = lookup(record['uuid'])
+          if node is not None:
+            node.remove()
+            link(node, record)
+        elif op == 'remove':
+          node = lookup(record['uuid'])
+          if node is not None:
+            node.remove()
+        elif op == 'set':
+          node = lookup(record['uuid'])
+          value = record['value']
+          if record['attr'] == 'status' and value == STATUS_RENDERING:
+            value = STATUS_CANCELLED
+          if node is not None and record['attr'] in RECORDED_ATTRIBUTES:
+            setattr(node, record['attr'], value)
+
+    self.record_count = count
+    return count
+
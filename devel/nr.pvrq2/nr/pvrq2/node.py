@@ -14,6 +14,130 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import random
+
+
+class _IndexEntry(object):
+  __slots__ = ('node', 'left', 'right', 'parent', 'size', 'priority')
+
+  def __init__(self, node):
+    self.node = node
+    self.left = None
+    self.right = None
+    self.parent = None
+    self.size = 1
+    self.priority = random.random()
+
+
+def _size(entry):
+  return entry.size if entry else 0
+
+
+def _update(entry):
+  entry.size = 1 + _size(entry.left) + _size(entry.right)
+  if entry.left:
+    entry.left.parent = entry
+  if entry.right:
+    entry.right.parent = entry
+  return entry
+
+
+def _split(entry, count):
+  # Split into a tree with the first *count* entries and the rest.
+  if entry is None:
+    return None, None
+  if _size(entry.left) >= count:
+    left, entry.left = _split(entry.left, count)
+    return left, _update(entry)
+  entry.right, right = _split(entry.right, count - _size(entry.left) - 1)
+  return _update(entry), right
+
+
+def _merge(left, right):
+  if not left:
+    return right
+  if not right:
+    return left
+  if left.priority > right.priority:
+    left.right = _merge(left.right, right)
+    return _update(left)
+  right.left = _merge(left, right.left)
+  return _update(right)
+
+
+class ChildIndex(object):
+  '''
+  An order-statistic tree (a treap ordered by position) of the children of
+  a #TreeNodeBase. Inserting and removing at any position, looking up the
+  node at a position and the position of a node are O(log n), the length
+  is O(1). It is maintained by #TreeNodeBase if the class sets
+  #TreeNodeBase.indexed_children.
+  '''
+
+  __slots__ = ('_root',)
+
+  def __init__(self):
+    self._root = None
+
+  def __len__(self):
+    return _size(self._root)
+
+  def _set_root(self, entry):
+    if entry:
+      entry.parent = None
+    self._root = entry
+
+  def insert(self, index, node):
+    '''
+    Insert *node* at the specified *index* and return its entry.
+    '''
+
+    entry = _IndexEntry(node)
+    left, right = _split(self._root, index)
+    self._set_root(_merge(_merge(left, entry), right))
+    return entry
+
+  def remove(self, entry):
+    '''
+    Remove the *entry* that was returned by #insert().
+    '''
+
+    left, right = _split(self._root, self.index_of(entry))
+    _, right = _split(right, 1)
+    self._set_root(_merge(left, right))
+
+  def index_of(self, entry):
+    '''
+    Returns the position of the *entry* that was returned by #insert().
+    '''
+
+    index = _size(entry.left)
+    while entry.parent:
+      if entry is entry.parent.right:
+        index += _size(entry.parent.left) + 1
+      entry = entry.parent
+    return index
+
+  def at(self, index):
+    '''
+    Returns the node at the specified *index*. Raises an #IndexError if
+    *index* is out of range.
+    '''
+
+    if index < 0 or index >= len(self):
+      raise IndexError(index)
+    entry = self._root
+    while True:
+      left = _size(entry.left)
+      if index < left:
+        entry = entry.left
+      elif index == left:
+        return entry.node
+      else:
+        index -= left + 1
+        entry = entry.right
+
+
 class TreeNodeBase(object):
   '''
   A base class to construct tree structures.
@@ -52,8 +176,29 @@ class TreeNodeBase(object):
 
     :getter: Returns a list of the node's children.
     :type: :class:`list` of :class:`TreeNodeBase`
+
+  .. attribute:: child_count
+
+    :getter: Returns the number of children of the node.
+    :type: :class:`int`
+
+  .. attribute:: indexed_children
+
+    Class-level flag. If True, the children of the node are additionally
+    kept in a :class:`ChildIndex` which makes :meth:`append` with an index,
+    :meth:`get_child`, :meth:`get_child_count` and :meth:`get_index` of
+    its children O(log n) instead of O(n). The index costs an additional
+    object per child, thus it is only built by the first of these calls
+    and only if the node has at least :attr:`child_index_threshold`
+    children.
   '''
 
+  __slots__ = ('__parent', '__next', '__pred', '__down', '__down_last',
+    '__index', '__entry')
+
+  indexed_children = False
+  child_index_threshold = 32
+
   def __init__(self):
     super(TreeNodeBase, self).__init__()
     self.__parent = None
@@ -61,6 +206,8 @@ class TreeNodeBase(object):
     self.__pred = None
     self.__down = None
     self.__down_last = None
+    self.__index = None
+    self.__entry = None
 
   def __assert_dangling(self, param):
     if not self.is_dangling():
@@ -105,12 +252,117 @@ class TreeNodeBase(object):
       child = child.__next
     return children
 
+  def __require_index(self):
+    # Returns the child index of the node, building it if the node has
+    # enough children. Returns None if the node has no index.
+    if self.__index is None and self.indexed_children:
+      count = 0
+      child = self.__down
+      while child and count < self.child_index_threshold:
+        count += 1
+        child = child.__next
+      if child:
+        index = ChildIndex()
+        child = self.__down
+        while child:
+          child.__entry = index.insert(len(index), child)
+          child = child.__next
+        self.__index = index
+    return self.__index
+
+  def get_child_count(self):
+    if self.__require_index() is not None:
+      return len(self.__index)
+    count = 0
+    child = self.__down
+    while child:
+      count += 1
+      child = child.__next
+    return count
+
+  def get_child(self, index):
+    '''
+    Returns the child at the specified *index*, which may be negative.
+    Raises an :class:`IndexError` if there is no child at *index*.
+    '''
+
+    if index < 0:
+      index += self.get_child_count()
+    if self.__require_index() is not None:
+      return self.__index.at(index)
+    child = self.__down
+    while child and index > 0:
+      child = child.__next
+      index -= 1
+    if not child or index < 0:
+      raise IndexError(index)
+    return child
+
+  def get_index(self):
+    '''
+    Returns the position of the node in its parent's children or None
+    if the node has no parent.
+    '''
+
+    if not self.__parent:
+      return None
+    self.__parent.__require_index()
+    if self.__entry is not None:
+      return self.__parent.__index.index_of(self.__entry)
+    index = 0
+    pred = self.__pred
+    while pred:
+      index += 1
+      pred = pred.__pred
+    return index
+
+  def get_path(self):
+    '''
+    Returns a list of the positions of the node and its parents, starting
+    at the root. Comparing the paths of two nodes in the same tree tells
+    which of them comes first in a depth-first traversal.
+    '''
+
+    path = []
+    node = self
+    while node.__parent:
+      path.append(node.get_index())
+      node = node.__parent
+    path.reverse()
+    return path
+
+  def __index_insert(self, index):
+    # Adds the node to its parent's child index, if the parent has one.
+    parent_index = self.__parent.__index
+    if parent_index is not None:
+      self.__entry = parent_index.insert(index, self)
+
+  def _on_insert(self):
+    '''
+    Called after the node was inserted into a hierarchy. The default
+    implementation does nothing.
+    '''
+
+    pass
+
+  def _on_remove(self, parent):
+    '''
+    Called after the node was removed from the specified *parent*. The
+    default implementation does nothing.
+    '''
+
+    pass
+
   def remove(self):
     '''
     Removes the node from the parent and neighbouring nodes. Does
     not detach child nodes.
     '''
 
+    parent = self.__parent
+    if self.__entry is not None:
+      parent.__index.remove(self.__entry)
+      self.__entry = None
     if self.__parent:
       if self is self.__parent.__down:
         self.__parent.__down = self.__next
@@ -123,6 +375,8 @@ class TreeNodeBase(object):
     self.__parent = None
     self.__next = None
     self.__pred = None
+    if parent:
+      self._on_remove(parent)
 
   def insert_after(self, node):
     '''
@@ -146,6 +400,9 @@ class TreeNodeBase(object):
     self.__next = node.__next
     node.__next = self
     self.__pred = node
+    if self.__parent.__index is not None:
+      self.__index_insert(node.get_index() + 1)
+    self._on_insert()
 
   def insert_before(self, node):
     '''
@@ -169,21 +426,23 @@ class TreeNodeBase(object):
     self.__pred = node.__pred
     node.__pred = self
     self.__next = node
+    if self.__parent.__index is not None:
+      self.__index_insert(node.get_index())
+    self._on_insert()
 
   def append(self, node, index=None):
     '''
     Appends *node* at the specified *index*. If *index* is None,
-    *node* will be inserted at the end of the children list. The
-    *index* can not be a negative value as it would need to count
-    the number of childrens first.
+    *node* will be inserted at the end of the children list. A
+    negative *index* counts from the end of the children list, like
+    for :meth:`list.insert`. Note that this requires counting the
+    children unless the node has :attr:`indexed_children`.
     '''
 
     if not isinstance(node, TreeNodeBase):
       raise TypeError('<node> must be TreeNodeBase instance', type(node))
     if index is not None and not isinstance(index, int):
       raise TypeError('<index> must be None or int', type(index))
-    if index is not None and index < 0:
-      raise ValueError('<index> must be None or positive int', index)
 
     # Make sure the node is not already in a hierarchy.
     node.__assert_dangling('node')
@@ -200,15 +459,22 @@ class TreeNodeBase(object):
       self.__down = node
       self.__down_last = node
       node.__parent = self
+      if self.__index is not None:
+        node.__index_insert(0)
+      node._on_insert()
     else:
-      if index is not None:
+      dest = None
+      if index is not None and index < 0:
+        index = max(0, index + self.get_child_count())
+      if index is not None and self.__require_index() is not None:
+        if index < len(self.__index):
+          dest = self.__index.at(index)
+      elif index is not None:
         dest = self.__down
         child_index = 0
         while dest and child_index < index:
           dest = dest.__next
           child_index += 1
-      else:
-        dest = None
 
       if dest:
         node.insert_before(dest)
@@ -218,18 +484,81 @@ class TreeNodeBase(object):
   def iter_children(self, recursive=False):
     '''
     Iterator for the children of this node. If *recursive* is True,
-    the function will iterate recursively over all children as well.
+    the function will iterate over all descendants in post-order
+    (see :meth:`iter_postorder`).
     '''
 
-    child = self.down
+    if recursive:
+      for node in self.iter_postorder():
+        yield node
+      return
+    child = self.__down
     while child:
-      next = child.next
-      if recursive:
-        for x in child.iter_children(True):
-          yield x
+      next = child.__next
       yield child
       child = next
 
+  def iter_preorder(self, filter=None, descend=None, include_self=False):
+    '''
+    Iterates over the descendants of this node in pre-order, that is
+    every node comes before its children. The traversal follows the
+    links between the nodes, thus it needs no stack and works for trees
+    of any depth.
+
+    :param filter: A function that returns True for the nodes that
+      are yielded. All nodes are yielded if it is None.
+    :param descend: A function that returns True if the children of a
+      node should be visited. All nodes are visited if it is None.
+    :param include_self: Start with this node instead of its first child.
+
+    The nodes must not be moved or removed during the iteration, but
+    changing other attributes is fine.
+    '''
+
+    if include_self:
+      node = self
+    elif descend is None or descend(self):
+      node = self.__down
+    else:
+      node = None
+    while node is not None:
+      if filter is None or filter(node):
+        yield node
+      if node.__down is not None and (descend is None or descend(node)):
+        node = node.__down
+        continue
+      while node is not self and node.__next is None:
+        node = node.__parent
+      node = None if node is self else node.__next
+
+  def iter_postorder(self, filter=None, include_self=False):
+    '''
+    Iterates over the descendants of this node in post-order, that is
+    every node comes after its children. Like :meth:`iter_preorder`, the
+    traversal needs no stack. The node that was yielded last may be
+    removed from the tree during the iteration.
+
+    :param filter: A function that returns True for the nodes that
+      are yielded. All nodes are yielded if it is None.
+    :param include_self: End with this node.
+    '''
+
+    node = self
+    while node.__down is not None:
+      node = node.__down
+    while node is not self:
+      if node.__next is not None:
+        next = node.__next
+        while next.__down is not None:
+          next = next.__down
+      else:
+        next = node.__parent
+      if filter is None or filter(node):
+        yield node
+      node = next
+    if include_self and (filter is None or filter(self)):
+      yield self
+
   def flush_children(self):
     '''
     Remove all child nodes from this node.
@@ -245,3 +574,4 @@ class TreeNodeBase(object):
   down = property(get_down)
   down_last = property(get_down_last)
   children = property(get_children)
+  child_count = property(get_child_count)
@@ -23,38 +23,51 @@ class _Item(object):
 
 class OrderedDict(object):
   '''
-  A very basic implementation of an ordered dictionary.
+  A very basic implementation of an ordered dictionary. Keys are indexed
+  in a hash table, the insertion order is kept in a separate list. Lookups
+  and insertions are O(1), deletions are O(n).
   '''
 
   def __init__(self, iterable=()):
     self._items = []
+    self._map = {}
     for key, value in iterable:
       self[key] = value
 
+  def __len__(self):
+    return len(self._items)
+
+  def __contains__(self, needle):
+    return needle in self._map
+
   def __getitem__(self, needle):
-    for item in self._items:
-      if item.key == needle:
-        return item.value
-    raise KeyError(needle)
+    return self._map[needle].value
 
   def __setitem__(self, needle, value):
-    for item in self._items:
-      if item.key == needle:
-        item.value = value
-        return
-    self._items.append(_Item(needle, value))
+    item = self._map.get(needle)
+    if item is not None:
+      item.value = value
+      return
+    item = _Item(needle, value)
+    self._map[needle] = item
+    self._items.append(item)
 
   def __delitem__(self, needle):
-    for index, item in self._items:
-      if item.key == needle:
+    item = self._map.pop(needle)
+    for index, other in enumerate(self._items):
+      if other is item:
+        del self._items[index]
         break
-    else:
-      raise KeyError(needle)
-    del self._items[index]
 
   def __iter__(self):
     return self.iterkeys()
 
+  def get(self, needle, default=None):
+    item = self._map.get(needle)
+    if item is None:
+      return default
+    return item.value
+
   def iterkeys(self):
     for item in self._items:
       yield item.key
@@ -0,0 +1,169 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Prepares the scene of the next job while the current job is rendering, so
+that the next job can start as soon as the renderer is free.
+"""
+
+from . import STATUS_PENDING, STATUS_FAILED
+import c4d
+import threading
+import traceback
+
+
+def warm_file(filename, blocksize=1 << 20):
+  '''
+  Reads the file *filename* completely. Afterwards it is most likely in
+  the cache of the operating system or network file system.
+  '''
+
+  with open(filename, 'rb') as fp:
+    while fp.read(blocksize):
+      pass
+
+
+def get_asset_filenames(doc):
+  '''
+  Returns a list of the filenames of the assets of *doc* that exist.
+  Requires Cinema 4D R18, returns an empty list in older versions.
+  '''
+
+  get_all_assets = getattr(c4d.documents, 'GetAllAssets', None)
+  if not get_all_assets:
+    return []
+  assets = get_all_assets(doc, False, '') or []
+  return [x['filename'] for x in assets if x.get('exists') and x.get('filename')]
+
+
+class Prefetcher(object):
+  '''
+  Prefetches the scene of one #nr.pvrq2.RenderJob at a time in two stages:
+
+  1. #nr.pvrq2.RenderJob.prefetch() runs in a background thread. For a
+     #nr.pvrq2.FileRenderJob, this checks that the scene file exists and
+     reads it once.
+  2. When the first stage is done, #poll() calls
+     #nr.pvrq2.RenderJob.load_scene() on the main thread and keeps the
+     document. The assets of the document are then read in the background.
+
+  If a stage fails, the job is marked as #nr.pvrq2.STATUS_FAILED right away
+  instead of when it would have been rendered. Only jobs that are
+  #nr.pvrq2.RenderJob.prefetchable are prefetched.
+
+  # Attributes
+
+  job (nr.pvrq2.RenderJob): The job that is being prefetched or #None.
+
+  document (c4d.documents.BaseDocument): The document of #job, once it
+    has been loaded.
+  '''
+
+  def __init__(self):
+    super(Prefetcher, self).__init__()
+    self.job = None
+    self.document = None
+    self._thread = None
+    self._result = None
+
+  def _start(self, func):
+    # Every stage reports into its own dictionary, so that a cancelled
+    # stage can not interfere with the next one.
+    result = self._result = {'error': None}
+    def run():
+      try:
+        func()
+      except BaseException:
+        result['error'] = traceback.format_exc()
+    self._thread = threading.Thread(target=run)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _fail(self, error_message):
+    job = self.job
+    self.cancel()
+    if job.status == STATUS_PENDING:
+      job.status = STATUS_FAILED
+      job.error_message = error_message
+
+  def request(self, job):
+    '''
+    Start prefetching *job*, if it is not already being prefetched. Any
+    other job that was prefetched before is dropped. Pass #None to stop
+    prefetching.
+    '''
+
+    if job is self.job:
+      return
+    self.cancel()
+    if job is not None and job.prefetchable:
+      # The payload must not be decoded in the background thread.
+      if not job.load_payload():
+        return
+      self.job = job
+      self._start(job.prefetch)
+
+  def poll(self):
+    '''
+    Must be called regularly from the main thread to advance the
+    prefetching of the requested job.
+    '''
+
+    if self.job is None or (self._thread and self._thread.is_alive()):
+      return
+    self._thread = None
+    if self._result and self._result['error']:
+      self._fail(self._result['error'])
+    elif self.document is None:
+      try:
+        self.document = self.job.load_scene()
+      except BaseException:
+        self._fail(traceback.format_exc())
+        return
+      if self.document is None:
+        from . import res
+        self._fail(self.job.error_message or
+          res.string('IDS_ERROR_JOBRETURNEDNONE'))
+        return
+      try:
+        filenames = get_asset_filenames(self.document)
+      except BaseException:
+        traceback.print_exc()
+        filenames = []
+      self._start(lambda: [warm_file(x) for x in filenames])
+      self._result = None
+
+  def take(self, job):
+    '''
+    Returns the prefetched document of *job* and stops prefetching it, or
+    returns #None if the document of *job* is not ready.
+    '''
+
+    if job is not self.job or self.document is None:
+      return None
+    document = self.document
+    self.cancel()
+    return document
+
+  def cancel(self):
+    '''
+    Drop the currently prefetched job. A background stage that is still
+    running finishes, but its result is ignored.
+    '''
+
+    self.job = None
+    self.document = None
+    self._thread = None
+    self._result = None
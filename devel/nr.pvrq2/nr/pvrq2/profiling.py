@@ -0,0 +1,277 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Named timers and counters that measure where the render queue spends its
+time. Profiling is disabled unless the environment variable #ENV_VAR is
+set (or #enable() is called, see `settings.profiling` in
+`pvrenderqueue2.pyp`). While it is disabled, a timed function costs one
+flag check per call and #count() returns immediately.
+
+If #ENV_VAR is set to a filename instead of `1`, the report is written to
+that file when Cinema 4D exits.
+
+```python
+from nr.pvrq2 import profiling
+
+@profiling.timed('scene.prepare')
+def prepare(doc):
+  with profiling.timer('scene.prepare.takes'):
+    ...
+  profiling.count('scene.prepare.objects', len(objects))
+```
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+#: The environment variable that enables profiling.
+ENV_VAR = 'PVRQ2_PROFILE'
+
+#: The upper bounds (in seconds) of the histogram buckets of a #Timer. The
+#: last bucket counts the calls that took longer than the last bound.
+BUCKETS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+_clock = getattr(time, 'perf_counter', time.time)
+_lock = threading.Lock()
+_enabled = False
+timers = {}    #: Maps names to #Timer objects.
+counters = {}  #: Maps names to the values of the counters.
+
+
+class Timer(object):
+  '''
+  The aggregated durations of the calls of a named timer.
+  '''
+
+  __slots__ = ('name', 'calls', 'total', 'min', 'max', 'histogram')
+
+  def __init__(self, name):
+    self.name = name
+    self.calls = 0
+    self.total = 0.0
+    self.min = None
+    self.max = None
+    self.histogram = [0] * (len(BUCKETS) + 1)
+
+  def add(self, seconds):
+    self.calls += 1
+    self.total += seconds
+    if self.min is None or seconds < self.min:
+      self.min = seconds
+    if self.max is None or seconds > self.max:
+      self.max = seconds
+    for index, bound in enumerate(BUCKETS):
+      if seconds < bound:
+        break
+    else:
+      index = len(BUCKETS)
+    self.histogram[index] += 1
+
+  @property
+  def mean(self):
+    return self.total / self.calls if self.calls else 0.0
+
+  def to_dict(self):
+    return {'name': self.name, 'calls': self.calls, 'total': self.total,
+      'mean': self.mean, 'min': self.min, 'max': self.max,
+      'histogram': list(self.histogram)}
+
+
+class _TimerContext(object):
+
+  __slots__ = ('name', 'start')
+
+  def __init__(self, name):
+    self.name = name
+
+  def __enter__(self):
+    self.start = _clock()
+    return self
+
+  def __exit__(self, *args):
+    add_time(self.name, _clock() - self.start)
+
+
+class _NullContext(object):
+
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    pass
+
+
+_null_context = _NullContext()
+
+
+def is_enabled():
+  return _enabled
+
+
+def enable():
+  '''
+  Enable profiling. Timers and counters start to collect data.
+  '''
+
+  global _enabled
+  _enabled = True
+
+
+def disable():
+  '''
+  Disable profiling. The collected data is kept.
+  '''
+
+  global _enabled
+  _enabled = False
+
+
+def reset():
+  '''
+  Discard all collected data.
+  '''
+
+  with _lock:
+    timers.clear()
+    counters.clear()
+
+
+def add_time(name, seconds):
+  '''
+  Adds a call that took *seconds* to the timer *name*.
+  '''
+
+  with _lock:
+    timer = timers.get(name)
+    if timer is None:
+      timer = timers[name] = Timer(name)
+    timer.add(seconds)
+
+
+def timer(name):
+  '''
+  Returns a context manager that adds the time spent in its block to the
+  timer *name*, or a context manager that does nothing if profiling is
+  disabled.
+  '''
+
+  if not _enabled:
+    return _null_context
+  return _TimerContext(name)
+
+
+def timed(name):
+  '''
+  Decorator that adds the time spent in the decorated function to the
+  timer *name*.
+  '''
+
+  def decorator(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      if not _enabled:
+        return func(*args, **kwargs)
+      start = _clock()
+      try:
+        return func(*args, **kwargs)
+      finally:
+        add_time(name, _clock() - start)
+    return wrapper
+  return decorator
+
+
+def count(name, value=1):
+  '''
+  Adds *value* to the counter *name* if profiling is enabled.
+  '''
+
+  if not _enabled:
+    return
+  with _lock:
+    counters[name] = counters.get(name, 0) + value
+
+
+def report():
+  '''
+  Returns the collected timers and counters as a text table. Times are
+  milliseconds, the histogram columns count the calls that took less
+  than the bound in the header.
+  '''
+
+  def ms(seconds):
+    return '{0:.3f}'.format(seconds * 1000.0) if seconds is not None else '-'
+
+  with _lock:
+    items = sorted(timers.values(), key=lambda x: x.total, reverse=True)
+    rows = [[x.name, str(x.calls), ms(x.total), ms(x.mean), ms(x.min),
+      ms(x.max)] + [str(n) for n in x.histogram] for x in items]
+    counter_items = sorted(counters.items())
+
+  bounds = ['<{0:g}'.format(x * 1000.0) for x in BUCKETS]
+  bounds.append('>={0:g}'.format(BUCKETS[-1] * 1000.0))
+  header = ['timer', 'calls', 'total', 'mean', 'min', 'max'] + bounds
+  widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+  lines = []
+  for row in [header] + rows:
+    cells = [row[0].ljust(widths[0])]
+    cells.extend(cell.rjust(width) for cell, width in zip(row[1:], widths[1:]))
+    lines.append('  '.join(cells))
+  if counter_items:
+    lines.append('')
+    width = max(len(name) for name, __ in counter_items)
+    lines.append('counter'.ljust(width) + '  value')
+    for name, value in counter_items:
+      lines.append('{0}  {1}'.format(name.ljust(width), value))
+  return '\n'.join(lines)
+
+
+def dump(filename):
+  '''
+  Writes the collected data to *filename*, as JSON if the name ends
+  with `.json`, otherwise as the text of #report().
+  '''
+
+  if filename.lower().endswith('.json'):
+    with _lock:
+      data = {'timers': [x.to_dict() for x in timers.values()],
+        'counters': dict(counters), 'buckets': list(BUCKETS)}
+    with open(filename, 'w') as fp:
+      json.dump(data, fp, indent=2)
+  else:
+    text = report()
+    with open(filename, 'w') as fp:
+      fp.write(text + '\n')
+
+
+def _dump_at_exit(filename):
+  try:
+    dump(filename)
+  except (IOError, OSError) as exc:
+    print('[PV Render Queue 2]: Could not write the profiling report:', exc)
+
+
+_env = os.environ.get(ENV_VAR, '').strip()
+if _env and _env != '0':
+  enable()
+  if _env != '1':
+    atexit.register(_dump_at_exit, _env)
+del _env
@@ -0,0 +1,202 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Keeps track of the render jobs that are ready to be rendered, so that the
+queue does not need to be scanned completely to find the next job.
+"""
+
+from . import RenderJob, STATUS_PENDING, STATUS_RENDERING
+
+
+class Scheduler(object):
+  '''
+  Listens to the changes of a #nr.pvrq2.Root and maintains the jobs that
+  can be rendered in the order of the tree, and the job that is currently
+  rendering.
+
+  The ready queue is a list of jobs sorted by their position in the tree
+  (see #nr.pvrq2.node.TreeNodeBase.get_path()). Jobs that were inserted,
+  enabled or reset are inserted at their position with a binary search,
+  removed jobs are filtered out once before the next job is picked. Jobs
+  that end up next to each other in the queue, eg. a run of siblings that
+  was moved with #nr.pvrq2.move_nodes(), are spliced in as one block. Jobs
+  that are no longer runnable (rendered or disabled) are dropped when they
+  reach the front of the queue. Only after large changes (eg. loading the
+  queue) the ready queue is rebuilt from the whole tree. A tick without
+  changes does not touch the tree at all.
+
+  # Attributes
+
+  root (nr.pvrq2.Root): The root of the queue.
+
+  rendering (nr.pvrq2.RenderJob): The job that is currently rendering
+    or #None.
+  '''
+
+  #: Rebuild the ready queue from the tree instead of inserting the jobs
+  #: one by one if more than this number of jobs, or a quarter of the
+  #: queue, was inserted since the last update.
+  REBUILD_THRESHOLD = 64
+
+  def __init__(self, root):
+    super(Scheduler, self).__init__()
+    self.root = root
+    self.rendering = None
+    self._queue = []       # candidates in tree order
+    self._head = 0         # the jobs before this index were dropped
+    self._queued = set()   # the jobs in _queue[_head:]
+    self._pending = []     # nodes that were inserted, enabled or reset
+    self._removed = set()  # queued jobs that were removed from the tree
+    self._dirty = True
+    for job in root.iter_tree(lambda x: isinstance(x, RenderJob)):
+      if job.status == STATUS_RENDERING:
+        self.rendering = job
+    root.add_listener(self)
+
+  def __call__(self, event, node, *args):
+    if event == 'insert':
+      self._pending.append(node)
+    elif event == 'remove':
+      if not self._dirty:
+        queued = self._queued
+        self._removed.update(node.iter_preorder(lambda x: x in queued,
+          include_self=True))
+    elif event == 'change':
+      attr = args[0]
+      if attr == 'enabled':
+        if node.enabled:
+          self._pending.append(node)
+      elif attr == 'status':
+        if node.status == STATUS_RENDERING:
+          self.rendering = node
+        elif node is self.rendering:
+          self.rendering = None
+        if node.status == STATUS_PENDING:
+          self._pending.append(node)
+
+  def close(self):
+    '''
+    Stop listening to the changes of the root.
+    '''
+
+    self.root.remove_listener(self)
+
+  def is_runnable(self, job):
+    '''
+    Returns True if *job* is pending, enabled and in the queue.
+    '''
+
+    return (job.status == STATUS_PENDING and job.enabled_state == 'enabled'
+      and job.get_root() is self.root)
+
+  def _rebuild(self):
+    self._dirty = False
+    self._pending = []
+    self._removed = set()
+    jobs = self.root.iter_tree(lambda x: isinstance(x, RenderJob))
+    self._queue = [x for x in jobs if self.is_runnable(x)]
+    self._head = 0
+    self._queued = set(self._queue)
+
+  def _bisect(self, path, low):
+    # Binary search for the position of the job with the *path* in the
+    # tree order, starting at the index *low*.
+    queue = self._queue
+    high = len(queue)
+    if low == high or queue[-1].get_path() < path:
+      return high
+    while low < high:
+      mid = (low + high) // 2
+      if queue[mid].get_path() < path:
+        low = mid + 1
+      else:
+        high = mid
+    return low
+
+  def _insert(self, jobs):
+    # Inserts the *jobs* at their positions in the tree order. A job that
+    # comes before the queued job that follows the previous job belongs
+    # to the same block, which is inserted with one slice assignment.
+    queue = self._queue
+    paths = dict((job, job.get_path()) for job in jobs)
+    blocks = []
+    low = self._head
+    next_path = None
+    for job in sorted(jobs, key=paths.get):
+      path = paths[job]
+      if blocks and (next_path is None or path < next_path):
+        blocks[-1][1].append(job)
+        continue
+      low = self._bisect(path, low)
+      next_path = queue[low].get_path() if low < len(queue) else None
+      blocks.append((low, [job]))
+    for index, block in reversed(blocks):
+      queue[index:index] = block
+    self._queued.update(jobs)
+
+  def _update(self):
+    if self._removed:
+      removed, self._removed = self._removed, set()
+      self._queue = [x for x in self._queue[self._head:] if x not in removed]
+      self._head = 0
+      self._queued.difference_update(removed)
+
+    if self._pending and not self._dirty:
+      jobs = []
+      limit = max(self.REBUILD_THRESHOLD, (len(self._queue) - self._head) // 4)
+      for node in self._pending:
+        if node.get_root() is not self.root:
+          continue
+        for job in node.iter_preorder(lambda x: isinstance(x, RenderJob),
+            include_self=True):
+          if job not in self._queued and self.is_runnable(job):
+            jobs.append(job)
+        if len(jobs) > limit:
+          self._dirty = True
+          break
+      else:
+        self._pending = []
+        self._insert(set(jobs))
+
+    if self._dirty:
+      self._rebuild()
+
+  def iter_runnable(self):
+    '''
+    Iterate over the jobs that can be rendered in the order of the queue.
+    '''
+
+    self._update()
+    queue = self._queue
+    while self._head < len(queue) and not self.is_runnable(queue[self._head]):
+      self._queued.discard(queue[self._head])
+      self._head += 1
+    if self._head > 64 and self._head * 2 > len(queue):
+      queue = self._queue = queue[self._head:]
+      self._head = 0
+    for index in range(self._head, len(queue)):
+      job = queue[index]
+      if self.is_runnable(job):
+        yield job
+
+  def next_job(self):
+    '''
+    Returns the next job that can be rendered or #None.
+    '''
+
+    for job in self.iter_runnable():
+      return job
+    return None
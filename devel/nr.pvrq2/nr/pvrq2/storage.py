@@ -0,0 +1,523 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Storage backends that persist the render queue between sessions.
+
+* #HyperFileStore -- rewrites the whole queue into a HyperFile with
+  #nr.pvrq2.write_nodes()
+* #JournalStore -- a #HyperFileStore snapshot plus a #nr.pvrq2.journal
+  of the changes since
+* #SQLiteStore -- one row per node in a SQLite database, only the rows
+  of changed nodes are updated
+
+The data of a node is always written with #nr.pvrq2.BaseNode.write(), so
+node plugins registered with #nr.pvrq2.register_node_plugin() work with
+every backend.
+"""
+
+from . import (BaseNode, RenderJob, HYPERFILE_IDENT, job_plugins, read_nodes,
+  write_nodes, get_node_payload)
+from .journal import Journal, RECORDED_ATTRIBUTES
+import c4d
+import errno
+import os
+import sqlite3
+import uuid
+
+
+def _silent_remove(filename):
+  try:
+    os.remove(filename)
+  except OSError as exc:
+    if exc.errno != errno.ENOENT:
+      raise
+
+
+class Store(object):
+  '''
+  Interface for the storage backends. A store is used like this:
+
+  1. #load() the queue into the root and #attach() to it.
+  2. After the queue was changed, #flush() the changes. If that returns
+     False, #save() the whole queue.
+  3. #save() the whole queue when the plugin is closed.
+  '''
+
+  def load(self, root, error_callback=None):
+    '''
+    Loads the nodes of the queue and appends them to *root*. The
+    *error_callback* is the same as for #nr.pvrq2.read_nodes().
+
+    # Returns
+    True if a queue was loaded, False if there was none.
+    '''
+
+    raise NotImplementedError
+
+  def save(self, root):
+    '''
+    Saves all nodes of *root*. Can raise any exception that a
+    #nr.pvrq2.BaseNode.write() implementation raises.
+
+    # Returns
+    True on success, False on failure.
+    '''
+
+    raise NotImplementedError
+
+  def attach(self, root):
+    '''
+    Start tracking the changes of *root* so that they can be written
+    with #flush(). The default implementation does nothing.
+    '''
+
+    pass
+
+  def detach(self):
+    '''
+    Stop tracking changes. The default implementation does nothing.
+    '''
+
+    pass
+
+  def flush(self):
+    '''
+    Writes the changes that were tracked since the last #flush() or
+    #save().
+
+    # Returns
+    False if the changes can not be written incrementally and the queue
+    must be saved with #save(). The default implementation returns False.
+    '''
+
+    return False
+
+  def close(self):
+    '''
+    Stop tracking changes and release all resources of the store.
+    '''
+
+    self.detach()
+
+
+class HyperFileStore(Store):
+  '''
+  Saves the queue into the HyperFile *filename*.
+  '''
+
+  def __init__(self, filename):
+    super(HyperFileStore, self).__init__()
+    self.filename = filename
+
+  def load(self, root, error_callback=None):
+    hf = c4d.storage.HyperFile()
+    if not hf.Open(HYPERFILE_IDENT, self.filename, c4d.FILEOPEN_READ, c4d.FILEDIALOG_NONE):
+      return False
+    try:
+      nodes = read_nodes(hf, error_callback)
+    finally:
+      hf.Close()
+    for node in nodes or ():
+      root.append(node)
+    return nodes is not False
+
+  def save(self, root):
+    hf = c4d.storage.HyperFile()
+    if not hf.Open(HYPERFILE_IDENT, self.filename, c4d.FILEOPEN_WRITE, c4d.FILEDIALOG_NONE):
+      return False
+    success = False
+    try:
+      success = write_nodes(root, hf)
+    finally:
+      hf.Close()
+      if not success:
+        _silent_remove(self.filename)
+    return success
+
+
+class JournalStore(HyperFileStore):
+  '''
+  A #HyperFileStore whose changes are recorded in the journal
+  *journal_filename* (see #nr.pvrq2.journal). #flush() returns False
+  when the journal has *compact_threshold* records or a record could not
+  be written, then the snapshot is saved again and the journal is
+  cleared.
+  '''
+
+  def __init__(self, filename, journal_filename, compact_threshold=500):
+    super(JournalStore, self).__init__(filename)
+    self.journal = Journal(journal_filename)
+    self.compact_threshold = compact_threshold
+
+  def load(self, root, error_callback=None):
+    success = super(JournalStore, self).load(root, error_callback)
+    if self.journal.replay(root, error_callback):
+      success = True
+    return success
+
+  def save(self, root):
+    success = super(JournalStore, self).save(root)
+    if success:
+      self.journal.clear()
+    return success
+
+  def attach(self, root):
+    self.journal.attach(root)
+
+  def detach(self):
+    self.journal.detach()
+
+  def flush(self):
+    # Every record is written to the journal right away.
+    if self.journal.failed:
+      return False
+    return self.journal.record_count < self.compact_threshold
+
+
+def load_node_data(ident, disklevel, data, error_callback):
+  '''
+  Creates a node of the plugin *ident* and reads it from *data*, which
+  was returned by #nr.pvrq2.dump_node_data(). Returns #None and calls the
+  *error_callback* (see #nr.pvrq2.read_nodes()) if that fails.
+  '''
+
+  if ident not in job_plugins:
+    error_callback('unknown-plugin', ident)
+    return None
+  mfs = c4d.storage.MemoryFileStruct()
+  mfs.SetMemoryReadMode(data, len(data))
+  hf = c4d.storage.HyperFile()
+  if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_READ, c4d.FILEDIALOG_NONE):
+    error_callback('read-error', ident)
+    return None
+  try:
+    node = job_plugins[ident]()
+    if not node._read_data(hf, disklevel):
+      error_callback('read-error', node)
+      return None
+  except BaseException as exc:
+    error_callback('read-exception', exc)
+    return None
+  finally:
+    hf.Close()
+  if not isinstance(node, BaseNode):
+    error_callback('read-wrong-result', node)
+    return None
+  return node
+
+
+def dump_node_header(node):
+  '''
+  Returns the data that #nr.pvrq2.BaseNode.write_header() writes for
+  *node* as #bytes, or #None if it could not be written.
+  '''
+
+  mfs = c4d.storage.MemoryFileStruct()
+  mfs.SetMemoryWriteMode()
+  hf = c4d.storage.HyperFile()
+  if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_WRITE, c4d.FILEDIALOG_NONE):
+    return None
+  try:
+    success = node.write_header(hf)
+  finally:
+    hf.Close()
+  if not success:
+    return None
+  data, size = mfs.GetData()
+  return bytes(data[:size])
+
+
+def load_lazy_node(ident, disklevel, header, data, error_callback):
+  '''
+  Creates a node of the plugin *ident* from the *header* returned by
+  #dump_node_header() and keeps *data* as its payload, which is decoded
+  when it is needed (see #nr.pvrq2.BaseNode.lazy_payload). Returns #None
+  and calls the *error_callback* if that fails.
+  '''
+
+  if ident not in job_plugins:
+    error_callback('unknown-plugin', ident)
+    return None
+  mfs = c4d.storage.MemoryFileStruct()
+  mfs.SetMemoryReadMode(header, len(header))
+  hf = c4d.storage.HyperFile()
+  if not hf.Open(HYPERFILE_IDENT, mfs, c4d.FILEOPEN_READ, c4d.FILEDIALOG_NONE):
+    error_callback('read-error', ident)
+    return None
+  try:
+    node = job_plugins[ident]()
+    name = node._read_header_data(hf, disklevel)
+    if name is None:
+      error_callback('read-error', node)
+      return None
+  except BaseException as exc:
+    error_callback('read-exception', exc)
+    return None
+  finally:
+    hf.Close()
+  node._payload = (disklevel, data, name)
+  return node
+
+
+class SQLiteStore(Store):
+  '''
+  Saves the queue into the SQLite database *filename* with one row per
+  node. The status, parent, position and plugin identifier of the nodes
+  are indexed columns, thus the database can be queried for eg. all
+  failed jobs with #query(). The data of the node itself is an opaque
+  blob written by #nr.pvrq2.BaseNode.write(), next to the blob written by
+  #nr.pvrq2.BaseNode.write_header(). Nodes with a
+  #nr.pvrq2.BaseNode.lazy_payload are loaded from the header only.
+
+  While attached, the store tracks the nodes that were inserted, removed
+  or whose attributes changed, and #flush() only updates their rows.
+  Changes that do not notify the root (eg. renaming a folder) are only
+  saved with #save().
+
+  The position of a node is a float between the positions of its
+  siblings, and the rows of the children refer to their parent. Moving a
+  node thus only updates its own row, the rows of its children stay
+  unchanged. The siblings are renumbered when there is no more room
+  between them.
+  '''
+
+  SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS nodes (
+      uuid TEXT PRIMARY KEY,
+      parent TEXT,
+      position REAL NOT NULL,
+      ident TEXT NOT NULL,
+      disklevel INTEGER NOT NULL,
+      name TEXT,
+      status TEXT,
+      enabled INTEGER NOT NULL,
+      payload BLOB NOT NULL,
+      header BLOB
+    );
+    CREATE INDEX IF NOT EXISTS nodes_status ON nodes (status);
+    CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent, position);
+    CREATE INDEX IF NOT EXISTS nodes_ident ON nodes (ident);
+  '''
+
+  #: The minimum distance between the positions of two siblings.
+  MIN_GAP = 1e-9
+
+  def __init__(self, filename):
+    super(SQLiteStore, self).__init__()
+    self.filename = filename
+    self.root = None
+    self.conn = sqlite3.connect(filename, isolation_level=None)
+    self.conn.executescript(self.SCHEMA)
+    columns = [row[1] for row in self.conn.execute('PRAGMA table_info(nodes)')]
+    if 'header' not in columns:
+      self.conn.execute('ALTER TABLE nodes ADD COLUMN header BLOB')
+    self._positions = {}  # node -> position
+    self._dirty = set()
+    self._removed = set()
+
+  def __call__(self, event, node, *args):
+    if event == 'insert':
+      self._removed.discard(node)
+      self._place(node)
+    elif event == 'remove':
+      # The positions are kept until the next flush() in case the node
+      # is inserted again (it was moved).
+      self._removed.update(node.iter_preorder(include_self=True))
+    elif event == 'change':
+      if args[0] in RECORDED_ATTRIBUTES:
+        self._dirty.add(node)
+
+  def _place(self, node):
+    # Assigns a position to the inserted *node* between its siblings and
+    # marks it dirty. The children of a moved node keep their positions,
+    # new children are numbered.
+    self._removed.difference_update(node.iter_preorder(include_self=True))
+    pred, succ = node.pred, node.next
+    lower = self._positions.get(pred) if pred is not None else None
+    upper = self._positions.get(succ) if succ is not None else None
+    if (pred is not None and lower is None) or (succ is not None and upper is None):
+      self._renumber(node.parent)
+    elif lower is None and upper is None:
+      self._positions[node] = 0.0
+    elif upper is None:
+      self._positions[node] = lower + 1.0
+    elif lower is None:
+      self._positions[node] = upper - 1.0
+    elif upper - lower < self.MIN_GAP * 2:
+      self._renumber(node.parent)
+    else:
+      self._positions[node] = (lower + upper) / 2.0
+    self._dirty.add(node)
+    for parent in node.iter_preorder(lambda x: x.down is not None, include_self=True):
+      positions = [self._positions.get(x) for x in parent.iter_children()]
+      if None in positions or any(a >= b for a, b in zip(positions, positions[1:])):
+        self._renumber(parent)
+
+  def _renumber(self, parent):
+    for index, child in enumerate(parent.iter_children()):
+      self._positions[child] = float(index)
+      self._dirty.add(child)
+
+  def _place_unknown(self, node):
+    # Numbers the siblings of *node* and of its parents that have no
+    # position yet, eg. because they were in the tree before the store
+    # was attached.
+    while node.parent is not None and node not in self._positions:
+      self._renumber(node.parent)
+      node = node.parent
+
+  def _renumber_tree(self, node):
+    # Renumbers the children of *node* and of all its descendants.
+    for parent in node.iter_preorder(include_self=True):
+      self._renumber(parent)
+
+  def _row(self, node):
+    payload = get_node_payload(node)
+    if payload is None:
+      raise ValueError('{0!r} could not be written'.format(node))
+    disklevel, data = payload
+    parent = node.parent
+    if parent is None or parent.parent is None:
+      parent_uuid = None  # top level
+    else:
+      parent_uuid = str(parent.uuid)
+    position = self._positions.get(node)
+    if position is None:
+      raise ValueError('{0!r} has no position, it is not in the tree of '
+        'the store'.format(node))
+    status = node.status if isinstance(node, RenderJob) else None
+    header = dump_node_header(node)
+    if header is not None:
+      header = sqlite3.Binary(header)
+    return (str(node.uuid), parent_uuid, position, node.ident,
+      disklevel, node.name, status, int(bool(node.enabled)),
+      sqlite3.Binary(data), header)
+
+  def _write_rows(self, nodes):
+    self.conn.executemany('INSERT OR REPLACE INTO nodes (uuid, parent, '
+      'position, ident, disklevel, name, status, enabled, payload, header) '
+      'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+      [self._row(x) for x in nodes if x.serializable])
+
+  def load(self, root, error_callback=None):
+    if not error_callback:
+      error_callback = lambda k, v: None
+    rows = self.conn.execute('SELECT uuid, parent, position, ident, '
+      'disklevel, payload, header FROM nodes ORDER BY parent, position').fetchall()
+    nodes = {}
+    for node_uuid, parent_uuid, position, ident, disklevel, data, header in rows:
+      plugin = job_plugins.get(ident)
+      if header is not None and plugin is not None and plugin.lazy_payload:
+        node = load_lazy_node(ident, disklevel, bytes(header), bytes(data),
+          error_callback)
+      else:
+        node = load_node_data(ident, disklevel, bytes(data), error_callback)
+      if node is not None:
+        node.uuid = uuid.UUID(node_uuid)
+        nodes[node_uuid] = (node, parent_uuid, position)
+
+    # Rows are sorted by parent and position, thus the children of every
+    # node are appended in order.
+    for row in rows:
+      node_uuid = row[0]
+      if node_uuid not in nodes:
+        continue
+      node, parent_uuid, position = nodes[node_uuid]
+      parent = nodes.get(parent_uuid)
+      (parent[0] if parent else root).append(node)
+      self._positions[node] = position
+    return bool(rows)
+
+  def save(self, root):
+    self.conn.execute('BEGIN')
+    try:
+      self.conn.execute('DELETE FROM nodes')
+      self._positions.clear()
+      self._renumber_tree(root)
+      self._write_rows(list(self._positions))
+      self.conn.execute('COMMIT')
+    except BaseException:
+      self.conn.execute('ROLLBACK')
+      raise
+    self._dirty.clear()
+    self._removed.clear()
+    return True
+
+  def attach(self, root):
+    self.detach()
+    self.root = root
+    root.add_listener(self)
+
+  def detach(self):
+    if self.root is not None:
+      self.root.remove_listener(self)
+      self.root = None
+    self._dirty.clear()
+    self._removed.clear()
+
+  def flush(self):
+    if not self._dirty and not self._removed:
+      return True
+    for node in list(self._dirty):
+      if node not in self._removed:
+        self._place_unknown(node)
+    self.conn.execute('BEGIN')
+    try:
+      self.conn.executemany('DELETE FROM nodes WHERE uuid = ?',
+        [(str(x.uuid),) for x in self._removed])
+      self._write_rows(x for x in self._dirty if x not in self._removed)
+      self.conn.execute('COMMIT')
+    except BaseException:
+      self.conn.execute('ROLLBACK')
+      raise
+    for node in self._removed:
+      self._positions.pop(node, None)
+    self._dirty.clear()
+    self._removed.clear()
+    return True
+
+  def close(self):
+    super(SQLiteStore, self).close()
+    self.conn.close()
+
+  def query(self, status=None, ident=None, parent=False):
+    '''
+    Returns the UUIDs of the stored nodes that have the specified
+    *status* and plugin *ident*, in no particular order. If *parent* is
+    not False, only the children of the node with that UUID (or the top
+    level nodes if it is #None) are returned, in order. Only the rows
+    are read, the nodes are not loaded.
+    '''
+
+    where, args = [], []
+    if status is not None:
+      where.append('status = ?')
+      args.append(status)
+    if ident is not None:
+      where.append('ident = ?')
+      args.append(ident)
+    if parent is not False:
+      if parent is None:
+        where.append('parent IS NULL')
+      else:
+        where.append('parent = ?')
+        args.append(str(parent))
+    query = 'SELECT uuid FROM nodes'
+    if where:
+      query += ' WHERE ' + ' AND '.join(where)
+    if parent is not False:
+      query += ' ORDER BY position'
+    return [uuid.UUID(row[0]) for row in self.conn.execute(query, args)]
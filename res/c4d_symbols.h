@@ -44,6 +44,14 @@ enum
   IDS_MENU_HELP_PLUGINPAGE,
   IDS_SAVEERRORS,
   IDS_ASKCLOSE,
+  IDS_FOLDER_PROGRESS,
+  IDS_RMB_SPLIT,
+  IDS_SPLIT_CHUNKSIZE,
+  IDS_RMB_SKIPEXISTING,
+  IDS_FOLDER_PROGRESS_ETA,
+  TXT_ETA,
+  IDS_ETA,
+  IDS_MENU_HELP_PROFILING,
   ID_SCRIPTS_BEGIN = 200000,
   ID_SCRIPTS_END = 200500,
   // Custom strings end here
@@ -26,7 +26,7 @@ DIALOG DLG_PVRQ2
         SIZE 0, 0; 
         SPECIAL 0; 
       }
-      STATICTEXT  { NAME IDS_STATIC3; CENTER_V; SCALE_H; }
+      STATICTEXT TXT_ETA { NAME IDS_STATIC3; CENTER_V; SCALE_H; }
       BITMAPBUTTON BTN_ADD_FILE
       {
         CENTER_V; ALIGN_LEFT; 
@@ -0,0 +1,79 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This script exports the timings of all jobs in the render queue to a CSV
+or JSON file, depending on the suffix of the chosen filename (CSV if it
+has neither suffix). Times are seconds since the epoch, durations are
+seconds.
+"""
+
+import c4d
+import csv
+import json
+import nr.pvrq2
+import sys
+
+
+COLUMNS = ['folder', 'name', 'status', 'filename'] + \
+  list(nr.pvrq2.TIMING_EVENTS) + ['load_time', 'render_time', 'wall_time']
+
+
+def get_rows():
+  rows = []
+  for job in nr.pvrq2.root.iter_tree(lambda x: isinstance(x, nr.pvrq2.RenderJob)):
+    folders = []
+    parent = job.parent
+    while parent is not None and parent is not nr.pvrq2.root:
+      folders.append(parent.name)
+      parent = parent.parent
+    row = ['/'.join(reversed(folders)), job.name, job.status,
+      getattr(job, 'filename', None)]
+    row.extend(job.get_timings().values())
+    row.extend(job.get_durations().values())
+    rows.append(row)
+  return rows
+
+
+def open_csv(filename):
+  # The csv module writes its own line endings.
+  if sys.version_info[0] >= 3:
+    return open(filename, 'w', newline='')
+  return open(filename, 'wb')
+
+
+def main():
+  filename = c4d.storage.LoadDialog(title='Export Timings (.csv or .json)',
+    flags=c4d.FILESELECT_SAVE)
+  if not filename:
+    return
+  if not filename.lower().endswith(('.csv', '.json')):
+    filename += '.csv'
+
+  rows = get_rows()
+  if filename.lower().endswith('.json'):
+    with open(filename, 'w') as fp:
+      json.dump([dict(zip(COLUMNS, row)) for row in rows], fp, indent=2)
+  else:
+    with open_csv(filename) as fp:
+      writer = csv.writer(fp)
+      writer.writerow(COLUMNS)
+      for row in rows:
+        writer.writerow(['' if x is None else x for x in row])
+  c4d.gui.MessageDialog("The timings of {0} job(s) were exported.".format(len(rows)))
+
+
+if __name__ == '__main__':
+  main()
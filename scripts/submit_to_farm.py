@@ -0,0 +1,57 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+This script submits the selected pending jobs of the render queue to a
+farm store, from where they are rendered by the workers of the farm (see
+`nr.pvrq2.farm`). The filename of the store is taken from the
+`PVRQ2_FARM_STORE` environment variable or is asked for. The submitted
+jobs are disabled in the local queue.
+"""
+
+import c4d
+import os
+import nr.pvrq2
+import nr.pvrq2.farm
+
+
+def main():
+  filename = os.environ.get('PVRQ2_FARM_STORE')
+  if not filename:
+    filename = c4d.storage.LoadDialog(title='Farm Store',
+      flags=c4d.FILESELECT_SAVE, force_suffix='sqlite')
+  if not filename:
+    return
+
+  jobs = [x for x in nr.pvrq2.root.get_selected_nodes()
+    if isinstance(x, nr.pvrq2.RenderJob) and x.status == nr.pvrq2.STATUS_PENDING]
+  if not jobs:
+    c4d.gui.MessageDialog("Please select the jobs to submit to the farm.")
+    return
+
+  store = nr.pvrq2.farm.FarmStore(filename)
+  count = 0
+  for job in jobs:
+    if not job.serializable:
+      print("[PV Render Queue 2]: Farm:", job.name, "can not be submitted")
+    elif store.submit(job):
+      job.enabled = False
+      count += 1
+  c4d.gui.MessageDialog("{0} job(s) submitted to the farm.".format(count))
+  c4d.EventAdd()
+
+
+if __name__ == '__main__':
+  main()
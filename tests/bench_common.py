@@ -0,0 +1,157 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Helpers for the benchmarks in this directory (`bench_*.py`). They run
+outside of Cinema 4D on top of #c4dstub, eg.
+
+    python tests/bench_read_nodes.py 1000 10000 100000
+
+The times are the best of a few runs. The stub's #c4dstub.HyperFile is
+slower than the real one and its sizes are those of its own encoding, so
+the numbers are only comparable within one run. #hyperfile_size() gives
+an estimate of the size of a real HyperFile.
+"""
+
+from __future__ import print_function
+
+import pickle
+import sys
+import time
+
+import c4dstub
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def get_sizes(default):
+  '''
+  Returns the sizes passed on the command line, or *default*.
+  '''
+
+  sizes = [int(x) for x in sys.argv[1:]]
+  return sizes or list(default)
+
+
+def best_of(func, repeat=3):
+  '''
+  Returns the shortest time in seconds that *func* took in *repeat*
+  calls.
+  '''
+
+  best = None
+  for __ in range(repeat):
+    start = _clock()
+    func()
+    elapsed = _clock() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def make_queue(pvrq2, count, jobs_per_folder=100):
+  '''
+  Returns a #nr.pvrq2.Root with *count* nodes: folders that contain
+  *jobs_per_folder* file render jobs each.
+  '''
+
+  root = pvrq2.Root()
+  folder = None
+  for index in range(count):
+    if folder is None or index % (jobs_per_folder + 1) == 0:
+      folder = pvrq2.Folder('folder{0}'.format(index))
+      root.append(folder)
+    else:
+      folder.append(pvrq2.FileRenderJob('/scenes/shot{0}/scene{0}.c4d'.format(index)))
+  return root
+
+
+def dump_v1(pvrq2, root):
+  '''
+  Writes the nodes of *root* in the format of v2.3 (one chunk per node
+  with its identifier, disklevel and UUIDs as strings) and returns the
+  data for #nr.pvrq2.load_nodes().
+  '''
+
+  mfs = c4dstub.MemoryFileStruct()
+  hf = c4dstub.HyperFile()
+  hf.Open(pvrq2.HYPERFILE_IDENT, mfs, None, None)
+  for node in root.iter_preorder():
+    parent = node.parent
+    hf.WriteChunkStart(0, 0)
+    hf.WriteString(node.ident)
+    hf.WriteInt32(0)
+    hf.WriteString(str(node.uuid))
+    hf.WriteString('' if parent is root else str(parent.uuid))
+    # The data of v2.3 (data version 0).
+    hf.WriteBool(node.enabled)
+    if isinstance(node, pvrq2.Folder):
+      hf.WriteString(node.name)
+      hf.WriteBool(node.open)
+    else:
+      hf.WriteBool(node.render_tr)
+      hf.WriteString(node.status)
+      hf.WriteString(node.error_message or '')
+      hf.WriteFilename(node.filename)
+    hf.WriteChunkEnd()
+  hf.Close()
+  return mfs.data
+
+
+# The sizes of the fixed-size values, see #hyperfile_size().
+_VALUE_SIZES = {'Bool': 1, 'Int16': 2, 'Int32': 4, 'Int64': 8, 'Float': 8,
+  'Float32': 4, 'Float64': 8, 'ChunkStart': 8, 'ChunkEnd': 0}
+
+
+def value_size(kind, value):
+  '''
+  Returns the estimated size of a value in a HyperFile, see
+  #hyperfile_size().
+  '''
+
+  if kind in _VALUE_SIZES:
+    return 1 + _VALUE_SIZES[kind]
+  elif kind == 'Memory':
+    return 1 + 4 + 8 + hyperfile_size(value)
+  return 1 + 4 + len(value.encode('utf8'))
+
+
+def hyperfile_size(data):
+  '''
+  Returns an estimate of the size in bytes that the values in *data* (as
+  written by #c4dstub.HyperFile) take in a real HyperFile: a tag byte per
+  value, the size of fixed-size values and strings, filenames and memory
+  blocks with a 32 bit length. The HyperFiles in memory blocks are
+  estimated as well, with a header of 8 bytes.
+  '''
+
+  return sum(value_size(kind, value) for kind, value in pickle.loads(data))
+
+
+def print_table(header, rows):
+  '''
+  Prints *rows* (lists of strings) as a table with the column titles in
+  *header*.
+  '''
+
+  widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+  for row in [header] + rows:
+    print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def ms(seconds):
+  if seconds is None:
+    return '-'
+  return '{0:.1f}ms'.format(seconds * 1000.0)
@@ -0,0 +1,82 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compares the container of v2.3 (one chunk per node with the identifier
+and the UUIDs of the node and its parent as strings, see
+#bench_common.dump_v1()) with the current container of
+#nr.pvrq2.write_nodes() in size, write and read time. The sizes are
+estimated with #bench_common.hyperfile_size(). "framing" is the part of
+the size that is not the data of the nodes (which is larger in v2.4, it
+has the timings of the jobs and a header for the lazy payloads): the
+identifiers, UUIDs, parent references or child counts and the chunks.
+
+    python tests/bench_container.py [sizes...]
+"""
+
+from __future__ import print_function
+
+import pickle
+
+import c4dstub
+from bench_common import (best_of, dump_v1, get_sizes, hyperfile_size,
+  make_queue, ms, print_table, value_size)
+
+
+def data_size(data):
+  # Returns the estimated size of the node data in *data*: the values
+  # after the identifier, disklevel and UUIDs in the chunk of a node
+  # (v2.3) or the content of the chunks with the ID 3 (v2.4).
+  values = pickle.loads(data)
+  v2 = values[0] == ('ChunkStart', {'id': 2, 'level': 0})
+  size = 0
+  depth = 0
+  position = 0
+  for kind, value in values:
+    if kind == 'ChunkStart':
+      depth += 1
+      position = 0
+    elif kind == 'ChunkEnd':
+      depth -= 1
+    elif v2 and depth == 2:
+      # The length of a memory block is part of the framing.
+      size += hyperfile_size(value) if kind == 'Memory' else value_size(kind, value)
+    elif not v2 and depth == 1:
+      if position >= 4:
+        size += value_size(kind, value)
+      position += 1
+  return size
+
+
+def main():
+  pvrq2 = c4dstub.install()
+  rows = []
+  for size in get_sizes([10000, 100000]):
+    root = make_queue(pvrq2, size)
+    v1 = dump_v1(pvrq2, root)
+    v2 = pvrq2.dump_nodes(root)
+    for name, data, dump in (('v2.3', v1, lambda: dump_v1(pvrq2, root)),
+        ('v2.4', v2, lambda: pvrq2.dump_nodes(root))):
+      total = hyperfile_size(data)
+      rows.append([name, str(size), str(total // size),
+        str((total - data_size(data)) // size), ms(best_of(dump)),
+        ms(best_of(lambda: pvrq2.load_nodes(data)))])
+  c4dstub.uninstall()
+  print_table(['format', 'nodes', 'bytes/node', 'framing/node', 'write',
+    'read'], rows)
+
+
+if __name__ == '__main__':
+  main()
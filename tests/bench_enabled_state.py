@@ -0,0 +1,101 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compares the cached #nr.pvrq2.BaseNode.enabled_state with the walk over
+the parents that v2.3 did on every access, on a deep tree (a chain of
+folders) and a wide tree (folders with many jobs). A "redraw" reads the
+state of every node, "toggle" disables and enables the top-level folder
+and reads the states again, which invalidates the whole cache.
+
+    python tests/bench_enabled_state.py [size]
+"""
+
+from __future__ import print_function
+
+import c4dstub
+from bench_common import best_of, get_sizes, ms, print_table
+
+
+def walk_enabled_state(node):
+  # The implementation of v2.3.
+  if not node.enabled:
+    return 'disabled'
+  parent = node.parent
+  while parent:
+    if not parent.enabled:
+      return 'tristate'
+    parent = parent.parent
+  return 'enabled'
+
+
+def make_deep(pvrq2, size):
+  root = pvrq2.Root()
+  node = root
+  for index in range(size):
+    child = pvrq2.Folder('folder{0}'.format(index))
+    node.append(child)
+    node = child
+  return root
+
+
+def make_wide(pvrq2, size):
+  root = pvrq2.Root()
+  for index in range(size // 1000 or 1):
+    folder = pvrq2.Folder('folder{0}'.format(index))
+    root.append(folder)
+    for job in range(999):
+      folder.append(pvrq2.FileRenderJob('scene{0}.c4d'.format(job)))
+  return root
+
+
+def main():
+  pvrq2 = c4dstub.install()
+  rows = []
+  for size in get_sizes([2000, 100000]):
+    for shape, make in (('deep', make_deep), ('wide', make_wide)):
+      if shape == 'deep' and size > 5000:
+        continue  # building the chain is quadratic
+      root = make(pvrq2, size)
+      nodes = list(root.iter_preorder())
+      top = root.get_child(0)
+      assert [walk_enabled_state(x) for x in nodes] == [x.enabled_state for x in nodes]
+
+      def walk_redraw():
+        for node in nodes:
+          walk_enabled_state(node)
+
+      def cached_redraw():
+        for node in nodes:
+          node.enabled_state
+
+      def toggle(redraw):
+        def run():
+          top.enabled = False
+          redraw()
+          top.enabled = True
+          redraw()
+        return run
+
+      rows.append([shape, str(len(nodes)), ms(best_of(walk_redraw)),
+        ms(best_of(cached_redraw)), ms(best_of(toggle(walk_redraw))),
+        ms(best_of(toggle(cached_redraw)))])
+  c4dstub.uninstall()
+  print_table(['tree', 'nodes', 'walk redraw', 'cached redraw', 'walk toggle',
+    'cached toggle'], rows)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,58 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Loads a queue of file render jobs with #nr.pvrq2.load_nodes(), once with
+the lazy payloads of #nr.pvrq2.FileRenderJob and once with the payloads
+decoded up front (#nr.pvrq2.BaseNode.lazy_payload set to False), which is
+what v2.3 did. "decode all" is the lazy load followed by the first access
+to the payload of every job.
+
+    python tests/bench_lazy_load.py [sizes...]
+"""
+
+from __future__ import print_function
+
+import c4dstub
+from bench_common import best_of, get_sizes, make_queue, ms, print_table
+
+
+def main():
+  pvrq2 = c4dstub.install()
+  rows = []
+  for size in get_sizes([10000, 100000]):
+    data = pvrq2.dump_nodes(make_queue(pvrq2, size))
+    load = lambda: pvrq2.load_nodes(data)
+
+    def load_and_decode():
+      for node in load():
+        for job in node.iter_children():
+          job.skip_existing
+
+    lazy_time = best_of(load)
+    decode_time = best_of(load_and_decode)
+    pvrq2.FileRenderJob.lazy_payload = False
+    try:
+      eager_time = best_of(load)
+    finally:
+      pvrq2.FileRenderJob.lazy_payload = True
+    rows.append([str(size), ms(eager_time), ms(lazy_time), ms(decode_time),
+      '{0:.1f}x'.format(eager_time / lazy_time)])
+  c4dstub.uninstall()
+  print_table(['nodes', 'eager', 'lazy', 'decode all', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+  main()
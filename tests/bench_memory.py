@@ -0,0 +1,168 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Reports the memory per node of a queue of file render jobs in folders,
+measured with #tracemalloc (Python 3), for three layouts:
+
+* v2.3: plain objects with the attributes that v2.3 kept in their
+  `__dict__` (five links, `enabled`, `selected`, a #uuid.UUID and the
+  job attributes)
+* dict: the attributes of the current nodes (including the child index
+  links, the cached states and the timings of a job) in a `__dict__`
+  with a #uuid.UUID, ie. the current nodes without `__slots__`
+* slots: the current #nr.pvrq2 nodes
+
+The filenames are created up front and not counted.
+
+    python tests/bench_memory.py [sizes...]
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import uuid
+
+import c4dstub
+from bench_common import get_sizes, print_table
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+
+class V23Node(object):
+  # A node as it was laid out in v2.3.
+
+  def __init__(self, parent):
+    self._TreeNodeBase__parent = parent
+    self._TreeNodeBase__next = None
+    self._TreeNodeBase__pred = None
+    self._TreeNodeBase__down = None
+    self._TreeNodeBase__down_last = None
+    self.enabled = True
+    self.selected = False
+    self.uuid = uuid.uuid4()
+    if parent is not None:
+      pred = parent._TreeNodeBase__down_last
+      if pred is None:
+        parent._TreeNodeBase__down = self
+      else:
+        pred._TreeNodeBase__next = self
+        self._TreeNodeBase__pred = pred
+      parent._TreeNodeBase__down_last = self
+
+
+class V23Folder(V23Node):
+
+  def __init__(self, parent, name):
+    super(V23Folder, self).__init__(parent)
+    self.name = name
+    self.open = True
+
+
+class V23FileRenderJob(V23Node):
+
+  def __init__(self, parent, filename):
+    super(V23FileRenderJob, self).__init__(parent)
+    self.render_tr = False
+    self.status = 'pending'
+    self.error_message = None
+    self.filename = filename
+
+
+class DictFolder(V23Folder):
+
+  def __init__(self, parent, name):
+    super(DictFolder, self).__init__(parent, name)
+    self._TreeNodeBase__index = None
+    self._TreeNodeBase__entry = None
+    self._enabled_state = None
+    self._status_counts = None
+    self._payload = None
+
+
+class DictFileRenderJob(V23FileRenderJob):
+
+  def __init__(self, parent, filename):
+    super(DictFileRenderJob, self).__init__(parent, filename)
+    self._TreeNodeBase__index = None
+    self._TreeNodeBase__entry = None
+    self._enabled_state = None
+    self._status_counts = None
+    self._payload = None
+    self._timings = [time.time(), None, None, None, None]
+    self._skip_existing = False
+
+
+def build_emulated(folder_class, job_class):
+  def build(pvrq2, filenames):
+    root = V23Node(None)
+    folder = None
+    for index, filename in enumerate(filenames):
+      if index % 100 == 0:
+        folder = folder_class(root, 'folder')
+      job_class(folder, filename)
+    return root
+  return build
+
+
+def build_current(pvrq2, filenames):
+  root = pvrq2.Root()
+  folder = None
+  for index, filename in enumerate(filenames):
+    if index % 100 == 0:
+      folder = pvrq2.Folder('folder')
+      root.append(folder)
+    folder.append(pvrq2.FileRenderJob(filename))
+  return root
+
+
+def measure(build, pvrq2, filenames):
+  # Returns the bytes that were allocated for the queue.
+  tracemalloc.start()
+  try:
+    before = tracemalloc.get_traced_memory()[0]
+    root = build(pvrq2, filenames)
+    after = tracemalloc.get_traced_memory()[0]
+  finally:
+    tracemalloc.stop()
+  del root
+  return after - before
+
+
+def main():
+  if tracemalloc is None:
+    print('tracemalloc is not available, use Python 3')
+    sys.exit(1)
+  pvrq2 = c4dstub.install()
+  rows = []
+  for size in get_sizes([10000, 100000]):
+    filenames = ['/scenes/shot{0}/scene.c4d'.format(x) for x in range(size)]
+    nodes = size + (size + 99) // 100
+    old = measure(build_emulated(V23Folder, V23FileRenderJob), pvrq2, filenames)
+    unslotted = measure(build_emulated(DictFolder, DictFileRenderJob), pvrq2, filenames)
+    slotted = measure(build_current, pvrq2, filenames)
+    rows.append([str(nodes), str(old // nodes), str(unslotted // nodes),
+      str(slotted // nodes),
+      '{0:.0f}%'.format(100.0 * (unslotted - slotted) / unslotted)])
+  c4dstub.uninstall()
+  print_table(['nodes', 'v2.3', 'dict', 'slots', 'saved by slots'], rows)
+
+
+if __name__ == '__main__':
+  main()
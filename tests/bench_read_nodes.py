@@ -0,0 +1,95 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Loads synthetic caches in the format of v2.3 (one chunk per node with the
+UUID of its parent) with #nr.pvrq2.load_nodes(), once with the hashed
+#nr.pvrq2.ordereddict.OrderedDict and once with the linear lookups that
+it had before. The linear variant is quadratic and only run up to
+`--max-linear` nodes (10000 by default).
+
+    python tests/bench_read_nodes.py [--max-linear N] [sizes...]
+"""
+
+from __future__ import print_function
+
+import sys
+
+import c4dstub
+from bench_common import best_of, dump_v1, make_queue, ms, print_table
+
+
+class LinearOrderedDict(object):
+  # The ordered dictionary of v2.3 that scans its items for every key.
+
+  def __init__(self):
+    self._items = []
+
+  def __getitem__(self, needle):
+    for key, value in self._items:
+      if key == needle:
+        return value
+    raise KeyError(needle)
+
+  def __setitem__(self, needle, value):
+    for index, (key, __) in enumerate(self._items):
+      if key == needle:
+        self._items[index] = (needle, value)
+        return
+    self._items.append((needle, value))
+
+  def get(self, needle, default=None):
+    try:
+      return self[needle]
+    except KeyError:
+      return default
+
+  def itervalues(self):
+    for __, value in self._items:
+      yield value
+
+
+def main():
+  max_linear = 10000
+  if '--max-linear' in sys.argv:
+    index = sys.argv.index('--max-linear')
+    max_linear = int(sys.argv[index + 1])
+    del sys.argv[index:index + 2]
+  sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+
+  pvrq2 = c4dstub.install()
+  hashed = pvrq2.OrderedDict
+  rows = []
+  for size in sizes:
+    data = dump_v1(pvrq2, make_queue(pvrq2, size))
+    load = lambda: pvrq2.load_nodes(data)
+    nodes = load()
+    assert sum(1 + x.get_child_count() for x in nodes) == size
+    linear_time = None
+    if size <= max_linear:
+      pvrq2.OrderedDict = LinearOrderedDict
+      try:
+        linear_time = best_of(load, 1)
+      finally:
+        pvrq2.OrderedDict = hashed
+    hashed_time = best_of(load)
+    speedup = '{0:.1f}x'.format(linear_time / hashed_time) if linear_time else '-'
+    rows.append([str(size), ms(linear_time), ms(hashed_time), speedup])
+  c4dstub.uninstall()
+  print_table(['nodes', 'linear', 'hashed', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+  main()
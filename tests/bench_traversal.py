@@ -0,0 +1,96 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compares the traversals of #nr.pvrq2.node.TreeNodeBase that follow the
+links between the nodes with the recursive generators of v2.3, on a deep
+tree (a chain of folders) and a wide tree (folders with many jobs). The
+recursive generators fail with a #RuntimeError on trees that are deeper
+than the recursion limit.
+
+    python tests/bench_traversal.py [--deep N...] [--wide N...]
+"""
+
+from __future__ import print_function
+
+import sys
+
+import c4dstub
+from bench_common import best_of, ms, print_table
+from bench_enabled_state import make_deep, make_wide
+
+
+def recursive_preorder(node):
+  # BaseNode.iter_tree() of v2.3.
+  for child in node.iter_children():
+    yield child
+    for sub in recursive_preorder(child):
+      yield sub
+
+
+def recursive_postorder(node):
+  # TreeNodeBase.iter_children(recursive=True) of v2.3.
+  child = node.get_down()
+  while child:
+    next = child.get_next()
+    for sub in recursive_postorder(child):
+      yield sub
+    yield child
+    child = next
+
+
+def count(iterator):
+  return sum(1 for __ in iterator)
+
+
+def run(func):
+  try:
+    return ms(best_of(func))
+  except RuntimeError:  # RecursionError is a subclass
+    return 'recursion'
+
+
+def get_args():
+  sizes = {'deep': [500, 5000], 'wide': [100000]}
+  shape = None
+  for arg in sys.argv[1:]:
+    if arg.startswith('--'):
+      shape = arg[2:]
+      sizes[shape] = []
+    else:
+      sizes[shape].append(int(arg))
+  return sizes
+
+
+def main():
+  sizes = get_args()
+  pvrq2 = c4dstub.install()
+  rows = []
+  for shape, make in (('deep', make_deep), ('wide', make_wide)):
+    for size in sizes[shape]:
+      root = make(pvrq2, size)
+      nodes = count(root.iter_preorder())
+      rows.append([shape, str(nodes),
+        run(lambda: count(recursive_preorder(root))),
+        run(lambda: count(root.iter_preorder())),
+        run(lambda: count(recursive_postorder(root))),
+        run(lambda: count(root.iter_postorder()))])
+  c4dstub.uninstall()
+  print_table(['tree', 'nodes', 'recursive pre', 'pre-order',
+    'recursive post', 'post-order'], rows)
+
+
+if __name__ == '__main__':
+  main()
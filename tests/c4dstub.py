@@ -0,0 +1,158 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+A stub of the `c4d` module that provides what is needed to use #nr.pvrq2
+without Cinema 4D, with a #HyperFile that saves into memory. Used by the
+tests and the benchmarks in this directory.
+"""
+
+import os
+import pickle
+import sys
+import types
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE_DIR = os.path.join(ROOT_DIR, 'devel', 'nr.pvrq2')
+
+_saved_modules = None
+_saved_path = None
+
+
+class MemoryFileStruct(object):
+
+  def __init__(self):
+    self.data = b''
+
+  def SetMemoryWriteMode(self):
+    self.data = b''
+
+  def SetMemoryReadMode(self, data, size):
+    self.data = bytes(data[:size])
+
+  def GetData(self):
+    return self.data, len(self.data)
+
+
+class HyperFile(object):
+  '''
+  Saves typed values into a #MemoryFileStruct. Reading a value of the
+  wrong type fails like it does in Cinema 4D.
+  '''
+
+  def Open(self, ident, mfs, mode, dialog):
+    self.mfs = mfs
+    self.writing = not mfs.data
+    self.values = [] if self.writing else pickle.loads(mfs.data)
+    self.pos = 0
+    return True
+
+  def Close(self):
+    if self.writing:
+      self.mfs.data = pickle.dumps(self.values)
+
+  def WriteChunkStart(self, chunk_id, level):
+    self.values.append(('ChunkStart', {'id': chunk_id, 'level': level}))
+    return True
+
+  def WriteChunkEnd(self):
+    self.values.append(('ChunkEnd', None))
+    return True
+
+  def ReadValueHeader(self):
+    if self.pos < len(self.values) and self.values[self.pos][0] == 'ChunkStart':
+      return sys.modules['c4d'].HYPERFILEVALUE_START
+    return sys.modules['c4d'].HYPERFILEVALUE_NONE
+
+  def SkipToEndChunk(self):
+    depth = 0
+    while self.pos < len(self.values):
+      kind = self.values[self.pos][0]
+      self.pos += 1
+      if kind == 'ChunkStart':
+        depth += 1
+      elif kind == 'ChunkEnd':
+        if depth == 0:
+          return True
+        depth -= 1
+    return False
+
+  def __getattr__(self, name):
+    if name.startswith('Write'):
+      kind = name[5:]
+      def write(value, *args):
+        self.values.append((kind, value))
+        return True
+      return write
+    elif name.startswith('Read'):
+      kind = name[4:]
+      def read():
+        if self.pos >= len(self.values) or self.values[self.pos][0] != kind:
+          return None
+        self.pos += 1
+        return self.values[self.pos - 1][1]
+      return read
+    raise AttributeError(name)
+
+
+def make_c4d():
+  # Unknown constants get unique values, everything else is a class.
+  constants = {}
+  class Stub(object):
+    def __init__(self, *args, **kwargs):
+      pass
+  def module(name):
+    result = types.ModuleType(name)
+    def __getattr__(attr):
+      if attr.startswith('__'):
+        raise AttributeError(attr)
+      if attr.isupper():
+        return constants.setdefault(attr, 900000 + len(constants))
+      return Stub
+    result.__getattr__ = __getattr__
+    return result
+  c4d = module('c4d')
+  modules = {'c4d': c4d}
+  for name in ('documents', 'gui', 'plugins', 'storage', 'bitmaps'):
+    modules['c4d.' + name] = module('c4d.' + name)
+    setattr(c4d, name, modules['c4d.' + name])
+  c4d.storage.HyperFile = HyperFile
+  c4d.storage.MemoryFileStruct = MemoryFileStruct
+  return modules
+
+
+def install():
+  '''
+  Replaces the `c4d` module with the stub and imports #nr.pvrq2 from the
+  source tree. Returns the #nr.pvrq2 module. #uninstall() restores the
+  modules.
+  '''
+
+  global _saved_modules, _saved_path
+  _saved_modules = dict(sys.modules)
+  _saved_path = list(sys.path)
+  for name in list(sys.modules):
+    if name == 'nr' or name.startswith('nr.'):
+      del sys.modules[name]
+  sys.modules.update(make_c4d())
+  sys.path.insert(0, MODULE_DIR)
+  import nr.pvrq2
+  return nr.pvrq2
+
+
+def uninstall():
+  sys.modules.clear()
+  sys.modules.update(_saved_modules)
+  sys.path[:] = _saved_path
@@ -0,0 +1,131 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for #nr.pvrq2.cmdline.CommandlinePool with a stand-in for the
+command line renderer. The stand-in is a Python script that succeeds,
+fails or hangs depending on the name of the scene it renders.
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+import c4dstub
+
+pvrq2 = None
+cmdline = None
+
+RENDERER = '''#!{executable}
+import sys, time
+scene = sys.argv[sys.argv.index('-render') + 1]
+print('rendering', scene)
+sys.stdout.flush()
+if 'fail' in scene:
+  print('scene could not be loaded')
+  sys.exit(3)
+elif 'hang' in scene:
+  time.sleep(60)
+'''
+
+
+def setUpModule():
+  global pvrq2, cmdline
+  pvrq2 = c4dstub.install()
+  from nr.pvrq2 import cmdline
+
+
+def tearDownModule():
+  c4dstub.uninstall()
+
+
+@unittest.skipIf(sys.platform.startswith('win'), 'the stand-in needs a shebang')
+class CommandlinePoolTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.executable = os.path.join(self.tempdir, 'Commandline')
+    with open(self.executable, 'w') as fp:
+      fp.write(RENDERER.format(executable=sys.executable))
+    os.chmod(self.executable, os.stat(self.executable).st_mode | stat.S_IXUSR)
+    self.pool = cmdline.CommandlinePool(self.executable, processes=2,
+      log_dir=os.path.join(self.tempdir, 'logs'))
+
+  def tearDown(self):
+    self.pool.shutdown(timeout=1.0)
+    shutil.rmtree(self.tempdir)
+
+  def wait(self, timeout=10.0):
+    # Polls the pool until all processes have finished.
+    deadline = time.time() + timeout
+    finished = []
+    while self.pool.processes and time.time() < deadline:
+      finished.extend(self.pool.poll())
+      time.sleep(0.02)
+    self.assertEqual(self.pool.processes, [])
+    return finished
+
+  def test_success_and_failure(self):
+    ok = pvrq2.FileRenderJob('ok.c4d')
+    fail = pvrq2.FileRenderJob('fail.c4d')
+    self.pool.start(ok)
+    self.pool.start(fail)
+    self.assertEqual(ok.status, pvrq2.STATUS_RENDERING)
+    self.assertFalse(self.pool.has_capacity())
+    self.assertRaises(ValueError, self.pool.start, pvrq2.FileRenderJob('x.c4d'))
+    self.assertEqual(set(self.wait()), set([ok, fail]))
+    self.assertEqual(ok.status, pvrq2.STATUS_COMPLETED)
+    self.assertEqual(fail.status, pvrq2.STATUS_FAILED)
+    self.assertIn('code 3', fail.error_message)
+    self.assertIn('scene could not be loaded', fail.error_message)
+
+  def test_cancel(self):
+    hang = pvrq2.FileRenderJob('hang.c4d')
+    ok = pvrq2.FileRenderJob('ok.c4d')
+    self.pool.start(hang)
+    self.pool.start(ok)
+    popen = self.pool.processes[0].popen
+    self.pool.cancel(hang)
+    self.assertEqual(hang.status, pvrq2.STATUS_CANCELLED)
+    self.wait()
+    self.assertIsNotNone(popen.poll())
+    self.assertEqual(hang.status, pvrq2.STATUS_CANCELLED)
+    self.assertEqual(ok.status, pvrq2.STATUS_COMPLETED)
+
+  def test_shutdown(self):
+    jobs = [pvrq2.FileRenderJob('hang{0}.c4d'.format(i)) for i in range(2)]
+    for job in jobs:
+      self.pool.start(job)
+    popens = [x.popen for x in self.pool.processes]
+    self.pool.shutdown(timeout=2.0)
+    self.assertEqual(self.pool.processes, [])
+    self.assertTrue(all(x.poll() is not None for x in popens))
+    self.assertEqual([x.status for x in jobs], [pvrq2.STATUS_CANCELLED] * 2)
+
+  def test_not_renderable(self):
+    job = pvrq2.FileRenderJob('ok.c4d')
+    job.render_tr = True
+    self.assertRaises(ValueError, self.pool.start, job)
+    self.assertEqual(self.pool.processes, [])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,159 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for #nr.pvrq2.farm with two #nr.pvrq2.farm.FarmStore instances on
+the same SQLite file, like two workers on different machines.
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import c4dstub
+
+pvrq2 = None
+farm = None
+
+
+def setUpModule():
+  global pvrq2, farm
+  pvrq2 = c4dstub.install()
+  from nr.pvrq2 import farm
+
+
+def tearDownModule():
+  c4dstub.uninstall()
+
+
+class FarmStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.tempdir, 'farm.sqlite')
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def make_stores(self, **kwargs):
+    return [farm.FarmStore(self.filename, **kwargs) for __ in range(2)]
+
+  def submit(self, store, count):
+    jobs = [pvrq2.FileRenderJob('scene{0}.c4d'.format(x)) for x in range(count)]
+    for job in jobs:
+      self.assertTrue(store.submit(job))
+    return jobs
+
+  def test_submit_once(self):
+    store_a, store_b = self.make_stores()
+    job = self.submit(store_a, 1)[0]
+    self.assertFalse(store_b.submit(job))
+    self.assertEqual(len(store_b.get_jobs()), 1)
+
+  def test_no_job_claimed_twice(self):
+    stores = self.make_stores()
+    jobs = self.submit(stores[0], 40)
+    claimed = [[], []]
+    def claim(index):
+      while True:
+        lease = stores[index].claim('worker{0}'.format(index))
+        if lease is None:
+          return
+        claimed[index].append(lease.uuid)
+    threads = [threading.Thread(target=claim, args=(x,)) for x in range(2)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    uuids = claimed[0] + claimed[1]
+    self.assertEqual(len(uuids), len(set(uuids)))
+    self.assertEqual(set(uuids), set(str(x.uuid) for x in jobs))
+    for row in stores[1].get_jobs():
+      self.assertEqual(row['status'], pvrq2.STATUS_RENDERING)
+      self.assertEqual(row['attempts'], 1)
+
+  def test_expired_lease_is_reclaimed(self):
+    store_a, store_b = self.make_stores(lease_duration=0.2)
+    job = self.submit(store_a, 1)[0]
+    lease_a = store_a.claim('a')
+    self.assertEqual(lease_a.uuid, str(job.uuid))
+    self.assertIsNone(store_b.claim('b'))
+    self.assertTrue(store_a.heartbeat(lease_a))
+
+    time.sleep(0.3)
+    lease_b = store_b.claim('b')
+    self.assertEqual(lease_b.id, lease_a.id)
+    self.assertEqual(lease_b.load_job().filename, job.filename)
+    # The first worker lost the job.
+    self.assertFalse(store_a.heartbeat(lease_a))
+    self.assertFalse(store_a.complete(lease_a))
+    self.assertTrue(store_b.complete(lease_b))
+    row = store_a.get_jobs()[0]
+    self.assertEqual((row['status'], row['worker'], row['attempts']),
+      (pvrq2.STATUS_COMPLETED, 'b', 2))
+
+  def test_max_attempts(self):
+    store_a, store_b = self.make_stores(lease_duration=0.1, max_attempts=1)
+    self.submit(store_a, 1)
+    self.assertIsNotNone(store_a.claim('a'))
+    time.sleep(0.2)
+    self.assertIsNone(store_b.claim('b'))
+    row = store_b.get_jobs()[0]
+    self.assertEqual((row['status'], row['error_message']),
+      (pvrq2.STATUS_FAILED, 'lease expired'))
+
+
+class WorkerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.store = farm.FarmStore(os.path.join(self.tempdir, 'farm.sqlite'))
+    self.job = pvrq2.FileRenderJob('missing.c4d')
+    self.store.submit(self.job)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def test_scene_not_loaded(self):
+    # The worker runs without the resource of the plugin.
+    self.assertIsNone(pvrq2.res)
+    sys.modules['c4d'].documents.LoadDocument = lambda filename, flags: None
+    try:
+      lease = farm.Worker(self.store, 'worker').process_one()
+    finally:
+      del sys.modules['c4d'].documents.LoadDocument
+    self.assertEqual(lease.uuid, str(self.job.uuid))
+    row = self.store.get_jobs()[0]
+    self.assertEqual(row['status'], pvrq2.STATUS_FAILED)
+    self.assertIn("RuntimeError: File 'missing.c4d' could not be loaded.",
+      row['error_message'])
+    self.assertIsNone(farm.Worker(self.store, 'worker').process_one())
+
+  def test_render_function(self):
+    rendered = []
+    worker = farm.Worker(self.store, 'worker', rendered.append)
+    worker.process_one()
+    self.assertEqual([x.filename for x in rendered], ['missing.c4d'])
+    self.assertEqual(self.store.get_jobs()[0]['status'], pvrq2.STATUS_COMPLETED)
+
+
+if __name__ == '__main__':
+  unittest.main()
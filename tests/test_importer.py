@@ -0,0 +1,113 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for #nr.pvrq2.importer.FolderImporter on a temporary directory
+tree.
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import c4dstub
+
+importer = None
+
+
+def setUpModule():
+  global importer
+  c4dstub.install()
+  from nr.pvrq2 import importer
+
+
+def tearDownModule():
+  c4dstub.uninstall()
+
+
+class FolderImporterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def write(self, name, data):
+    filename = os.path.join(self.tempdir, name)
+    if not os.path.isdir(os.path.dirname(filename)):
+      os.makedirs(os.path.dirname(filename))
+    with open(filename, 'wb') as fp:
+      fp.write(data)
+    return filename
+
+  def run_import(self, folder):
+    scenes = []
+    deadline = time.time() + 10
+    while not folder.done:
+      self.assertLess(time.time(), deadline, 'import did not finish')
+      scenes.extend(folder.poll())
+      time.sleep(0.01)
+    return scenes
+
+  def test_iter_scene_files(self):
+    magic = importer.SCENE_MAGIC
+    files = [self.write(x, magic) for x in ('b.C4D', 'a/z.c4d', 'a/b/y.c4d',
+      'c/x.c4d')]
+    self.write('a/notes.txt', b'')
+    # A symbolic link to a parent directory is not followed again.
+    if hasattr(os, 'symlink'):
+      os.symlink(self.tempdir, os.path.join(self.tempdir, 'a', 'loop'))
+    self.assertEqual(list(importer.iter_scene_files(self.tempdir)), files)
+    errors = []
+    missing = os.path.join(self.tempdir, 'missing')
+    self.assertEqual(list(importer.iter_scene_files(missing,
+      error_callback=lambda *args: errors.append(args))), [])
+    self.assertEqual([x[0] for x in errors], [missing])
+
+  def test_order_and_errors(self):
+    magic = importer.SCENE_MAGIC
+    files = [self.write('b.c4d', magic), self.write('a.c4d', magic),
+      self.write('sub/c.c4d', magic)]
+    invalid = self.write('d.c4d', b'nothing')
+    self.write('e.txt', magic)
+    folder = importer.FolderImporter(self.tempdir, workers=2)
+    folder.start()
+    self.assertEqual(self.run_import(folder), [files[1], files[0], files[2]])
+    self.assertEqual([x[0] for x in folder.errors], [invalid])
+    self.assertIsNone(folder.error)
+
+  def test_walk_failure(self):
+    magic = importer.SCENE_MAGIC
+    files = [self.write('a.c4d', magic), self.write('b.c4d', magic)]
+
+    def iter_scene_files(directory, extensions, error_callback):
+      for filename in files:
+        yield filename
+      raise RuntimeError('walk failed')
+
+    original = importer.iter_scene_files
+    importer.iter_scene_files = iter_scene_files
+    try:
+      folder = importer.FolderImporter(self.tempdir, workers=2)
+      folder.start()
+      self.assertEqual(self.run_import(folder), files)
+    finally:
+      importer.iter_scene_files = original
+    self.assertIn('RuntimeError: walk failed', folder.error)
@@ -0,0 +1,1066 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the node classes of #nr.pvrq2 that run without Cinema 4D. The
+`c4d` module is replaced by the stub in #c4dstub.
+
+    python -m unittest discover tests
+"""
+
+import contextlib
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+from bench_common import dump_v1, make_queue
+from c4dstub import MemoryFileStruct, HyperFile
+import c4dstub
+
+pvrq2 = None
+
+
+def setUpModule():
+  global pvrq2
+  pvrq2 = c4dstub.install()
+
+
+def tearDownModule():
+  c4dstub.uninstall()
+
+
+@contextlib.contextmanager
+def quiet():
+  # Hides the tracebacks that are printed for the expected errors.
+  stderr = sys.stderr
+  sys.stderr = open(os.devnull, 'w')
+  try:
+    yield
+  finally:
+    sys.stderr.close()
+    sys.stderr = stderr
+
+
+class EnabledStateTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = pvrq2.Root()
+    self.folder = pvrq2.Folder('folder')
+    self.root.append(self.folder)
+    self.jobs = [pvrq2.FileRenderJob('a.c4d'), pvrq2.FileRenderJob('b.c4d')]
+    for job in self.jobs:
+      self.folder.append(job)
+
+  def states(self):
+    return [job.enabled_state for job in self.jobs]
+
+  def test_disable_folder(self):
+    # The states are cached before the folder is disabled.
+    self.assertEqual(self.states(), ['enabled', 'enabled'])
+    self.folder.enabled = False
+    self.assertEqual(self.folder.enabled_state, 'disabled')
+    self.assertEqual(self.states(), ['tristate', 'tristate'])
+    self.folder.enabled = True
+    self.assertEqual(self.states(), ['enabled', 'enabled'])
+
+  def test_disable_job(self):
+    self.assertEqual(self.states(), ['enabled', 'enabled'])
+    self.jobs[0].enabled = False
+    self.assertEqual(self.states(), ['disabled', 'enabled'])
+
+  def test_move_into_disabled_folder(self):
+    disabled = pvrq2.Folder('disabled')
+    disabled.enabled = False
+    self.root.append(disabled)
+    self.assertEqual(self.states(), ['enabled', 'enabled'])
+    self.jobs[0].remove()
+    disabled.append(self.jobs[0])
+    self.assertEqual(self.states(), ['tristate', 'enabled'])
+
+  def test_random_changes(self):
+    # The cached states always match the states of the parents.
+    def walk(node):
+      if not node.enabled:
+        return 'disabled'
+      while node.parent is not None:
+        node = node.parent
+        if not node.enabled:
+          return 'tristate'
+      return 'enabled'
+    rng = random.Random(4)
+    nodes = [pvrq2.Folder(str(x)) for x in range(30)]
+    nodes += [pvrq2.FileRenderJob(str(x)) for x in range(60)]
+    for node in nodes:
+      self.root.append(node)
+    for __ in range(500):
+      node = rng.choice(nodes)
+      if rng.random() < 0.5:
+        node.enabled = not node.enabled
+      else:
+        parent = rng.choice([self.root] + nodes[:30])
+        ancestor = parent
+        while ancestor is not None and ancestor is not node:
+          ancestor = ancestor.parent
+        if ancestor is None:
+          node.remove()
+          parent.append(node)
+      for other in nodes:
+        self.assertEqual(other.enabled_state, walk(other))
+
+
+class StatusCountsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = pvrq2.Root()
+    self.folders = [pvrq2.Folder(str(x)) for x in range(4)]
+    self.jobs = [pvrq2.FileRenderJob('{0}.c4d'.format(x)) for x in range(20)]
+    for index, folder in enumerate(self.folders):
+      (self.folders[index - 1] if index % 2 else self.root).append(folder)
+    for index, job in enumerate(self.jobs):
+      self.folders[index % 4].append(job)
+
+  def count(self, node):
+    counts = {}
+    for job in node.iter_preorder(include_self=True):
+      if isinstance(job, pvrq2.RenderJob):
+        counts[job.status] = counts.get(job.status, 0) + 1
+    return counts
+
+  def check(self, root):
+    for node in [root] + list(root.iter_preorder()):
+      self.assertEqual(node.get_status_counts(), self.count(node))
+
+  def test_random_changes(self):
+    rng = random.Random(5)
+    self.check(self.root)
+    for __ in range(300):
+      choice = rng.random()
+      if choice < 0.6:
+        rng.choice(self.jobs).status = rng.choice(pvrq2.STATUS_ALL)
+      else:
+        node = rng.choice(self.jobs + self.folders[1::2])
+        parent = rng.choice([self.root] + self.folders)
+        if node is not parent and parent.parent is not node:
+          node.remove()
+          parent.append(node)
+      self.check(self.root)
+    loaded = pvrq2.Root()
+    for node in pvrq2.load_nodes(pvrq2.dump_nodes(self.root)):
+      loaded.append(node)
+    self.check(loaded)
+
+  def test_is_rendering(self):
+    job = self.jobs[5]
+    self.assertFalse(pvrq2.is_rendering(self.root))
+    job.status = pvrq2.STATUS_RENDERING
+    self.assertTrue(pvrq2.is_rendering(self.root))
+    self.assertTrue(pvrq2.is_rendering(self.folders[0]))
+    self.assertTrue(pvrq2.is_rendering(self.folders[1]))
+    self.assertFalse(pvrq2.is_rendering(self.folders[2]))
+    self.assertEqual(self.folders[1].get_status_count(pvrq2.STATUS_PENDING), 4)
+    job.remove()
+    self.assertFalse(pvrq2.is_rendering(self.root))
+    self.assertTrue(pvrq2.is_rendering(job))
+
+
+class StatusStringsTest(unittest.TestCase):
+
+  class Resource(object):
+    def __init__(self):
+      self.calls = []
+    def string(self, ident, *args):
+      self.calls.append(ident)
+      return ident.lower()
+
+  def setUp(self):
+    self.previous_res = pvrq2.res
+    self.res = pvrq2.res = self.Resource()
+    pvrq2.status_strings.clear()
+
+  def tearDown(self):
+    pvrq2.res = self.previous_res
+    pvrq2.status_strings.clear()
+
+  def test_loaded_once(self):
+    self.assertEqual(pvrq2.status_str(pvrq2.STATUS_FAILED), 'ids_status_failed')
+    self.assertEqual(len(self.res.calls), len(pvrq2.STATUS_ALL))
+    for status in pvrq2.STATUS_ALL * 2:
+      pvrq2.status_str(status)
+    self.assertEqual(pvrq2.status_str('unknown'), '-- invalid status --')
+    self.assertEqual(len(self.res.calls), len(pvrq2.STATUS_ALL))
+
+
+class SlotsTest(unittest.TestCase):
+
+  def test_builtin_nodes(self):
+    for node in [pvrq2.Folder('folder'), pvrq2.FileRenderJob('a.c4d')]:
+      self.assertFalse(hasattr(node, '__dict__'))
+      self.assertRaises(AttributeError, setattr, node, 'extra', 1)
+
+  def test_subclass_attributes(self):
+    # Subclasses of third-party plugins do not need to declare __slots__.
+    class CustomJob(pvrq2.FileRenderJob):
+      def __init__(self, filename=''):
+        super(CustomJob, self).__init__(filename)
+        self.priority = 1
+    job = CustomJob('a.c4d')
+    job.comment = 'test'
+    folder = pvrq2.Folder('folder')
+    folder.append(job)
+    self.assertEqual((job.priority, job.comment), (1, 'test'))
+    self.assertEqual(job.filename, 'a.c4d')
+    self.assertEqual(job.get_root(), folder)
+    self.assertEqual(job.uuid.int, job._uuid)
+
+
+class ChildIndexTest(unittest.TestCase):
+
+  def check(self, folder, expected):
+    self.assertEqual(folder.get_child_count(), len(expected))
+    self.assertEqual(folder.get_children(), expected)
+    for index, node in enumerate(expected):
+      self.assertIs(folder.get_child(index), node)
+      self.assertIs(folder.get_child(index - len(expected)), node)
+      self.assertEqual(node.get_index(), index)
+    self.assertRaises(IndexError, folder.get_child, len(expected))
+    self.assertRaises(IndexError, folder.get_child, -len(expected) - 1)
+
+  def test_random_changes(self):
+    # The folder grows past the threshold of the index and shrinks again.
+    rng = random.Random(7)
+    folder = pvrq2.Folder('folder')
+    expected = []
+    for step in range(400):
+      grow = step < 200
+      if expected and rng.random() < (0.3 if grow else 0.7):
+        node = expected.pop(rng.randrange(len(expected)))
+        node.remove()
+        self.assertIsNone(node.get_index())
+      else:
+        node = pvrq2.FileRenderJob(str(step))
+        choice = rng.random()
+        if not expected or choice < 0.4:
+          index = rng.randint(-len(expected), len(expected))
+          folder.append(node, index)
+          if index < 0:
+            index += len(expected)
+          expected.insert(index, node)
+        elif choice < 0.7:
+          index = rng.randrange(len(expected))
+          node.insert_before(expected[index])
+          expected.insert(index, node)
+        else:
+          index = rng.randrange(len(expected))
+          node.insert_after(expected[index])
+          expected.insert(index + 1, node)
+      if step % 10 == 0:
+        self.check(folder, expected)
+      if step == 199:
+        self.assertIsNotNone(folder._TreeNodeBase__index)
+    self.check(folder, expected)
+
+  def test_unindexed_class(self):
+    # Nodes without indexed_children count their children.
+    class UnindexedFolder(pvrq2.Folder):
+      indexed_children = False
+    folder = UnindexedFolder('folder')
+    jobs = [pvrq2.FileRenderJob(str(x)) for x in range(40)]
+    for job in jobs:
+      folder.append(job, 0)
+    jobs.reverse()
+    jobs[10].remove()
+    del jobs[10]
+    self.check(folder, jobs)
+
+
+class SelectionTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = pvrq2.Root()
+    self.folders = [pvrq2.Folder(str(x)) for x in range(6)]
+    self.jobs = [pvrq2.FileRenderJob('{0}.c4d'.format(x)) for x in range(30)]
+    for index, folder in enumerate(self.folders):
+      (self.folders[index - 1] if index % 3 else self.root).append(folder)
+    for index, job in enumerate(self.jobs):
+      self.folders[index % 6].append(job)
+
+  def check(self):
+    # The selection of the root matches a scan of the whole tree.
+    for children in (True, False):
+      self.assertEqual(self.root.get_selected_nodes(children),
+        pvrq2.BaseNode.get_selected_nodes(self.root, children))
+
+  def test_random_changes(self):
+    rng = random.Random(8)
+    nodes = self.folders + self.jobs
+    for __ in range(300):
+      choice = rng.random()
+      node = rng.choice(nodes)
+      if choice < 0.5:
+        node.selected = not node.selected
+      elif choice < 0.8:
+        if node.parent is not None:
+          node.remove()
+        else:
+          self.root.append(node, rng.randint(0, self.root.get_child_count()))
+      elif node.get_root() is self.root:
+        pvrq2.move_nodes([node], rng.choice(['up', 'down', 'top', 'bottom']))
+      self.check()
+    self.root.set_selected(False, recursive=True)
+    self.assertEqual(self.root.get_selected_nodes(), [])
+    self.check()
+
+  def test_remove_selected_subtree(self):
+    folder = self.folders[1]
+    folder.set_selected(True, recursive=True)
+    self.jobs[0].selected = True
+    self.assertEqual(self.root.get_selected_nodes(children=False),
+      [folder, self.jobs[0]])
+    folder.remove()
+    self.assertEqual(self.root.get_selected_nodes(), [self.jobs[0]])
+    # The nodes keep their state and are selected again when inserted.
+    self.root.append(folder)
+    self.assertEqual(self.root.get_selected_nodes(children=False),
+      [self.jobs[0], folder])
+    self.assertEqual(len(self.root.get_selected_nodes()), 13)
+    self.check()
+
+
+class TraversalTest(unittest.TestCase):
+
+  def setUp(self):
+    # root -> a (a1, a2 -> (a21)), b, c -> (c1)
+    self.root = pvrq2.Root()
+    self.nodes = {}
+    for name, parent in [('a', None), ('a1', 'a'), ('a2', 'a'), ('a21', 'a2'),
+        ('b', None), ('c', None), ('c1', 'c')]:
+      self.nodes[name] = pvrq2.Folder(name)
+      self.nodes.get(parent, self.root).append(self.nodes[name])
+
+  def names(self, nodes):
+    return [x.name for x in nodes]
+
+  def test_orders(self):
+    self.assertEqual(self.names(self.root.iter_preorder()),
+      ['a', 'a1', 'a2', 'a21', 'b', 'c', 'c1'])
+    self.assertEqual(self.names(self.root.iter_postorder()),
+      ['a1', 'a21', 'a2', 'a', 'b', 'c1', 'c'])
+    a = self.nodes['a']
+    self.assertEqual(self.names(a.iter_preorder(include_self=True)),
+      ['a', 'a1', 'a2', 'a21'])
+    self.assertEqual(self.names(a.iter_postorder(include_self=True)),
+      ['a1', 'a21', 'a2', 'a'])
+    self.assertEqual(self.names(self.root.iter_preorder(
+      lambda x: len(x.name) == 1, lambda x: x is not a)), ['a', 'b', 'c'])
+
+  def test_remove_during_postorder(self):
+    for node in self.root.iter_postorder():
+      node.remove()
+    self.assertEqual(self.root.get_child_count(), 0)
+    self.assertTrue(all(x.is_dangling() for x in self.nodes.values()))
+
+  def test_deep_tree(self):
+    # Deeper than the recursion limit of Python.
+    depth = 2000
+    root = pvrq2.Root()
+    node = root
+    for index in range(depth):
+      child = pvrq2.Folder(str(index))
+      node.append(child)
+      node = child
+    node.append(pvrq2.FileRenderJob('a.c4d'))
+    loaded = pvrq2.load_nodes(pvrq2.dump_nodes(root))
+    self.assertEqual(len(loaded), 1)
+    self.assertEqual(sum(1 for __ in loaded[0].iter_preorder(include_self=True)),
+      depth + 1)
+    leaf = list(loaded[0].iter_postorder())[0]
+    self.assertEqual(leaf.filename, 'a.c4d')
+    self.assertEqual(len(leaf.get_path()), depth)
+
+
+class ListenerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = pvrq2.Root()
+    self.events = []
+    self.root.add_listener(lambda *args: self.events.append(args))
+
+  def test_events(self):
+    folder = pvrq2.Folder('folder')
+    job = pvrq2.FileRenderJob('a.c4d')
+    folder.append(job)
+    # Nodes outside of a root report nothing, a subtree is one insertion.
+    self.assertEqual(self.events, [])
+    self.root.append(folder)
+    job.enabled = False
+    job.enabled = False
+    job.status = pvrq2.STATUS_COMPLETED
+    job.remove()
+    self.root.append(job)
+    self.assertEqual(self.events, [('insert', folder), ('change', job, 'enabled'),
+      ('change', job, 'status'), ('remove', job, folder), ('insert', job)])
+    self.root.remove_listener(self.root.listeners[0])
+    job.enabled = True
+    self.assertEqual(len(self.events), 5)
+
+  def test_version(self):
+    # Every change of the queue bumps the version, setting an attribute to
+    # its current value or changing nodes outside of the queue does not.
+    job = pvrq2.FileRenderJob('a.c4d')
+    job.status = pvrq2.STATUS_FAILED
+    self.assertEqual(self.root.version, 0)
+    self.root.append(job)
+    versions = [self.root.version]
+    for value in (pvrq2.STATUS_FAILED, pvrq2.STATUS_PENDING, pvrq2.STATUS_PENDING):
+      job.status = value
+      versions.append(self.root.version)
+    job.selected = True
+    versions.append(self.root.version)
+    job.remove()
+    versions.append(self.root.version)
+    job.status = pvrq2.STATUS_COMPLETED
+    versions.append(self.root.version)
+    self.assertEqual(versions, [1, 1, 2, 2, 3, 4, 4])
+
+  def test_failing_listener(self):
+    # A listener that raises does not keep the event from the others.
+    def fail(*args):
+      raise ValueError('listener failed')
+    self.root.listeners.insert(0, fail)
+    folder = pvrq2.Folder('folder')
+    with quiet():
+      self.root.append(folder)
+    self.assertEqual(self.events, [('insert', folder)])
+    self.assertIs(folder.parent, self.root)
+
+
+class JournalTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def snapshot(self, root):
+    return [(x.name, None if x.parent is root else x.parent.name, x.enabled,
+      getattr(x, 'status', None)) for x in root.iter_preorder()]
+
+  def load(self, data):
+    root = pvrq2.Root()
+    for node in pvrq2.load_nodes(data):
+      root.append(node)
+    return root
+
+  def test_replay(self):
+    from nr.pvrq2 import journal
+    root = pvrq2.Root()
+    folder = pvrq2.Folder('folder')
+    root.append(folder)
+    jobs = [pvrq2.FileRenderJob('{0}.c4d'.format(x)) for x in range(3)]
+    for job in jobs:
+      folder.append(job)
+    data = pvrq2.dump_nodes(root)
+    recorder = journal.Journal(os.path.join(self.tempdir, 'queue.hf.journal'))
+    recorder.attach(root)
+    other = pvrq2.Folder('other')
+    root.append(other)
+    other.append(pvrq2.FileRenderJob('new.c4d'))
+    pvrq2.move_nodes([jobs[2]], 'top')
+    jobs[0].remove()
+    other.append(jobs[0])
+    jobs[1].remove()
+    jobs[2].enabled = False
+    jobs[0].status = pvrq2.STATUS_RENDERING
+    recorder.detach()
+    self.assertEqual(recorder.record_count, 9)
+
+    # A job that was rendering when the queue was closed is cancelled.
+    jobs[0].status = pvrq2.STATUS_CANCELLED
+    loaded = self.load(data)
+    self.assertEqual(recorder.replay(loaded), 9)
+    self.assertEqual(self.snapshot(loaded), self.snapshot(root))
+    self.assertEqual(recorder.replay(loaded), 9)
+    self.assertEqual(self.snapshot(loaded), self.snapshot(root))
+
+    # A record that was cut off by a crash is ignored.
+    with open(recorder.filename, 'a') as fp:
+      fp.write('{"op": "remove", "uu')
+    loaded = self.load(data)
+    self.assertEqual(recorder.replay(loaded), 9)
+    self.assertEqual(self.snapshot(loaded), self.snapshot(root))
+
+  def test_write_failure(self):
+    # The journal can not be created in a missing directory.
+    from nr.pvrq2 import storage
+    dirname = os.path.join(self.tempdir, 'missing')
+    store = storage.JournalStore(os.path.join(self.tempdir, 'queue.hf'),
+      os.path.join(dirname, 'queue.hf.journal'))
+    root = pvrq2.Root()
+    store.attach(root)
+    self.assertTrue(store.flush())
+    with quiet():
+      root.append(pvrq2.FileRenderJob('a.c4d'))
+    self.assertTrue(store.journal.failed)
+    self.assertEqual(store.journal.record_count, 0)
+    self.assertFalse(store.flush())
+    # Saving the snapshot clears the journal, which then records again.
+    os.mkdir(dirname)
+    store.journal.clear()
+    self.assertFalse(store.journal.failed)
+    root.append(pvrq2.FileRenderJob('b.c4d'))
+    self.assertEqual(store.journal.record_count, 1)
+    self.assertTrue(store.flush())
+    store.close()
+
+
+class SQLiteStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    from nr.pvrq2 import storage
+    self.tempdir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.tempdir, 'queue.sqlite')
+    self.store = storage.SQLiteStore(self.filename)
+    self.root = pvrq2.Root()
+
+  def tearDown(self):
+    self.store.close()
+    shutil.rmtree(self.tempdir)
+
+  def load(self):
+    from nr.pvrq2 import storage
+    store = storage.SQLiteStore(self.filename)
+    try:
+      root = pvrq2.Root()
+      store.load(root)
+    finally:
+      store.close()
+    return [(x.name, x.parent.name if x.parent is not root else None,
+      getattr(x, 'status', None)) for x in root.iter_preorder()]
+
+  def test_flush_changes(self):
+    self.store.attach(self.root)
+    folder = pvrq2.Folder('folder')
+    self.root.append(folder)
+    jobs = [pvrq2.FileRenderJob('{0}.c4d'.format(x)) for x in range(3)]
+    for job in jobs:
+      folder.append(job)
+    self.assertTrue(self.store.flush())
+    pvrq2.move_nodes([jobs[2]], 'top')
+    jobs[0].status = pvrq2.STATUS_COMPLETED
+    self.assertTrue(self.store.flush())
+    self.assertEqual(self.load(), [('folder', None, None),
+      ('2.c4d', 'folder', 'pending'), ('0.c4d', 'folder', 'completed'),
+      ('1.c4d', 'folder', 'pending')])
+
+  def test_save_and_query(self):
+    folder = pvrq2.Folder('folder')
+    self.root.append(folder)
+    jobs = [pvrq2.FileRenderJob('a.c4d'), pvrq2.ChunkRenderJob('b.c4d', 10, 20, 2)]
+    for job in jobs:
+      folder.append(job)
+    jobs[1].status = pvrq2.STATUS_FAILED
+    self.assertTrue(self.store.save(self.root))
+    self.assertEqual(self.store.query(status=pvrq2.STATUS_FAILED), [jobs[1].uuid])
+    self.assertEqual(self.store.query(ident=pvrq2.Folder.ident), [folder.uuid])
+    self.assertEqual(self.store.query(parent=folder.uuid), [x.uuid for x in jobs])
+    self.assertEqual(self.store.query(parent=None), [folder.uuid])
+    self.assertEqual(self.load(), [('folder', None, None),
+      ('a.c4d', 'folder', 'pending'), (jobs[1].name, 'folder', 'failed')])
+    # The data of the plugin is restored from its blob.
+    from nr.pvrq2 import storage
+    store = storage.SQLiteStore(self.filename)
+    root = pvrq2.Root()
+    store.load(root)
+    store.close()
+    chunk = root.get_child(0).get_child(1)
+    self.assertIsInstance(chunk, pvrq2.ChunkRenderJob)
+    self.assertEqual((chunk.frame_from, chunk.frame_to, chunk.frame_step), (10, 20, 2))
+    self.assertEqual(chunk.uuid, jobs[1].uuid)
+
+  def test_renumber(self):
+    # Inserting at the same position again and again runs out of room
+    # between the positions of the siblings.
+    self.store.attach(self.root)
+    jobs = [pvrq2.FileRenderJob('first.c4d'), pvrq2.FileRenderJob('last.c4d')]
+    for job in jobs:
+      self.root.append(job)
+    for index in range(80):
+      job = pvrq2.FileRenderJob('{0}.c4d'.format(index))
+      job.insert_after(jobs[0])
+      jobs.insert(1, job)
+    jobs[-2].remove()
+    del jobs[-2]
+    self.assertTrue(self.store.flush())
+    self.assertEqual([x[0] for x in self.load()], [x.name for x in jobs])
+
+  def test_node_without_position(self):
+    # The nodes were in the tree before the store was attached.
+    folder = pvrq2.Folder('folder')
+    self.root.append(folder)
+    job = pvrq2.FileRenderJob('a.c4d')
+    folder.append(job)
+    self.store.attach(self.root)
+    job.status = pvrq2.STATUS_FAILED
+    self.assertTrue(self.store.flush())
+    self.assertEqual(self.load(), [('folder', None, None),
+      ('a.c4d', 'folder', 'failed')])
+
+
+class SplitJobTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = pvrq2.Root()
+
+  def chunk_ranges(self, chunks):
+    return [(x.frame_from, x.frame_to, x.frame_step) for x in chunks]
+
+  def test_job_in_folder(self):
+    folder = pvrq2.Folder('folder')
+    self.root.append(folder)
+    before, job, after = [pvrq2.FileRenderJob(x) for x in ('a.c4d', 'b.c4d', 'c.c4d')]
+    for node in (before, job, after):
+      folder.append(node)
+    chunks = pvrq2.split_job(job, 4, (0, 9, 1))
+    self.assertEqual(self.chunk_ranges(chunks), [(0, 3, 1), (4, 7, 1), (8, 9, 1)])
+    # The chunks take the place of the job, no folder is nested.
+    self.assertEqual(list(folder.iter_children()), [before] + chunks + [after])
+    self.assertIsNone(job.parent)
+
+  def test_top_level_job(self):
+    job = pvrq2.FileRenderJob('a.c4d')
+    job.enabled = False
+    self.root.append(job)
+    chunks = pvrq2.split_job(job, 5, (1, 10, 2))
+    self.assertEqual(self.chunk_ranges(chunks), [(1, 9, 2)])
+    folder = chunks[0].parent
+    self.assertIsInstance(folder, pvrq2.Folder)
+    self.assertIs(folder.parent, self.root)
+    self.assertFalse(folder.enabled)
+
+  def test_empty_range(self):
+    folder = pvrq2.Folder('folder')
+    self.root.append(folder)
+    job = pvrq2.FileRenderJob('a.c4d')
+    folder.append(job)
+    self.assertRaises(ValueError, pvrq2.split_job, job, 10, (10, 5, 1))
+    self.assertRaises(ValueError, pvrq2.replace_with_chunks, job, [])
+    self.assertEqual(list(folder.iter_children()), [job])
+
+
+class SerializationTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    # A job of a third-party plugin that uses its own disklevel.
+    class ExtraRenderJob(pvrq2.FileRenderJob):
+      ident = 'tests.ExtraRenderJob'
+      disklevel = 1
+      extra = 0
+      def write(self, hf):
+        if not super(ExtraRenderJob, self).write(hf): return False
+        return hf.WriteInt32(self.extra)
+      def read(self, hf, disklevel):
+        if not super(ExtraRenderJob, self).read(hf, disklevel): return False
+        if disklevel >= 1:
+          self.extra = hf.ReadInt32()
+        return self.extra is not None
+    if ExtraRenderJob.ident not in pvrq2.job_plugins:
+      pvrq2.register_node_plugin(ExtraRenderJob)
+    cls.ExtraRenderJob = pvrq2.job_plugins[ExtraRenderJob.ident]
+
+  def snapshot(self, root):
+    parent_name = lambda x: None if x.parent is root else x.parent.name
+    return [(type(x).__name__, x.name, parent_name(x), x.enabled)
+      for x in root.iter_preorder()]
+
+  def load(self, data):
+    root = pvrq2.Root()
+    for node in pvrq2.load_nodes(data):
+      root.append(node)
+    return root
+
+  def test_v1_cache(self):
+    # Caches of v2.3 are relinked by the UUIDs of the parents in order.
+    root = make_queue(pvrq2, 120, jobs_per_folder=10)
+    root.get_child(3).enabled = False
+    self.assertEqual(self.snapshot(self.load(dump_v1(pvrq2, root))),
+      self.snapshot(root))
+
+  def test_nested_roundtrip(self):
+    # The child counts of the container restore nested and empty folders.
+    root = pvrq2.Root()
+    outer, inner, empty = [pvrq2.Folder(x) for x in ('outer', 'inner', 'empty')]
+    root.append(outer)
+    outer.append(pvrq2.FileRenderJob('a.c4d'))
+    outer.append(inner)
+    inner.append(pvrq2.FileRenderJob('b.c4d'))
+    outer.append(pvrq2.FileRenderJob('c.c4d'))
+    root.append(empty)
+    root.append(pvrq2.FileRenderJob('d.c4d'))
+    loaded = self.load(pvrq2.dump_nodes(root))
+    self.assertEqual(self.snapshot(loaded), self.snapshot(root))
+    self.assertEqual([x.uuid for x in loaded.iter_preorder()],
+      [x.uuid for x in root.iter_preorder()])
+
+  def test_invalid_container(self):
+    # The values of the container are replaced one at a time.
+    root = pvrq2.Root()
+    folder = pvrq2.Folder('folder')
+    root.append(folder)
+    folder.append(pvrq2.FileRenderJob('a.c4d'))
+    folder.append(pvrq2.FileRenderJob('b.c4d'))
+    values = pickle.loads(pvrq2.dump_nodes(root))
+    # The 32 bit integers outside of the nodes' chunks: the number of
+    # top-level nodes, then the table index, disklevel (for new table
+    # entries) and child count of every node.
+    depth = 0
+    positions = []
+    for position, (kind, value) in enumerate(values):
+      depth += {'ChunkStart': 1, 'ChunkEnd': -1}.get(kind, 0)
+      if depth == 1 and kind == 'Int32':
+        positions.append(position)
+    def load(index, value):
+      changed = list(values)
+      changed[positions[index]] = ('Int32', value)
+      return pvrq2.load_nodes(pickle.dumps(changed))
+    self.assertEqual(self.snapshot(self.load(pickle.dumps(values))),
+      self.snapshot(root))
+    self.assertIs(load(0, -1), False)   # top-level nodes
+    self.assertIs(load(3, -1), False)   # children of the folder
+    self.assertIs(load(7, -1), False)   # table index of the second job
+    self.assertIs(load(7, 2), False)
+
+  def roundtrip(self, job):
+    root = pvrq2.Root()
+    root.append(job)
+    nodes = pvrq2.load_nodes(pvrq2.dump_nodes(root))
+    self.assertEqual(len(nodes), 1)
+    return nodes[0]
+
+  def test_subclass_roundtrip(self):
+    job = self.ExtraRenderJob('a.c4d')
+    job.extra = 42
+    job.skip_existing = True
+    job = self.roundtrip(job)
+    self.assertEqual(job.filename, 'a.c4d')
+    self.assertTrue(job.skip_existing)
+    self.assertEqual(job.extra, 42)
+    self.assertEqual(job.status, pvrq2.STATUS_PENDING)
+
+  def test_legacy_subclass_data(self):
+    # The data as it was saved by v2.3.
+    mfs = MemoryFileStruct()
+    hf = HyperFile()
+    hf.Open(pvrq2.HYPERFILE_IDENT, mfs, None, None)
+    for kind, value in [('Bool', True), ('Bool', False), ('String', 'pending'),
+        ('String', ''), ('Filename', 'a.c4d'), ('Int32', 42)]:
+      getattr(hf, 'Write' + kind)(value)
+    hf.Close()
+    errors = []
+    from nr.pvrq2 import storage
+    job = storage.load_node_data(self.ExtraRenderJob.ident, 1, mfs.data,
+      lambda *args: errors.append(args))
+    self.assertEqual(errors, [])
+    self.assertEqual(job.filename, 'a.c4d')
+    self.assertFalse(job.skip_existing)
+    self.assertEqual(job.extra, 42)
+
+
+class LazyPayloadTest(unittest.TestCase):
+
+  def setUp(self):
+    root = pvrq2.Root()
+    folder = pvrq2.Folder('folder')
+    root.append(folder)
+    for index in range(20):
+      folder.append(pvrq2.FileRenderJob('scene{0}.c4d'.format(index % 4)))
+    self.root = pvrq2.Root()
+    for node in pvrq2.load_nodes(pvrq2.dump_nodes(root)):
+      self.root.append(node)
+    self.jobs = list(self.root.iter_tree(lambda x: isinstance(x, pvrq2.RenderJob)))
+
+  def decoded(self):
+    return sum(1 for job in self.jobs if job.payload_loaded)
+
+  def test_filename_in_header(self):
+    self.assertEqual(self.decoded(), 0)
+    self.assertEqual(self.jobs[1].filename, 'scene1.c4d')
+    self.assertEqual(self.decoded(), 0)
+    self.assertFalse(self.jobs[1].skip_existing)
+    self.assertEqual(self.decoded(), 1)
+
+  def test_estimator(self):
+    from nr.pvrq2 import eta
+    history = eta.History(os.devnull)
+    history.add(eta.get_job_path(self.jobs[0]), None, 10.0)
+    estimator = eta.Estimator(self.root, history)
+    self.assertEqual(estimator.get_remaining(), (200.0, 0))
+    self.jobs[0].enabled = False
+    self.jobs[1].remove()
+    self.assertEqual(estimator.get_remaining(), (180.0, 0))
+    self.assertEqual(self.decoded(), 0)
+
+  def hyperfile(self, values):
+    mfs = MemoryFileStruct()
+    hf = HyperFile()
+    hf.Open(pvrq2.HYPERFILE_IDENT, mfs, None, None)
+    for kind, value in values:
+      getattr(hf, 'Write' + kind)(value)
+    hf.Close()
+    return mfs.data
+
+  def test_old_data_version(self):
+    # A job saved with data version 2, which has no filename in the header.
+    from nr.pvrq2 import storage
+    header = self.hyperfile([('String', 'a.c4d'), ('Bool', True), ('Bool', False),
+      ('String', 'failed'), ('String', 'error')])
+    data = self.hyperfile([('Bool', True), ('Bool', False), ('String', 'failed'),
+      ('String', 'error')] + [('Float64', 0.0)] * 5 + [('Filename', '/a.c4d'),
+      ('Bool', True)])
+    errors = []
+    job = storage.load_lazy_node(pvrq2.FileRenderJob.ident, 2 << 16, header, data,
+      lambda *args: errors.append(args))
+    self.assertEqual(errors, [])
+    self.assertFalse(job.payload_loaded)
+    self.assertEqual((job.name, job.status, job.peek_filename()), ('a.c4d', 'failed', None))
+
+    # The payload is written back as it is and still decodes.
+    root = pvrq2.Root()
+    root.append(job)
+    loaded = pvrq2.load_nodes(pvrq2.dump_nodes(root))[0]
+    self.assertFalse(job.payload_loaded)
+    for node in (job, loaded):
+      self.assertEqual(node.filename, '/a.c4d')
+      self.assertTrue(node.skip_existing)
+      self.assertEqual(node.get_timings()['render_end'], None)
+
+  def test_write_without_decoding(self):
+    # Payloads that were never decoded are written back unchanged, the
+    # lazy and eager loads give the same jobs.
+    self.jobs[2].skip_existing = True
+    data = pvrq2.dump_nodes(self.root)
+    self.assertEqual(self.decoded(), 1)
+    lazy = pvrq2.load_nodes(data)[0].get_children()
+    pvrq2.FileRenderJob.lazy_payload = False
+    try:
+      eager = pvrq2.load_nodes(data)[0].get_children()
+    finally:
+      pvrq2.FileRenderJob.lazy_payload = True
+    self.assertTrue(all(job.payload_loaded for job in eager))
+    snapshot = lambda jobs: [(x.filename, x.skip_existing, x.status) for x in jobs]
+    self.assertEqual(snapshot(lazy), snapshot(eager))
+    self.assertEqual([x.skip_existing for x in eager], [False] * 2 + [True] + [False] * 17)
+
+
+
+class EstimatorTest(unittest.TestCase):
+
+  def setUp(self):
+    from nr.pvrq2 import eta
+    self.root = pvrq2.Root()
+    self.folders = [pvrq2.Folder('a'), pvrq2.Folder('b')]
+    self.jobs = [pvrq2.FileRenderJob('a.c4d'), pvrq2.FileRenderJob('b.c4d')]
+    history = eta.History(os.devnull)
+    for folder in self.folders:
+      self.root.append(folder)
+    for job in self.jobs:
+      self.folders[0].append(job)
+      history.add(eta.get_job_path(job), None, 10.0)
+    self.estimator = eta.Estimator(self.root, history)
+
+  def remaining(self, node=None):
+    return self.estimator.get_remaining(node)[0]
+
+  def test_moved_and_removed_rendering_job(self):
+    self.assertEqual(self.remaining(), 20.0)
+    job = self.jobs[0]
+    job.status = pvrq2.STATUS_RENDERING
+    job.mark_time('render_start', pvrq2.timestamp() - 4.0)
+    self.assertAlmostEqual(self.remaining(), 16.0, delta=0.5)
+
+    # The elapsed time still counts in the new folder.
+    job.remove()
+    self.folders[1].append(job)
+    self.assertAlmostEqual(self.remaining(), 16.0, delta=0.5)
+    self.assertAlmostEqual(self.remaining(self.folders[1]), 6.0, delta=0.5)
+    self.assertEqual(self.remaining(self.folders[0]), 10.0)
+
+    job.remove()
+    self.assertEqual(self.estimator._rendering, set())
+    self.assertEqual(self.remaining(), 10.0)
+
+
+
+class MoveNodesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.root = pvrq2.Root()
+    self.folder = pvrq2.Folder('folder')
+    self.root.append(self.folder)
+    self.jobs = [pvrq2.FileRenderJob(x) for x in 'abcdef']
+    for job in self.jobs:
+      self.folder.append(job)
+
+  def names(self, node=None):
+    return ''.join(x.name for x in (node or self.folder).iter_children())
+
+  def select(self, names):
+    return [x for x in self.jobs if x.name in names]
+
+  def test_up_and_down(self):
+    self.assertEqual(pvrq2.move_nodes(self.select('bdf'), 'up'), 3)
+    self.assertEqual(self.names(), 'badcfe')
+    # The first job of a folder moves in front of the folder.
+    self.assertEqual(pvrq2.move_nodes(self.select('b'), 'up'), 1)
+    self.assertEqual(self.names(self.root), 'bfolder')
+    self.assertEqual(self.names(), 'adcfe')
+    # The first top-level node can not move up, nor the folder behind it.
+    self.assertEqual(pvrq2.move_nodes(self.select('b') + [self.folder], 'up'), 0)
+    self.assertEqual(pvrq2.move_nodes(self.select('ace'), 'down'), 3)
+    self.assertEqual(self.names(), 'dafc')
+    self.assertEqual(self.names(self.root), 'bfoldere')
+
+  def test_top_and_bottom(self):
+    self.assertEqual(pvrq2.move_nodes(self.select('ace'), 'bottom'), 3)
+    self.assertEqual(self.names(), 'bdface')
+    self.assertEqual(pvrq2.move_nodes(self.select('bce'), 'top'), 2)
+    self.assertEqual(self.names(), 'bcedfa')
+
+  def test_target(self):
+    # The index is counted before the nodes are removed.
+    other = pvrq2.Folder('other')
+    self.root.append(other)
+    self.assertEqual(pvrq2.move_nodes(self.select('be'), target=self.folder,
+      index=4), 2)
+    self.assertEqual(self.names(), 'acdbef')
+    pvrq2.move_nodes(self.select('ac') + [self.folder.get_child(1)],
+      target=other, index=0)
+    self.assertEqual(self.names(other), 'ac')
+    self.assertEqual(self.names(), 'dbef')
+    self.assertRaises(ValueError, pvrq2.move_nodes, [self.folder], target=self.folder)
+    self.assertRaises(ValueError, pvrq2.move_nodes, self.jobs, 'left')
+
+
+class SchedulerTest(unittest.TestCase):
+
+  def setUp(self):
+    from nr.pvrq2 import scheduler
+    self.root = pvrq2.Root()
+    self.folders = [pvrq2.Folder(str(x)) for x in range(3)]
+    for folder in self.folders:
+      self.root.append(folder)
+      for index in range(10):
+        folder.append(pvrq2.FileRenderJob('{0}.c4d'.format(index)))
+    self.scheduler = scheduler.Scheduler(self.root)
+
+  def check(self):
+    # The ready queue matches a scan of the whole tree.
+    jobs = self.root.iter_tree(lambda x: isinstance(x, pvrq2.RenderJob))
+    expected = [x for x in jobs if self.scheduler.is_runnable(x)]
+    self.assertEqual(list(self.scheduler.iter_runnable()), expected)
+    self.assertIs(self.scheduler.next_job(), expected[0] if expected else None)
+
+  def test_move_run(self):
+    self.check()
+    run = self.folders[1].get_children()[3:8]
+    self.assertEqual(pvrq2.move_nodes(run, 'top'), 5)
+    self.assertEqual(self.folders[1].get_children()[:5], run)
+    self.check()
+    pvrq2.move_nodes(run, target=self.folders[0], index=2)
+    self.assertEqual(self.folders[0].get_children()[2:7], run)
+    self.check()
+    pvrq2.move_nodes(self.folders[:2], 'bottom')
+    self.check()
+
+  def test_rendering(self):
+    job = self.scheduler.next_job()
+    job.status = pvrq2.STATUS_RENDERING
+    self.assertIs(self.scheduler.rendering, job)
+    self.check()
+    job.status = pvrq2.STATUS_COMPLETED
+    self.assertIsNone(self.scheduler.rendering)
+    self.check()
+    job.status = pvrq2.STATUS_PENDING
+    self.check()
+
+  def test_disable_folder(self):
+    self.check()
+    self.folders[0].enabled = False
+    self.assertIs(self.scheduler.next_job(), self.folders[1].get_child(0))
+    self.check()
+    self.folders[0].get_child(4).enabled = False
+    self.folders[0].enabled = True
+    self.assertIs(self.scheduler.next_job(), self.folders[0].get_child(0))
+    self.check()
+
+  def test_rebuild(self):
+    # Only large insertions rebuild the ready queue from the tree.
+    rebuilds = []
+    rebuild = self.scheduler._rebuild
+    def counted_rebuild():
+      rebuilds.append(self.root.version)
+      rebuild()
+    self.scheduler._rebuild = counted_rebuild
+    self.check()
+    self.assertEqual(len(rebuilds), 1)
+    self.check()
+    folder = pvrq2.Folder('small')
+    for index in range(5):
+      folder.append(pvrq2.FileRenderJob('{0}.c4d'.format(index)))
+    self.root.append(folder, 1)
+    self.check()
+    self.assertEqual(len(rebuilds), 1)
+    folder = pvrq2.Folder('large')
+    for index in range(self.scheduler.REBUILD_THRESHOLD + 1):
+      folder.append(pvrq2.FileRenderJob('{0}.c4d'.format(index)))
+    self.root.append(folder, 0)
+    self.check()
+    self.assertEqual(len(rebuilds), 2)
+
+  def test_random_changes(self):
+    rng = random.Random(9)
+    jobs = list(self.root.iter_tree(lambda x: isinstance(x, pvrq2.RenderJob)))
+    self.check()
+    for __ in range(200):
+      choice = rng.random()
+      if choice < 0.2:
+        job = rng.choice(jobs)
+        job.status = rng.choice([pvrq2.STATUS_PENDING, pvrq2.STATUS_COMPLETED])
+      elif choice < 0.3:
+        node = rng.choice(jobs + self.folders)
+        node.enabled = not node.enabled
+      else:
+        folder = rng.choice(self.folders)
+        children = folder.get_children()
+        if not children:
+          continue
+        start = rng.randrange(len(children))
+        nodes = children[start:start + rng.randint(1, 6)]
+        if choice < 0.8:
+          pvrq2.move_nodes(nodes, rng.choice(['up', 'down', 'top', 'bottom']))
+        else:
+          target = rng.choice(self.folders)
+          pvrq2.move_nodes(nodes, target=target,
+            index=rng.randint(0, target.get_child_count()))
+      self.check()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,144 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for #nr.pvrq2.prefetch.Prefetcher with a `c4d` stub that simulates
+the latency of loading a document and of reading the scene file.
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import c4dstub
+
+pvrq2 = None
+prefetch = None
+
+LATENCY = 0.2
+
+
+def setUpModule():
+  global pvrq2, prefetch
+  pvrq2 = c4dstub.install()
+  from nr.pvrq2 import prefetch
+
+
+def tearDownModule():
+  c4dstub.uninstall()
+
+
+class Document(object):
+
+  def __init__(self, filename):
+    self.filename = filename
+
+
+class PrefetcherTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.loaded = []
+    self.release = threading.Event()
+    def load_document(filename, flags):
+      time.sleep(LATENCY)
+      self.loaded.append(filename)
+      return Document(filename)
+    sys.modules['c4d'].documents.LoadDocument = load_document
+    self.prefetcher = prefetch.Prefetcher()
+
+  def tearDown(self):
+    del sys.modules['c4d'].documents.LoadDocument
+    self.release.set()
+    shutil.rmtree(self.tempdir)
+
+  def make_job(self, name, slow=False):
+    filename = os.path.join(self.tempdir, name)
+    with open(filename, 'wb') as fp:
+      fp.write(b'scene')
+    if not slow:
+      return pvrq2.FileRenderJob(filename)
+    # Reading the scene file waits for the test, like a slow share.
+    release = self.release
+    class SlowJob(pvrq2.FileRenderJob):
+      def prefetch(self):
+        release.wait(10.0)
+        super(SlowJob, self).prefetch()
+    return SlowJob(filename)
+
+  def poll_until_ready(self, job, timeout=5.0):
+    deadline = time.time() + timeout
+    while self.prefetcher.document is None and time.time() < deadline:
+      self.prefetcher.poll()
+      time.sleep(0.01)
+    self.assertIs(self.prefetcher.job, job)
+    self.assertIsNotNone(self.prefetcher.document)
+
+  def test_document_is_ready(self):
+    # The document is loaded while the previous job renders, starting the
+    # job does not wait for it anymore.
+    job = self.make_job('next.c4d')
+    self.prefetcher.request(job)
+    self.poll_until_ready(job)
+    start = time.time()
+    document = self.prefetcher.take(job) or job.load_scene()
+    self.assertLess(time.time() - start, LATENCY / 2)
+    self.assertEqual(document.filename, job.filename)
+    self.assertEqual(self.loaded, [job.filename])
+    self.assertIsNone(self.prefetcher.job)
+
+  def test_poll_does_not_block(self):
+    job = self.make_job('slow.c4d', slow=True)
+    self.prefetcher.request(job)
+    start = time.time()
+    self.prefetcher.poll()
+    self.assertLess(time.time() - start, LATENCY / 2)
+    self.assertIsNone(self.prefetcher.document)
+    self.assertIsNone(self.prefetcher.take(job))
+    self.release.set()
+    self.poll_until_ready(job)
+
+  def test_missing_file(self):
+    # The job fails when it is prefetched, before it would be rendered.
+    job = pvrq2.FileRenderJob(os.path.join(self.tempdir, 'missing.c4d'))
+    self.prefetcher.request(job)
+    deadline = time.time() + 5.0
+    while self.prefetcher.job is not None and time.time() < deadline:
+      self.prefetcher.poll()
+      time.sleep(0.01)
+    self.assertEqual(job.status, pvrq2.STATUS_FAILED)
+    self.assertIn('missing.c4d', job.error_message)
+    self.assertEqual(self.loaded, [])
+
+  def test_request_other_job(self):
+    first = self.make_job('first.c4d', slow=True)
+    second = self.make_job('second.c4d')
+    self.prefetcher.request(first)
+    self.prefetcher.request(second)
+    self.release.set()
+    self.poll_until_ready(second)
+    self.assertIsNone(self.prefetcher.take(first))
+    self.assertEqual(self.loaded, [second.filename])
+    self.assertEqual(first.status, pvrq2.STATUS_PENDING)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,124 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Tests for the timers and counters of #nr.pvrq2.profiling.
+
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import c4dstub
+
+profiling = None
+
+
+def setUpModule():
+  global profiling
+  c4dstub.install()
+  from nr.pvrq2 import profiling
+
+
+def tearDownModule():
+  c4dstub.uninstall()
+
+
+class ProfilingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.was_enabled = profiling.is_enabled()
+    profiling.reset()
+    profiling.enable()
+
+  def tearDown(self):
+    if not self.was_enabled:
+      profiling.disable()
+    profiling.reset()
+
+  def test_timed(self):
+    @profiling.timed('test.func')
+    def func(value):
+      if value is None:
+        raise ValueError
+      return value * 2
+    self.assertEqual(func(21), 42)
+    self.assertRaises(ValueError, func, None)
+    timer = profiling.timers['test.func']
+    self.assertEqual(timer.calls, 2)
+    self.assertEqual(sum(timer.histogram), 2)
+    self.assertTrue(0.0 <= timer.min <= timer.max <= timer.total)
+    self.assertEqual(func.__name__, 'func')
+
+  def test_disabled(self):
+    profiling.disable()
+    @profiling.timed('test.func')
+    def func():
+      with profiling.timer('test.block'):
+        profiling.count('test.counter')
+    func()
+    self.assertEqual(profiling.timers, {})
+    self.assertEqual(profiling.counters, {})
+
+  def test_histogram(self):
+    for seconds in (0.00005, 0.0005, 0.5, 20.0):
+      profiling.add_time('test.timer', seconds)
+    self.assertEqual(profiling.timers['test.timer'].histogram,
+      [1, 1, 0, 0, 1, 0, 1])
+
+  def test_count(self):
+    profiling.count('test.counter')
+    profiling.count('test.counter', 4)
+    self.assertEqual(profiling.counters, {'test.counter': 5})
+
+  def test_report(self):
+    profiling.add_time('test.slow', 0.5)
+    profiling.add_time('test.fast', 0.001)
+    profiling.count('test.counter', 3)
+    lines = profiling.report().split('\n')
+    self.assertEqual(lines[0].split()[:6],
+      ['timer', 'calls', 'total', 'mean', 'min', 'max'])
+    # Sorted by the total time.
+    self.assertEqual(lines[1].split()[:3], ['test.slow', '1', '500.000'])
+    self.assertEqual(lines[2].split()[0], 'test.fast')
+    self.assertEqual(lines[-1].split(), ['test.counter', '3'])
+
+  def test_dump(self):
+    profiling.add_time('test.timer', 0.25)
+    profiling.count('test.counter')
+    tempdir = tempfile.mkdtemp()
+    try:
+      filename = os.path.join(tempdir, 'report.txt')
+      profiling.dump(filename)
+      with open(filename) as fp:
+        self.assertEqual(fp.read(), profiling.report() + '\n')
+      filename = os.path.join(tempdir, 'report.json')
+      profiling.dump(filename)
+      with open(filename) as fp:
+        data = json.load(fp)
+    finally:
+      shutil.rmtree(tempdir)
+    self.assertEqual(data['counters'], {'test.counter': 1})
+    self.assertEqual(data['buckets'], list(profiling.BUCKETS))
+    self.assertEqual([(x['name'], x['calls'], x['total']) for x in data['timers']],
+      [('test.timer', 1, 0.25)])
+
+
+if __name__ == '__main__':
+  unittest.main()
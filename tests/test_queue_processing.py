@@ -0,0 +1,293 @@
+# PV Render Queue Cinema 4D Plugin
+# Copyright (C) 2015  Niklas Rosenstein
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Simulates the event-driven processing of the queue by `RQMessageData`
+outside of Cinema 4D. A stub `c4d` module stands in for Cinema 4D: the
+external rendering starts some time after the render command and runs for
+some time, and its start and end notifications are dropped at random. The
+plugin must render every job exactly once, never start a rendering while
+another one runs and never stall.
+
+    python -m unittest discover tests
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import types
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN_FILE = os.path.join(ROOT_DIR, 'pvrenderqueue2.pyp')
+
+RENDER_COMMANDS = (12099, 300002144)
+
+
+class FakeCinema(object):
+  '''
+  The simulated clock, documents and external renderer.
+  '''
+
+  def __init__(self, rng, drop_rate):
+    self.rng = rng
+    self.drop_rate = drop_rate
+    self.now = 1000.0
+    self.active_document = None
+    self.state = 'idle'      # 'idle', 'starting' or 'running'
+    self.state_until = None  # when the current state ends
+    self.current = None      # the filename that is being rendered
+    self.renders = []        # filenames in the order they were started
+    self.double_starts = 0
+    self.events = []         # messages for the plugin's CoreMessage()
+    self.event_add = False
+
+  def call_command(self, command):
+    if command not in RENDER_COMMANDS:
+      return
+    if self.state != 'idle':
+      self.double_starts += 1
+      return
+    self.current = self.active_document.filename
+    self.renders.append(self.current)
+    self.state = 'starting'
+    self.state_until = self.now + self.rng.uniform(0.0, 1.5)
+
+  def notify(self, event_id):
+    if self.rng.random() >= self.drop_rate:
+      self.events.append(event_id)
+
+  def advance(self, dt, rendering_event):
+    self.now += dt
+    if self.state == 'starting' and self.now >= self.state_until:
+      self.state = 'running'
+      self.state_until = self.now + self.rng.choice([0.0, 0.05, 0.5, 3.0])
+      self.notify(rendering_event)
+    if self.state == 'running' and self.now >= self.state_until:
+      self.state = 'idle'
+      self.current = None
+      self.notify(rendering_event)
+
+
+def make_c4d(cinema, prefs_dir):
+  '''
+  Creates the stub `c4d` module and its submodules.
+  '''
+
+  c4d = types.ModuleType('c4d')
+  constants = {}
+  def constant(name):
+    # Any other constant gets a unique value.
+    if name not in constants:
+      constants[name] = 900000 + len(constants)
+    return constants[name]
+  class Stub(object):
+    def __init__(self, *args, **kwargs):
+      pass
+  def module_getattr(module):
+    def __getattr__(name):
+      if name.startswith('__'):
+        raise AttributeError(name)
+      if name.isupper():
+        return constant(name)
+      return Stub
+    module.__getattr__ = __getattr__
+
+  c4d.EVMSG_CHANGE = 604
+  c4d.MSG_TIMER = 7
+  c4d.CHECKISRUNNING_EXTERNALRENDERING = 1
+  c4d.RDATA_FRAMESEQUENCE = 1
+  c4d.RDATA_FRAMEFROM = 2
+  c4d.RDATA_FRAMETO = 3
+  c4d.RDATA_FRAMESTEP = 4
+  c4d.RDATA_FRAMESEQUENCE_MANUAL = 0
+  c4d.CheckIsRunning = lambda what: cinema.state == 'running'
+  c4d.CallCommand = cinema.call_command
+  c4d.GetC4DVersion = lambda: 20000
+  def event_add(*args):
+    cinema.event_add = True
+  c4d.EventAdd = event_add
+  module_getattr(c4d)
+
+  class BaseTime(object):
+    def __init__(self, frame):
+      self.frame = frame
+    def GetFrame(self, fps):
+      return self.frame
+
+  class BaseDocument(object):
+    def __init__(self, filename=None):
+      self.filename = filename
+      self.inserted = False
+      self.render_data = {c4d.RDATA_FRAMESEQUENCE: c4d.RDATA_FRAMESEQUENCE_MANUAL,
+        c4d.RDATA_FRAMEFROM: BaseTime(0), c4d.RDATA_FRAMETO: BaseTime(9),
+        c4d.RDATA_FRAMESTEP: 1}
+    def GetListHead(self):
+      return self.inserted or None
+    def GetPred(self):
+      return None
+    def GetNext(self):
+      return None
+    def Remove(self):
+      self.inserted = False
+    def GetFps(self):
+      return 25
+    def GetActiveRenderData(self):
+      return self.render_data
+
+  documents = types.ModuleType('c4d.documents')
+  documents.BaseDocument = BaseDocument
+  def load_document(filename, flags, *args):
+    return BaseDocument(filename) if os.path.isfile(filename) else None
+  def insert_document(doc):
+    doc.inserted = True
+  def set_active_document(doc):
+    cinema.active_document = doc
+  documents.LoadDocument = load_document
+  documents.InsertBaseDocument = insert_document
+  documents.SetActiveDocument = set_active_document
+  documents.GetActiveDocument = lambda: cinema.active_document
+  module_getattr(documents)
+
+  storage = types.ModuleType('c4d.storage')
+  storage.GeGetC4DPath = lambda what: prefs_dir
+  module_getattr(storage)
+
+  submodules = {'documents': documents, 'storage': storage}
+  for name in ('gui', 'plugins', 'bitmaps'):
+    submodule = types.ModuleType('c4d.' + name)
+    module_getattr(submodule)
+    submodules[name] = submodule
+  for name, submodule in submodules.items():
+    setattr(c4d, name, submodule)
+  return c4d, submodules
+
+
+class FakeTime(object):
+  '''
+  Replaces the #time module of the plugin with the simulated clock.
+  '''
+
+  def __init__(self, cinema):
+    self.cinema = cinema
+
+  def time(self):
+    return self.cinema.now
+
+  def __getattr__(self, name):
+    return getattr(time, name)
+
+
+class FakeResource(object):
+
+  def LoadString(self, ident):
+    return 'string {0}'.format(ident)
+
+
+class QueueProcessingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.saved_modules = dict(sys.modules)
+    self.saved_path = list(sys.path)
+
+  def tearDown(self):
+    sys.modules.clear()
+    sys.modules.update(self.saved_modules)
+    sys.path[:] = self.saved_path
+    shutil.rmtree(self.tempdir)
+
+  def load_plugin(self, cinema):
+    c4d, submodules = make_c4d(cinema, self.tempdir)
+    sys.modules['c4d'] = c4d
+    for name, submodule in submodules.items():
+      sys.modules['c4d.' + name] = submodule
+    for name in list(sys.modules):
+      if name == 'nr' or name.startswith('nr.'):
+        del sys.modules[name]
+    scope = {'__file__': PLUGIN_FILE, '__name__': 'pvrenderqueue2',
+      '__res__': FakeResource()}
+    with open(PLUGIN_FILE) as fp:
+      exec(compile(fp.read(), PLUGIN_FILE, 'exec'), scope)
+    scope['time'] = FakeTime(cinema)
+    return scope
+
+  def simulate(self, seed, num_jobs=12, drop_rate=0.3):
+    rng = random.Random(seed)
+    cinema = FakeCinema(rng, drop_rate)
+    plugin = self.load_plugin(cinema)
+    pvrq2 = plugin['pvrq2']
+    settings = plugin['settings']
+    EVMSG_EXTERNALRENDERING = plugin['EVMSG_EXTERNALRENDERING']
+
+    filenames = []
+    for index in range(num_jobs):
+      filename = os.path.join(self.tempdir, 'scene{0}.c4d'.format(index))
+      with open(filename, 'wb') as fp:
+        fp.write(b'QC4DC4D')
+      filenames.append(filename)
+      pvrq2.root.append(pvrq2.FileRenderJob(filename))
+
+    def listener(event, node, *args):
+      # A job must only be completed after its rendering has ended.
+      if event == 'change' and args[0] == 'status' and node.status == pvrq2.STATUS_COMPLETED:
+        self.assertNotEqual(cinema.current, node.filename)
+    pvrq2.root.add_listener(listener)
+
+    msg_data = plugin['RQMessageData']()
+    msg_data.running = True
+    last_timer = cinema.now
+    deadline = cinema.now + num_jobs * (1.5 + 3.0 + settings.render_start_timeout
+      + settings.timer_watchdog_interval / 1000.0) + 10.0
+    dt = 0.01
+    while cinema.now < deadline:
+      cinema.advance(dt, EVMSG_EXTERNALRENDERING)
+      events, cinema.events = cinema.events, []
+      if cinema.event_add:
+        cinema.event_add = False
+        events.append(604)
+      interval = msg_data.GetTimer()
+      if interval and cinema.now - last_timer >= interval / 1000.0:
+        events.append(7)
+        last_timer = cinema.now
+      for event_id in events:
+        msg_data.CoreMessage(event_id, None)
+      if not msg_data.running and cinema.state == 'idle' and msg_data.GetTimer() == 0:
+        break
+    else:
+      self.fail('the queue stalled (seed {0})'.format(seed))
+
+    self.assertEqual(cinema.double_starts, 0)
+    self.assertEqual(sorted(cinema.renders), sorted(filenames))
+    statuses = [job.status for job in pvrq2.root.iter_children()]
+    self.assertEqual(statuses, [pvrq2.STATUS_COMPLETED] * num_jobs)
+
+  def test_reliable_notifications(self):
+    for seed in range(5):
+      self.simulate(seed, drop_rate=0.0)
+
+  def test_dropped_notifications(self):
+    for seed in range(5):
+      self.simulate(seed, drop_rate=0.5)
+
+  def test_no_notifications(self):
+    self.simulate(0, num_jobs=4, drop_rate=1.0)
+
+
+if __name__ == '__main__':
+  unittest.main()